@@ -0,0 +1,232 @@
+import argparse
+import re
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import List, Optional, Sequence
+
+
+_SESSION_WRITE_PATTERN = re.compile(r"install-write -S (\d+) (\d+) ")
+_SIZE_PATTERN = re.compile(r"-S (\d+)")
+_READ_SIZE = 64 * 1024
+
+
+# 本地模拟 adb server，实现 AdbClient 用到的 smart socket 服务，用于验证直连安装、取消与超时。
+# chunk_delay 模拟慢速传输，hang_install 模拟设备端安装阶段无响应；events 依次记录会话的创建、写入、提交与放弃
+class FakeAdbServer:
+    def __init__(
+        self,
+        devices: Sequence[str] = ("fake-android-0001",),
+        chunk_delay: float = 0.0,
+        hang_install: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.devices = list(devices)
+        self.chunk_delay = chunk_delay
+        self.hang_install = hang_install
+        self.events: List[str] = []
+        self._sessions = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeAdbServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-adb-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record(self, event: str) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def next_session(self) -> int:
+        with self._lock:
+            self._sessions += 1
+            return self._sessions
+
+    def devices_payload(self, long_format: bool) -> str:
+        lines = []
+        for index, serial in enumerate(self.devices, start=1):
+            details = f" product:fake model:Fake_Phone device:fake transport_id:{index}" if long_format else ""
+            lines.append(f"{serial}\tdevice{details}\n")
+        return "".join(lines)
+
+    def wait_stopped(self) -> None:
+        self._stopped.wait()
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                try:
+                    _Session(server, self.request).run()
+                except (OSError, ValueError):
+                    pass
+
+        return Handler
+
+
+class _Session:
+    def __init__(self, server: FakeAdbServer, sock: socket.socket) -> None:
+        self._server = server
+        self._sock = sock
+        self._serial: Optional[str] = None
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise OSError("client closed")
+            data += chunk
+        return data
+
+    def _read_request(self) -> str:
+        length = int(self._read_exactly(4), 16)
+        return self._read_exactly(length).decode("utf-8")
+
+    def _okay(self, payload: Optional[str] = None) -> None:
+        data = b"OKAY"
+        if payload is not None:
+            encoded = payload.encode("utf-8")
+            data += f"{len(encoded):04x}".encode("ascii") + encoded
+        self._sock.sendall(data)
+
+    def _fail(self, message: str) -> None:
+        encoded = message.encode("utf-8")
+        self._sock.sendall(b"FAIL" + f"{len(encoded):04x}".encode("ascii") + encoded)
+
+    def run(self) -> None:
+        while True:
+            request = self._read_request()
+            if request.startswith("host:transport:"):
+                serial = request[len("host:transport:"):]
+                if serial not in self._server.devices:
+                    self._fail(f"device '{serial}' not found")
+                    return
+                self._serial = serial
+                self._okay()
+                continue
+            self._dispatch(request)
+            return
+
+    def _dispatch(self, request: str) -> None:
+        if request == "host:version":
+            self._okay("0029")
+        elif request == "host:devices-l":
+            self._okay(self._server.devices_payload(long_format=True))
+        elif request in ("host:track-devices", "host:track-devices-l"):
+            self._okay(self._server.devices_payload(long_format=request.endswith("-l")))
+            # 保持长连接，直到客户端断开或模拟 server 停止
+            self._server.wait_stopped()
+        elif request.startswith("shell:"):
+            self._okay()
+            self._sock.sendall(self._shell_output(request[len("shell:"):]).encode("utf-8"))
+        elif request == "sync:":
+            self._okay()
+            self._sync()
+        elif request.startswith("exec:"):
+            self._okay()
+            self._exec(request[len("exec:"):])
+        else:
+            self._fail(f"unknown service {request}")
+
+    @staticmethod
+    def _shell_output(command: str) -> str:
+        if "@@model=" in command:
+            return (
+                "@@model=Fake Phone\n@@os=14\n@@sdk=34\n@@abis=arm64-v8a,armeabi-v7a,armeabi\n"
+                "@@storage=/dev/block/dm-5 134217728 67108864 67108864 50% /data\n@@battery=  level: 80\n"
+            )
+        return ""
+
+    def _receive_payload(self, size: int) -> None:
+        remaining = size
+        while remaining:
+            chunk = self._sock.recv(min(remaining, _READ_SIZE))
+            if not chunk:
+                raise OSError("client closed")
+            remaining -= len(chunk)
+            if self._server.chunk_delay:
+                time.sleep(self._server.chunk_delay)
+
+    def _finish_install(self, response: str) -> None:
+        if self._server.hang_install:
+            # 设备端安装阶段无响应：不回复也不关闭连接
+            self._server.wait_stopped()
+            return
+        self._sock.sendall(response.encode("utf-8"))
+
+    def _exec(self, command: str) -> None:
+        if "install-create" in command:
+            session = self._server.next_session()
+            self._server.record(f"create {session}")
+            self._sock.sendall(f"Success: created install session [{session}]\n".encode("utf-8"))
+        elif "install-write" in command:
+            match = _SESSION_WRITE_PATTERN.search(command)
+            size, session = int(match.group(1)), match.group(2)
+            self._receive_payload(size)
+            self._server.record(f"write {session}")
+            self._sock.sendall(f"Success: streamed {size} bytes\n".encode("utf-8"))
+        elif "install-commit" in command:
+            session = command.split()[-1]
+            self._server.record(f"commit {session}")
+            self._finish_install("Success\n")
+        elif "install-abandon" in command:
+            session = command.split()[-1]
+            self._server.record(f"abandon {session}")
+            self._sock.sendall(b"Success\n")
+        elif "package install" in command:
+            self._receive_payload(int(_SIZE_PATTERN.search(command).group(1)))
+            self._server.record(f"install {self._serial}")
+            self._finish_install("Success\n")
+
+    def _sync(self) -> None:
+        while True:
+            header = self._read_exactly(8)
+            command, length = header[:4], struct.unpack("<I", header[4:])[0]
+            if command == b"SEND":
+                self._read_exactly(length)
+            elif command == b"DATA":
+                self._read_exactly(length)
+            elif command == b"DONE":
+                self._sock.sendall(b"OKAY" + struct.pack("<I", 0))
+            elif command == b"QUIT":
+                return
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="本地模拟 adb server，配合 ANDROID_ADB_SERVER_PORT 与 adb_socket_client 使用")
+    parser.add_argument("--port", type=int, default=5038)
+    parser.add_argument("--devices", type=int, default=2, help="模拟设备数量")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="每收到 64KB 安装数据后的等待秒数")
+    parser.add_argument("--hang-install", action="store_true", help="收完安装数据后不再应答")
+    args = parser.parse_args(argv)
+    devices = [f"fake-android-{index:04d}" for index in range(1, args.devices + 1)]
+    server = FakeAdbServer(devices, chunk_delay=args.chunk_delay, hang_install=args.hang_install, port=args.port).start()
+    print(f"fake adb server listening on 127.0.0.1:{server.port}", flush=True)
+    try:
+        server.wait_stopped()
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _device_ids(prefix: str, count_name: str) -> list:
+    count = int(_env_float(count_name, 0))
+    return [f"{prefix}-{index:04d}" for index in range(1, count + 1)]
+
+
+def _simulate_latency() -> None:
+    latency = _env_float("FAKE_LATENCY", 0.0)
+    if latency > 0:
+        time.sleep(latency)
+
+
+def _should_fail(device_id: str, package_path: str) -> bool:
+    failure_rate = _env_float("FAKE_FAILURE_RATE", 0.0)
+    if failure_rate <= 0:
+        return False
+    # 固定种子，保证同一配置下多次运行的失败设备一致，便于与基线对比
+    seed = f"{os.getenv('FAKE_SEED', '0')}:{device_id}:{Path(package_path).name}"
+    return random.Random(seed).random() < failure_rate
+
+
+def _failure_kind() -> str:
+    return os.getenv("FAKE_FAILURE_KIND", "storage")
+
+
+def _transport_failed() -> bool:
+    # 连接异常是瞬时的，每次调用重新掷骰，便于验证重试
+    return random.random() < _env_float("FAKE_FAILURE_RATE", 0.0)
+
+
+def _print_probe(model: str) -> None:
+    # 按 device_probe 的批量探测格式输出，存储与 ABI 由环境变量控制
+    free_kb = int(_env_float("FAKE_FREE_STORAGE_MB", 65536) * 1024)
+    print(f"@@model={model}")
+    print("@@os=14")
+    print("@@sdk=34")
+    print(f"@@abis={os.getenv('FAKE_DEVICE_ABIS', 'arm64-v8a,armeabi-v7a,armeabi')}")
+    print(f"@@storage=/dev/block/dm-5 {free_kb * 2} {free_kb} {free_kb} 50% /data")
+    print("@@battery=  level: 80")
+
+
+def _package_paths(arguments: list) -> list:
+    return [argument for argument in arguments if not argument.startswith("-")]
+
+
+def _simulate_transfer(package_path: str) -> None:
+    speed = _env_float("FAKE_TRANSFER_SPEED", 0.0) * 1024 * 1024
+    try:
+        size = os.path.getsize(package_path)
+    except OSError:
+        size = 0
+    if speed <= 0 or size <= 0:
+        return
+    total_seconds = size / speed
+    steps = 4
+    for step in range(1, steps + 1):
+        time.sleep(total_seconds / steps)
+        sys.stdout.write(f"[{step * 100 // steps:3d}%] {Path(package_path).name} {speed / 1024 / 1024:.1f}MB/s\r")
+        sys.stdout.flush()
+    sys.stdout.write("\n")
+
+
+def _adb(arguments: list) -> int:
+    device_ids = _device_ids("fake-android", "FAKE_ADB_DEVICES")
+    details = [f" product:fake model:Fake_Phone device:fake transport_id:{index}" for index in range(1, len(device_ids) + 1)]
+    if arguments[:1] == ["devices"]:
+        _simulate_latency()
+        print("List of devices attached")
+        for device_id, extra in zip(device_ids, details):
+            print(f"{device_id}\tdevice{extra}")
+        return 0
+    if arguments[:1] == ["track-devices"]:
+        long_format = "-l" in arguments
+        payload = "".join(
+            f"{device_id}\tdevice{extra if long_format else ''}\n" for device_id, extra in zip(device_ids, details)
+        )
+        sys.stdout.write(f"{len(payload):04x}{payload}")
+        sys.stdout.flush()
+        time.sleep(3600)
+        return 0
+    if arguments[:1] == ["-s"] and len(arguments) >= 3:
+        device_id, command = arguments[1], arguments[2]
+        _simulate_latency()
+        if command == "shell":
+            if "@@model=" in " ".join(arguments[3:]):
+                _print_probe("Fake Phone")
+            return 0
+        if command in ("install", "install-multiple"):
+            package_path = arguments[-1]
+            kind = _failure_kind()
+            if kind == "transport" and _transport_failed():
+                print(f"adb: device '{device_id}' not found")
+                return 1
+            print("Performing Streamed Install")
+            for path in _package_paths(arguments[3:]):
+                _simulate_transfer(path)
+            if kind == "test_only" and "-t" not in arguments and _should_fail(device_id, package_path):
+                print("adb: failed to install: Failure [INSTALL_FAILED_TEST_ONLY: installPackageLI]")
+                return 1
+            if kind == "storage" and _should_fail(device_id, package_path):
+                print("adb: failed to install: Failure [INSTALL_FAILED_INSUFFICIENT_STORAGE]")
+                return 1
+            print("Success")
+            return 0
+        if command in ("uninstall", "reconnect"):
+            print("Success" if command == "uninstall" else "reconnecting")
+            return 0
+    return 0
+
+
+def _hdc(arguments: list) -> int:
+    device_ids = _device_ids("fake-harmony", "FAKE_HDC_DEVICES")
+    if arguments[:2] == ["list", "targets"]:
+        _simulate_latency()
+        print("\n".join(device_ids) if device_ids else "[Empty]")
+        return 0
+    if arguments[:1] == ["-t"] and len(arguments) >= 3:
+        device_id, command = arguments[1], arguments[2]
+        _simulate_latency()
+        if command == "shell":
+            if "@@model=" in " ".join(arguments[3:]):
+                _print_probe("Fake Tablet")
+                return 0
+            print("error: failed to get information and the parameters may be wrong.")
+            return 0
+        if command == "install":
+            package_path = arguments[-1]
+            if _failure_kind() == "transport" and _transport_failed():
+                print("[Fail]Not match target founded, check connect-key please")
+                return 0
+            for path in _package_paths(arguments[3:]):
+                _simulate_transfer(path)
+            if _failure_kind() == "storage" and _should_fail(device_id, package_path):
+                print("[Fail]Error while Deliver Msg, msg:install failed due to insufficient disk memory.")
+                return 0
+            print(f"[Info]App install path:{package_path}, queuesize:0, msg:install bundle successfully.")
+            print("AppMod finish")
+            return 0
+    return 0
+
+
+def main() -> int:
+    tool, arguments = sys.argv[1], sys.argv[2:]
+    if tool == "adb":
+        return _adb(arguments)
+    return _hdc(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "src"))
+
+from services.async_runtime import (  # noqa: E402
+    LANE_INSTALL,
+    TOOL_COMMAND_ENV,
+    OperationCancelled,
+    get_default_runtime,
+)
+from services.device_detector import DeviceInfo, detect_devices_report  # noqa: E402
+from services.device_probe import get_default_probe  # noqa: E402
+from services.installer import InstallScheduler, InstallTask  # noqa: E402
+from services.package_index import PackageIndex, get_default_index  # noqa: E402
+from services.package_scanner import clear_index_cache, find_latest_packages  # noqa: E402
+from services.remote_agent import AgentClient, RemoteCoordinator  # noqa: E402
+
+
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+DEFAULT_REGRESSION_THRESHOLD = 0.5
+# 低于该耗时的指标受计时抖动影响过大，只展示不参与退化判定
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def install_fake_tools() -> None:
+    # 通过 INSTALL_TOOL_ADB / INSTALL_TOOL_HDC 把 adb/hdc 指向模拟工具，Windows 上同样可直接启动
+    fake_tool = BENCHMARK_DIR / "fake_tool.py"
+    for tool, env_name in TOOL_COMMAND_ENV.items():
+        os.environ[env_name] = f'"{sys.executable}" "{fake_tool}" {tool}'
+
+
+def generate_build_drop(directory: Path, count: int, nested_every: int = 0) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    base_time = time.time() - count
+    for index in range(count):
+        target_dir = directory
+        if nested_every and index % nested_every == 0:
+            target_dir = directory / f"build_{index // nested_every:04d}"
+            target_dir.mkdir(exist_ok=True)
+        suffix = ".apk" if index % 2 == 0 else ".hap"
+        path = target_dir / f"app_{index:06d}{suffix}"
+        # 只写入空文件，扫描基准关注目录枚举与 stat，而非文件内容
+        path.touch()
+        os.utime(path, (base_time + index, base_time + index))
+
+
+def make_artifact(path: Path, size_kb: int) -> Path:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr("payload.bin", os.urandom(size_kb * 1024))
+    return path
+
+
+def _measure(function: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def bench_detection(device_counts: Sequence[int], latency: float, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    os.environ["FAKE_LATENCY"] = str(latency)
+    for count in device_counts:
+        os.environ["FAKE_ADB_DEVICES"] = str(count)
+        os.environ["FAKE_HDC_DEVICES"] = str(count)
+        results[str(count)] = _measure(lambda: detect_devices_report(), repeat)
+    return results
+
+
+def bench_scan(sizes: Sequence[int], workdir: Path, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for size in sizes:
+        directory = workdir / f"drop_{size}"
+        generate_build_drop(directory, size, nested_every=50)
+        # 目录 mtime 过新时索引不可信，回拨到过去以测得缓存命中的耗时
+        for path in [directory, *[child for child in directory.iterdir() if child.is_dir()]]:
+            os.utime(path, (time.time() - 60, time.time() - 60))
+
+        def cold_scan() -> None:
+            clear_index_cache()
+            get_default_index().clear()
+            find_latest_packages(directory, recursive=True)
+
+        # 只清目录索引、保留安装包元数据缓存，相当于带持久化缓存重启后的首次扫描
+        def reindex_scan() -> None:
+            clear_index_cache()
+            find_latest_packages(directory, recursive=True)
+
+        cold = _measure(cold_scan, repeat)
+        reindex = _measure(reindex_scan, repeat)
+        find_latest_packages(directory, recursive=True)
+        warm = _measure(lambda: find_latest_packages(directory, recursive=True), repeat)
+        results[str(size)] = {"cold": cold, "reindex": reindex, "warm": warm}
+    return results
+
+
+def bench_integrity(sizes_mb: Sequence[int], workdir: Path, repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for size_mb in sizes_mb:
+        artifact = make_artifact(workdir / f"verify_{size_mb}mb.apk", size_mb * 1024)
+        # 冷校验每次使用新的索引，完整读取并解压；缓存命中只比对 (大小, mtime)
+        cold = _measure(lambda: PackageIndex().integrity_for(artifact), repeat)
+        index = PackageIndex()
+        index.integrity_for(artifact)
+        cached = _measure(lambda: index.integrity_for(artifact), repeat)
+        results[str(size_mb)] = {"cold": cold, "cached": cached}
+    return results
+
+
+def bench_install(
+    concurrency_levels: Sequence[int],
+    device_count: int,
+    artifact_kb: int,
+    transfer_speed: float,
+    failure_rate: float,
+    workdir: Path,
+) -> Dict[str, Any]:
+    os.environ["FAKE_LATENCY"] = "0"
+    os.environ["FAKE_TRANSFER_SPEED"] = str(transfer_speed)
+    os.environ["FAKE_FAILURE_RATE"] = str(failure_rate)
+    apk = make_artifact(workdir / "bench.apk", artifact_kb)
+    hap = make_artifact(workdir / "bench.hap", artifact_kb)
+    half = device_count // 2
+    tasks_template = [(f"fake-android-{index:04d}", "android", apk) for index in range(1, device_count - half + 1)]
+    tasks_template += [(f"fake-harmony-{index:04d}", "harmony", hap) for index in range(1, half + 1)]
+    results: Dict[str, Any] = {}
+    for concurrency in concurrency_levels:
+        tasks = [InstallTask(device_id, platform_name, path, force=True) for device_id, platform_name, path in tasks_template]
+        # 界面在设备连接时即完成属性探测，安装时命中缓存；这里同样在计时前预热
+        get_default_probe().probe(
+            [DeviceInfo(device_id, platform_name, "device") for device_id, platform_name, _path in tasks_template]
+        )
+        scheduler = InstallScheduler(
+            max_workers=concurrency,
+            platform_limits={"android": concurrency, "harmony": concurrency},
+        )
+        summary = scheduler.run(tasks)
+        results[str(concurrency)] = {
+            "elapsed": summary.elapsed,
+            "devices_per_second": len(tasks) / summary.elapsed if summary.elapsed else 0.0,
+            "succeeded": len(summary.succeeded),
+            "failed": len(summary.failed),
+        }
+    return results
+
+
+@contextmanager
+def local_agents(count: int, workdir: Path) -> Iterator[List[str]]:
+    # 在本机不同端口上各启动一个 agent 进程（与命令行 agent 子命令相同），共享当前进程的模拟工具环境变量
+    cli = BENCHMARK_DIR.parent / "src" / "cli.py"
+    processes: List[subprocess.Popen] = []
+    addresses: List[str] = []
+    try:
+        for index in range(count):
+            agent_dir = workdir / f"agent_{index}"
+            agent_dir.mkdir(parents=True, exist_ok=True)
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    str(cli),
+                    "--config",
+                    str(agent_dir / "app_config.json"),
+                    "agent",
+                    "--port",
+                    "0",
+                    "--cache-dir",
+                    str(agent_dir / "cache"),
+                ],
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            processes.append(process)
+            # agent 启动后先输出一段 JSON，其中包含系统分配的监听地址
+            lines: List[str] = []
+            while not lines or lines[-1] != "}":
+                line = process.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"agent {index} 启动失败")
+                lines.append(line.rstrip())
+            addresses.append(json.loads("\n".join(lines))["agent"])
+        yield addresses
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def bench_remote(
+    agent_count: int,
+    devices_per_agent: int,
+    artifact_kb: int,
+    transfer_speed: float,
+    workdir: Path,
+) -> Dict[str, Any]:
+    os.environ["FAKE_LATENCY"] = "0"
+    os.environ["FAKE_TRANSFER_SPEED"] = str(transfer_speed)
+    os.environ["FAKE_FAILURE_RATE"] = "0"
+    os.environ["FAKE_ADB_DEVICES"] = str(devices_per_agent)
+    os.environ["FAKE_HDC_DEVICES"] = "0"
+    apk = make_artifact(workdir / "remote.apk", artifact_kb)
+    with local_agents(agent_count, workdir) as addresses:
+        coordinator = RemoteCoordinator([AgentClient(address) for address in addresses])
+        detect_started = time.perf_counter()
+        report = coordinator.detect()
+        detect_seconds = time.perf_counter() - detect_started
+
+        def make_tasks(path: Path) -> List[InstallTask]:
+            return [InstallTask(device.device_id, device.platform, path, force=True) for device in report.devices]
+
+        summary = coordinator.run(make_tasks(apk), max_workers=devices_per_agent)
+        # 用大安装包逐台安装并中途取消；agent 同时只执行一批安装，取消后紧接着的一批能否完成反映 agent 是否已停止
+        large = make_artifact(workdir / "remote_large.apk", artifact_kb * 20)
+        operation = get_default_runtime().submit(
+            LANE_INSTALL,
+            lambda: coordinator.run(make_tasks(large), max_workers=1),
+            name="bench-remote-cancel",
+        )
+        time.sleep(0.5)
+        cancel_started = time.perf_counter()
+        operation.cancel()
+        try:
+            operation.result()
+        except OperationCancelled:
+            pass
+        coordinator.run(make_tasks(apk), max_workers=devices_per_agent)
+        cancel_seconds = time.perf_counter() - cancel_started
+    return {
+        "agents": agent_count,
+        "devices": len(report.devices),
+        "detect": detect_seconds,
+        "elapsed": summary.elapsed,
+        "devices_per_second": len(summary.results) / summary.elapsed if summary.elapsed else 0.0,
+        "succeeded": len(summary.succeeded),
+        "failed": len(summary.failed),
+        "cancel": cancel_seconds,
+    }
+
+
+def _flatten(prefix: str, value: Any, output: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, output)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        output[prefix] = float(value)
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    current: Dict[str, float] = {}
+    previous: Dict[str, float] = {}
+    _flatten("", results["benchmarks"], current)
+    _flatten("", baseline["benchmarks"], previous)
+    regressions: List[str] = []
+    for key, value in sorted(current.items()):
+        old = previous.get(key)
+        if old is None or old == 0:
+            continue
+        # 吞吐类指标越大越好，其余耗时类指标越小越好
+        higher_is_better = key.endswith("devices_per_second")
+        ratio = value / old
+        change = (1 / ratio if higher_is_better and ratio else ratio) - 1
+        if key.endswith(("succeeded", "failed")):
+            continue
+        marker = ""
+        below_noise = not higher_is_better and max(old, value) < NOISE_FLOOR_SECONDS
+        if change > threshold and not below_noise:
+            marker = "  <-- 退化"
+            regressions.append(key)
+        print(f"{key:55s} {old:10.4f} -> {value:10.4f} ({change:+.0%}){marker}")
+    return regressions
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="设备探测、安装包扫描与并发安装性能基准")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 30], help="探测基准的设备数量")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟 adb/hdc 命令延迟（秒）")
+    parser.add_argument("--scan-sizes", type=int, nargs="+", default=[100, 1000, 5000], help="扫描基准的目录文件数")
+    parser.add_argument(
+        "--verify-sizes-mb", type=int, nargs="+", default=[8, 64], help="安装包完整性校验基准的文件大小（MB）"
+    )
+    parser.add_argument("--install-devices", type=int, default=16, help="安装基准的设备数量")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="安装基准的并发数")
+    parser.add_argument("--artifact-kb", type=int, default=512, help="安装包大小（KB）")
+    parser.add_argument("--transfer-speed", type=float, default=4.0, help="模拟传输速度（MB/s）")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="模拟安装失败率")
+    parser.add_argument("--agents", type=int, default=2, help="远程安装基准在本机启动的 agent 数量")
+    parser.add_argument("--agent-devices", type=int, default=4, help="远程安装基准每个 agent 的模拟设备数量")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将结果保存为基线")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="基线文件路径")
+    parser.add_argument("--compare", action="store_true", help="与基线对比，存在退化时返回 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="判定退化的相对阈值")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="install_bench_") as temp_dir:
+        workdir = Path(temp_dir)
+        install_fake_tools()
+        results = {
+            "machine": {"platform": platform.platform(), "python": platform.python_version()},
+            "parameters": vars(args).copy(),
+            "benchmarks": {
+                "detection": bench_detection(args.devices, args.latency, args.repeat),
+                "scan": bench_scan(args.scan_sizes, workdir, args.repeat),
+                "integrity": bench_integrity(args.verify_sizes_mb, workdir, args.repeat),
+                "install": bench_install(
+                    args.concurrency,
+                    args.install_devices,
+                    args.artifact_kb,
+                    args.transfer_speed,
+                    args.failure_rate,
+                    workdir,
+                ),
+                "remote": bench_remote(args.agents, args.agent_devices, args.artifact_kb, args.transfer_speed, workdir),
+            },
+        }
+    for key in ("output", "save_baseline", "baseline", "compare", "threshold"):
+        results["parameters"].pop(key, None)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(text + "\n", encoding="utf-8")
+    if args.compare:
+        if not baseline_path.exists():
+            print(f"基线文件不存在: {baseline_path}", file=sys.stderr)
+            return 2
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能退化", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,500 @@
+import argparse
+import fnmatch
+import json
+import sys
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from config_manager import ConfigManager, default_config_path
+
+# 设备探测、安装包索引等服务模块（连带 asyncio）只在需要的子命令里导入，--help 与 history 不为此付出启动开销
+if TYPE_CHECKING:
+    from services.device_detector import DetectionReport, DeviceInfo
+    from services.device_probe import DeviceProperties
+    from services.installer import DeviceInstallResult, InstallProgress
+    from services.package_scanner import PackageInfo
+    from services.remote_agent import RemoteCoordinator
+
+
+EXIT_OK = 0
+EXIT_INSTALL_FAILED = 1
+EXIT_NO_DEVICES = 3
+EXIT_NO_PACKAGES = 4
+
+
+def _emit(payload: Dict[str, Any]) -> None:
+    json.dump(payload, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def _device_payload(
+    device: "DeviceInfo",
+    names: Dict[str, str],
+    properties: Optional["DeviceProperties"] = None,
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "device_id": device.device_id,
+        "name": names.get(device.device_id, ""),
+        "platform": device.platform,
+        "status": device.status,
+        "details": device.details,
+    }
+    if properties is not None:
+        payload["properties"] = {
+            "model": properties.model,
+            "os_version": properties.os_version,
+            "sdk": properties.sdk,
+            "abis": properties.abis,
+            "free_storage": properties.free_storage,
+            "battery": properties.battery,
+            "error": properties.error,
+        }
+    return payload
+
+
+def _result_payload(result: "DeviceInstallResult") -> Dict[str, Any]:
+    task = result.task
+    payload: Dict[str, Any] = {
+        "device_id": task.device_id,
+        "platform": task.platform,
+        "package": str(task.package_path),
+        "splits": [str(path) for path in task.split_paths],
+        "success": result.success,
+        "skipped": result.skipped,
+        "duration": round(result.duration, 3),
+        "phases": {name: round(value, 3) for name, value in result.phases.items()},
+        "verified": result.verified,
+        "attempts": result.attempts,
+        "failure": result.failure,
+        "remedies": result.remedies,
+        "error": result.error,
+    }
+    if result.install_result is not None:
+        payload["command"] = result.install_result.command
+        payload["returncode"] = result.install_result.process.returncode
+        payload["output"] = result.install_result.process.stdout
+    return payload
+
+
+def _filter_devices(
+    devices: List["DeviceInfo"],
+    patterns: Sequence[str],
+    platform: Optional[str],
+    names: Dict[str, str],
+) -> List["DeviceInfo"]:
+    selected: List["DeviceInfo"] = []
+    for device in devices:
+        if device.status != "device":
+            continue
+        if platform and device.platform != platform:
+            continue
+        if patterns:
+            name = names.get(device.device_id, "")
+            if not any(
+                fnmatch.fnmatchcase(device.device_id, pattern) or (name and fnmatch.fnmatchcase(name, pattern))
+                for pattern in patterns
+            ):
+                continue
+        selected.append(device)
+    return selected
+
+
+def _resolve_packages(args: argparse.Namespace, config: ConfigManager) -> "PackageInfo":
+    # 扫描与安装模块只在需要时加载，devices 等命令保持快速启动
+    from services.package_scanner import DEFAULT_MAX_DEPTH, PackageInfo, find_latest_packages
+
+    apk_paths = [Path(path) for path in args.apk or []]
+    hap_paths = [Path(path) for path in args.hap or []]
+    if apk_paths or hap_paths:
+        # 直接指定多个文件时，第一个为 base APK / entry HAP，其余作为同一应用的分包
+        split_paths = {paths[0]: paths[1:] for paths in (apk_paths, hap_paths) if len(paths) > 1}
+        return PackageInfo(
+            apk_path=apk_paths[0] if apk_paths else None,
+            hap_path=hap_paths[0] if hap_paths else None,
+            split_paths=split_paths,
+        )
+    directory = args.dir or config.data.get("last_scan_dir", "")
+    if not directory:
+        return PackageInfo(apk_path=None, hap_path=None)
+    max_depth = args.max_depth if args.max_depth is not None else config.data.get("scan_max_depth", DEFAULT_MAX_DEPTH)
+    return find_latest_packages(Path(directory), args.recursive, max_depth)
+
+
+def _build_coordinator(args: argparse.Namespace, config: ConfigManager) -> Optional["RemoteCoordinator"]:
+    addresses = args.agent or config.data.get("remote_agents", [])
+    if not addresses:
+        return None
+    from services.remote_agent import build_coordinator
+
+    token = args.agent_token if args.agent_token is not None else config.data.get("remote_agent_token", "")
+    return build_coordinator(addresses, token)
+
+
+def _backend_timeout(args: argparse.Namespace) -> float:
+    from services.device_detector import DEFAULT_BACKEND_TIMEOUT
+
+    return args.timeout if args.timeout is not None else DEFAULT_BACKEND_TIMEOUT
+
+
+def _detect_all(
+    args: argparse.Namespace, config: ConfigManager, probe: bool
+) -> Tuple["DetectionReport", Dict[str, "DeviceProperties"], Optional["RemoteCoordinator"]]:
+    from services.device_detector import detect_devices_report
+    from services.device_probe import get_default_probe
+
+    report = detect_devices_report(_backend_timeout(args))
+    properties = get_default_probe().probe(report.devices) if probe else {}
+    coordinator = _build_coordinator(args, config)
+    if coordinator is not None:
+        # 各 agent 的设备码带 "<agent 地址>/" 前缀，与本机设备合并后统一筛选
+        remote_report = coordinator.detect()
+        report.devices.extend(remote_report.devices)
+        report.backends.extend(remote_report.backends)
+        for device in remote_report.devices:
+            remote_properties = coordinator.properties(device.device_id)
+            if remote_properties is not None:
+                properties[device.device_id] = remote_properties
+    return report, properties, coordinator
+
+
+def _print_progress(progress: "InstallProgress") -> None:
+    sys.stderr.write(f"{progress.device_id}: {progress.line}\n")
+
+
+def command_devices(args: argparse.Namespace, config: ConfigManager) -> int:
+    report, properties, _coordinator = _detect_all(args, config, probe=not args.no_probe)
+    names = config.data.get("device_names", {})
+    _emit(
+        {
+            "devices": [
+                _device_payload(device, names, properties.get(device.device_id)) for device in report.devices
+            ],
+            "backends": [
+                {
+                    "platform": status.platform,
+                    "latency": round(status.latency, 3),
+                    "timed_out": status.timed_out,
+                    "error": status.error,
+                }
+                for status in report.backends
+            ],
+        }
+    )
+    return EXIT_OK if report.devices else EXIT_NO_DEVICES
+
+
+def _package_payload(path: Path, package_info: "PackageInfo") -> Dict[str, Any]:
+    from services.package_index import get_default_index
+
+    metadata = get_default_index().metadata_for(path)
+    return {
+        "path": str(path),
+        "splits": [str(split) for split in package_info.split_paths.get(path, [])],
+        "abi_variants": [str(variant) for variant in package_info.abi_variants.get(path, [])],
+        "package_name": metadata.package_name if metadata else None,
+        "version_code": metadata.version_code if metadata else None,
+        "version_name": metadata.version_name if metadata else None,
+        "abis": metadata.abis if metadata else [],
+    }
+
+
+def _integrity_payload(path: Path, package_info: "PackageInfo") -> List[Dict[str, Any]]:
+    from services.package_index import get_default_index
+
+    paths = [path] + package_info.split_paths.get(path, []) + package_info.abi_variants.get(path, [])
+    payload: List[Dict[str, Any]] = []
+    for item in paths:
+        result = get_default_index().integrity_for(item)
+        payload.append({"path": str(item), "ok": result.ok, "sha256": result.sha256, "error": result.error})
+    return payload
+
+
+def command_scan(args: argparse.Namespace, config: ConfigManager) -> int:
+    package_info = _resolve_packages(args, config)
+    packages = []
+    for path in package_info.apk_paths + package_info.hap_paths:
+        package = _package_payload(path, package_info)
+        if args.verify:
+            package["integrity"] = _integrity_payload(path, package_info)
+        packages.append(package)
+    _emit(
+        {
+            "apk": str(package_info.apk_path) if package_info.apk_path else None,
+            "hap": str(package_info.hap_path) if package_info.hap_path else None,
+            "packages": packages,
+        }
+    )
+    if not package_info.apk_path and not package_info.hap_path:
+        return EXIT_NO_PACKAGES
+    corrupt = any(not item["ok"] for package in packages for item in package.get("integrity", []))
+    return EXIT_INSTALL_FAILED if corrupt else EXIT_OK
+
+
+def _history_path(args: argparse.Namespace) -> Path:
+    from services.install_history import default_history_path
+
+    return default_history_path(Path(args.config) if args.config else default_config_path())
+
+
+def command_install(args: argparse.Namespace, config: ConfigManager) -> int:
+    from services.install_failures import REMEDY_ALLOW_TEST, RetryPolicy
+    from services.install_history import InstallHistory, build_record
+    from services.installer import InstallScheduler, InstallTask
+    from services.remote_agent import run_install_tasks
+
+    package_info = _resolve_packages(args, config)
+    if not package_info.apk_path and not package_info.hap_path:
+        _emit({"error": "未找到可安装的 APK/HAP", "results": []})
+        return EXIT_NO_PACKAGES
+    report, _properties, coordinator = _detect_all(args, config, probe=False)
+    names = config.data.get("device_names", {})
+    devices = _filter_devices(report.devices, args.device, args.platform, names)
+    tasks: List[InstallTask] = []
+    for device in devices:
+        if device.platform == "android":
+            for apk_path in package_info.apk_paths:
+                allow_test = args.allow_test or config.apk_needs_t(apk_path.name)
+                tasks.append(
+                    InstallTask(
+                        device.device_id,
+                        device.platform,
+                        apk_path,
+                        allow_test,
+                        args.force,
+                        split_paths=package_info.split_paths.get(apk_path, []),
+                        abi_variants=package_info.abi_variants.get(apk_path, []),
+                    )
+                )
+        elif device.platform == "harmony":
+            for hap_path in package_info.hap_paths:
+                tasks.append(
+                    InstallTask(
+                        device.device_id,
+                        device.platform,
+                        hap_path,
+                        force=args.force,
+                        split_paths=package_info.split_paths.get(hap_path, []),
+                        abi_variants=package_info.abi_variants.get(hap_path, []),
+                    )
+                )
+    if not tasks:
+        _emit(
+            {
+                "error": "没有匹配的设备",
+                "devices": [_device_payload(device, names) for device in report.devices],
+                "results": [],
+            }
+        )
+        return EXIT_NO_DEVICES
+    concurrency = args.concurrency or config.data.get("max_parallel_installs", 4)
+    scheduler = InstallScheduler(
+        max_workers=concurrency,
+        platform_limits=config.data.get("platform_install_limits"),
+        retry_policy=RetryPolicy(
+            max_attempts=args.attempts or config.data.get("install_max_attempts", 3),
+            backoff_seconds=config.data.get("install_retry_backoff", 1.0),
+            reinstall_on_signature_mismatch=args.reinstall_on_signature_mismatch
+            or config.data.get("reinstall_on_signature_mismatch", False),
+        ),
+        probe_devices=not args.no_probe,
+        check_integrity=not args.no_integrity_check and config.data.get("check_package_integrity", True),
+    )
+    history = InstallHistory(_history_path(args))
+    run_id = uuid.uuid4().hex[:12]
+    detect_latency = {status.platform: status.latency for status in report.backends if status.ok}
+
+    def handle_result(result: "DeviceInstallResult") -> None:
+        history.append(build_record(result, run_id, detect_latency))
+        if result.success and REMEDY_ALLOW_TEST in result.remedies:
+            config.add_apk_need_t(result.task.package_path.name)
+
+    summary = run_install_tasks(
+        scheduler,
+        tasks,
+        coordinator,
+        on_result=handle_result,
+        on_progress=_print_progress if args.progress else None,
+    )
+    _emit(
+        {
+            "apk": str(package_info.apk_path) if package_info.apk_path else None,
+            "hap": str(package_info.hap_path) if package_info.hap_path else None,
+            "results": [_result_payload(result) for result in summary.results],
+            "summary": {
+                "succeeded": len(summary.succeeded),
+                "skipped": len(summary.skipped),
+                "failed": len(summary.failed),
+                "elapsed": round(summary.elapsed, 3),
+            },
+        }
+    )
+    return EXIT_INSTALL_FAILED if summary.failed else EXIT_OK
+
+
+def command_agent(args: argparse.Namespace, config: ConfigManager) -> int:
+    from services.remote_agent import InstallAgent, default_agent_cache_dir
+
+    token = args.token if args.token is not None else config.data.get("remote_agent_token", "")
+    if not token and args.host not in ("127.0.0.1", "localhost", "::1"):
+        sys.stderr.write("警告：agent 未设置 token，局域网内任何人都可以向本机设备安装应用\n")
+    config_path = Path(args.config) if args.config else default_config_path()
+    cache_dir = Path(args.cache_dir) if args.cache_dir else default_agent_cache_dir(config_path)
+    agent = InstallAgent(
+        (args.host, args.port),
+        cache_dir,
+        token=token,
+        detect_timeout=_backend_timeout(args),
+        platform_limits=config.data.get("platform_install_limits"),
+        on_log=(lambda message: sys.stderr.write(message + "\n")) if args.verbose else None,
+    )
+    # 先输出实际监听地址（--port 0 时由系统分配），便于脚本读取
+    _emit({"agent": agent.address, "cache_dir": str(cache_dir)})
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+    return EXIT_OK
+
+
+def command_history(args: argparse.Namespace, config: ConfigManager) -> int:
+    from services.install_history import InstallHistory, summarize_history
+
+    history = InstallHistory(_history_path(args))
+    records = history.load(args.limit)
+    names = config.data.get("device_names", {})
+    summaries = []
+    for summary in summarize_history(records):
+        stats = {"total": summary.total, **summary.phases}
+        summaries.append(
+            {
+                "scope": summary.scope,
+                "key": summary.key,
+                "name": names.get(summary.key, "") if summary.scope == "device" else "",
+                "runs": summary.runs,
+                "failures": summary.failures,
+                "durations": {
+                    name: {"count": value.count, "p50": value.p50, "p95": value.p95}
+                    for name, value in stats.items()
+                    if value is not None
+                },
+            }
+        )
+    _emit({"history": str(history.path), "records": len(records), "summary": summaries})
+    return EXIT_OK
+
+
+def _add_package_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--dir", help="安装包目录，默认使用上次扫描目录")
+    parser.add_argument("--apk", nargs="+", help="直接指定 APK 文件；多个文件时第一个为 base，其余为 split")
+    parser.add_argument("--hap", nargs="+", help="直接指定 HAP 文件；多个文件时第一个为 entry，其余为 feature")
+    parser.add_argument("--recursive", action="store_true", help="扫描子目录")
+    parser.add_argument("--max-depth", type=int, help="递归扫描最大深度")
+
+
+def _add_agent_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--agent", action="append", default=[], help="远程 agent 地址 host:port，可重复指定；默认读取配置 remote_agents"
+    )
+    parser.add_argument("--agent-token", help="远程 agent 的 token，默认读取配置 remote_agent_token")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="install_new_apk_hap", description="APK/HAP 批量安装命令行")
+    parser.add_argument("--config", help="配置文件路径，默认与图形界面共用")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    devices_parser = subparsers.add_parser("devices", help="列出已连接设备")
+    devices_parser.add_argument("--timeout", type=float, help="单个后端探测超时秒数，默认 5 秒")
+    devices_parser.add_argument("--no-probe", action="store_true", help="不读取设备型号、系统版本、ABI、存储与电量")
+    _add_agent_arguments(devices_parser)
+
+    scan_parser = subparsers.add_parser("scan", help="扫描最新安装包")
+    _add_package_arguments(scan_parser)
+    scan_parser.add_argument(
+        "--verify", action="store_true", help="校验安装包 zip 结构与各成员 CRC 并输出 sha256，损坏时退出码为 1"
+    )
+
+    install_parser = subparsers.add_parser("install", help="安装到匹配的设备")
+    _add_package_arguments(install_parser)
+    install_parser.add_argument(
+        "--device", action="append", default=[], help="设备码或设备名称通配符，可重复指定；默认全部设备"
+    )
+    install_parser.add_argument("--platform", choices=("android", "harmony"), help="只安装指定平台")
+    install_parser.add_argument("--concurrency", type=int, help="安装总并发数")
+    install_parser.add_argument("--allow-test", action="store_true", help="APK 使用 -t 安装")
+    install_parser.add_argument("--force", action="store_true", help="忽略版本比对强制安装")
+    install_parser.add_argument("--attempts", type=int, help="每台设备最多尝试次数，默认读取配置")
+    install_parser.add_argument(
+        "--reinstall-on-signature-mismatch", action="store_true", help="签名不一致时卸载后重装（会清除应用数据）"
+    )
+    install_parser.add_argument(
+        "--no-probe", action="store_true", help="安装前不探测设备 ABI 与可用空间（不按 ABI 选包、不预检空间）"
+    )
+    install_parser.add_argument(
+        "--no-integrity-check", action="store_true", help="传输前不校验安装包 zip 结构与 CRC"
+    )
+    install_parser.add_argument("--progress", action="store_true", help="在 stderr 输出安装进度")
+    install_parser.add_argument("--timeout", type=float, help="单个后端探测超时秒数，默认 5 秒")
+    _add_agent_arguments(install_parser)
+
+    agent_parser = subparsers.add_parser("agent", help="作为远程 agent 运行，供其他主机的界面或命令行分发安装")
+    agent_parser.add_argument("--host", default="127.0.0.1", help="监听地址，局域网使用时指定 0.0.0.0")
+    agent_parser.add_argument("--port", type=int, default=8765, help="监听端口，0 表示由系统分配")
+    agent_parser.add_argument("--token", help="访问 token，默认读取配置 remote_agent_token")
+    agent_parser.add_argument("--cache-dir", help="接收安装包的缓存目录，默认在配置目录下")
+    agent_parser.add_argument("--timeout", type=float, help="单个后端探测超时秒数，默认 5 秒")
+    agent_parser.add_argument("--verbose", action="store_true", help="在 stderr 输出请求日志")
+
+    history_parser = subparsers.add_parser("history", help="按设备与平台汇总安装耗时 p50/p95")
+    history_parser.add_argument("--limit", type=int, default=5000, help="读取最近多少条安装记录")
+    return parser
+
+
+def _configure_services(config_path: Path, config: ConfigManager) -> None:
+    from services.adb_client import configure_default_client
+    from services.device_probe import DEFAULT_PROBE_TTL, configure_default_probe
+    from services.package_index import configure_default_index, default_index_path
+
+    configure_default_client(config.data.get("adb_socket_client", False))
+    configure_default_index(default_index_path(config_path))
+    configure_default_probe(config.data.get("device_probe_ttl", DEFAULT_PROBE_TTL))
+
+
+def _flush_services() -> None:
+    from services.package_index import get_default_index
+
+    get_default_index().flush()
+
+
+_COMMANDS = {
+    "devices": command_devices,
+    "scan": command_scan,
+    "install": command_install,
+    "history": command_history,
+    "agent": command_agent,
+}
+_SERVICE_COMMANDS = {"devices", "scan", "install", "agent"}
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    config_path = Path(args.config) if args.config else default_config_path()
+    config = ConfigManager(config_path)
+    uses_services = args.command in _SERVICE_COMMANDS
+    if uses_services:
+        _configure_services(config_path, config)
+    try:
+        return _COMMANDS[args.command](args, config)
+    finally:
+        config.flush()
+        if uses_services:
+            _flush_services()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
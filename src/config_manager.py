@@ -1,19 +1,63 @@
+import copy
 import json
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Set
 
 
 DEFAULT_CONFIG = {
     "device_names": {},
     "last_scan_dir": "",
     "apk_needs_t": [],
+    "max_parallel_installs": 4,
+    "platform_install_limits": {"android": 4, "harmony": 2},
+    "scan_recursive": False,
+    "scan_max_depth": 3,
+    "hdc_poll_interval": 2.0,
+    "detect_timeout": 5.0,
+    "adb_socket_client": False,
+    "watch_stable_seconds": 2.0,
+    "watch_debounce_seconds": 3.0,
+    "log_max_lines": 2000,
+    "install_max_attempts": 3,
+    "install_retry_backoff": 1.0,
+    "reinstall_on_signature_mismatch": False,
+    "device_probe_ttl": 60.0,
+    "check_package_integrity": True,
+    "remote_agents": [],
+    "remote_agent_token": "",
 }
 
+DEFAULT_SAVE_DELAY = 0.5
+# 写盘失败后重试间隔的上限
+MAX_SAVE_RETRY_DELAY = 30.0
+
+
+def default_config_path() -> Path:
+    appdata = os.getenv("APPDATA")
+    if appdata:
+        base_dir = Path(appdata)
+    else:
+        base_dir = Path.home() / ".config"
+    return base_dir / "install_new_apk_hap" / "app_config.json"
+
 
 class ConfigManager:
-    def __init__(self, config_path: Path) -> None:
+    def __init__(self, config_path: Path, save_delay: float = DEFAULT_SAVE_DELAY) -> None:
         self._config_path = config_path
-        self._config = DEFAULT_CONFIG.copy()
+        self._config = copy.deepcopy(DEFAULT_CONFIG)
+        self._apk_needs_t: Set[str] = set()
+        self._save_delay = save_delay
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._saver: Optional[threading.Thread] = None
+        self._save_deadline = 0.0
+        self._dirty = False
+        # 每次修改递增，写盘期间又有修改时保存后仍保持未保存状态
+        self._revision = 0
         self.load()
 
     @property
@@ -24,27 +68,126 @@ class ConfigManager:
         if not self._config_path.exists():
             self.save()
             return
-        with self._config_path.open("r", encoding="utf-8") as file:
-            self._config = json.load(file)
-        for key, value in DEFAULT_CONFIG.items():
-            self._config.setdefault(key, value)
+        try:
+            with self._config_path.open("r", encoding="utf-8") as file:
+                loaded = json.load(file)
+        except ValueError:
+            # 旧版本非原子写入可能留下损坏文件，备份后使用默认配置
+            self._config_path.replace(self._config_path.with_suffix(".corrupt.json"))
+            loaded = {}
+        with self._lock:
+            self._config = loaded
+            for key, value in DEFAULT_CONFIG.items():
+                self._config.setdefault(key, copy.deepcopy(value))
+            self._apk_needs_t = set(self._config["apk_needs_t"])
 
     def save(self) -> None:
+        # 串行化写盘，避免后台保存与关闭时的 flush 交错导致旧内容覆盖新内容
+        with self._write_lock:
+            with self._lock:
+                content = json.dumps(self._config, ensure_ascii=False, indent=2)
+                revision = self._revision
+            self._write_atomic(content)
+            # 写盘成功后才清除未保存标记，失败时修改仍待保存
+            with self._lock:
+                if self._revision == revision:
+                    self._dirty = False
+
+    def _write_atomic(self, content: str) -> None:
         self._config_path.parent.mkdir(parents=True, exist_ok=True)
-        with self._config_path.open("w", encoding="utf-8") as file:
-            json.dump(self._config, file, ensure_ascii=False, indent=2)
+        # 先写临时文件再替换，写入中途崩溃不会损坏原配置
+        fd, temp_path = tempfile.mkstemp(
+            dir=self._config_path.parent, prefix=f"{self._config_path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(content)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self._config_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
 
-    def set_device_name(self, device_id: str, name: str) -> None:
-        self._config.setdefault("device_names", {})
-        self._config["device_names"][device_id] = name
+    def _schedule_save(self) -> None:
+        with self._lock:
+            self._dirty = True
+            self._revision += 1
+            # 连续修改只推迟保存时间点，由同一个后台线程在最后一次修改后保存一次
+            self._save_deadline = time.monotonic() + self._save_delay
+            if self._saver is None:
+                self._saver = threading.Thread(target=self._saver_loop, name="config-saver", daemon=True)
+                self._saver.start()
+
+    def _saver_loop(self) -> None:
+        failures = 0
+        try:
+            while True:
+                with self._lock:
+                    if not self._dirty:
+                        self._saver = None
+                        return
+                    remaining = self._save_deadline - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                    continue
+                try:
+                    self.save()
+                    failures = 0
+                except OSError:
+                    # 配置文件被杀毒软件或编辑器占用时替换会失败，按倍数退避后重试
+                    failures += 1
+                    with self._lock:
+                        self._save_deadline = time.monotonic() + min(
+                            MAX_SAVE_RETRY_DELAY, max(self._save_delay, DEFAULT_SAVE_DELAY) * 2 ** failures
+                        )
+        finally:
+            # 线程异常退出时同样释放，下一次修改会启动新的保存线程
+            with self._lock:
+                if self._saver is threading.current_thread():
+                    self._saver = None
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
         self.save()
 
+    def set_device_name(self, device_id: str, name: str) -> None:
+        with self._lock:
+            device_names = self._config.setdefault("device_names", {})
+            if device_names.get(device_id) == name:
+                return
+            device_names[device_id] = name
+        self._schedule_save()
+
     def set_last_scan_dir(self, path: str) -> None:
-        self._config["last_scan_dir"] = path
-        self.save()
+        with self._lock:
+            if self._config.get("last_scan_dir") == path:
+                return
+            self._config["last_scan_dir"] = path
+        self._schedule_save()
+
+    def set_max_parallel_installs(self, value: int) -> None:
+        with self._lock:
+            self._config["max_parallel_installs"] = value
+        self._schedule_save()
+
+    def set_scan_recursive(self, recursive: bool) -> None:
+        with self._lock:
+            self._config["scan_recursive"] = recursive
+        self._schedule_save()
+
+    def apk_needs_t(self, apk_name: str) -> bool:
+        return apk_name in self._apk_needs_t
 
     def add_apk_need_t(self, apk_name: str) -> None:
-        self._config.setdefault("apk_needs_t", [])
-        if apk_name not in self._config["apk_needs_t"]:
-            self._config["apk_needs_t"].append(apk_name)
-            self.save()
+        with self._lock:
+            if apk_name in self._apk_needs_t:
+                return
+            self._apk_needs_t.add(apk_name)
+            self._config.setdefault("apk_needs_t", []).append(apk_name)
+        self._schedule_save()
@@ -0,0 +1,69 @@
+import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import List, Optional
+
+
+DEFAULT_MAX_LINES = 2000
+DEFAULT_FLUSH_INTERVAL_MS = 100
+DEFAULT_MAX_BATCH = 500
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+
+
+class LogPipeline:
+    def __init__(
+        self,
+        log_path: Optional[Path],
+        max_bytes: int = LOG_FILE_MAX_BYTES,
+        backup_count: int = LOG_FILE_BACKUP_COUNT,
+    ) -> None:
+        self._display_queue: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self._listener: Optional[QueueListener] = None
+        self._file_handler: Optional[RotatingFileHandler] = None
+        self._logger = logging.getLogger("install_new_apk_hap")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if log_path is not None:
+            self._start_file_mirror(log_path, max_bytes, backup_count)
+
+    def _start_file_mirror(self, log_path: Path, max_bytes: int, backup_count: int) -> None:
+        try:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+        except OSError:
+            return
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        # 文件写入放到监听线程，界面线程与安装线程只负责入队
+        file_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self._logger.handlers = [QueueHandler(file_queue)]
+        self._file_handler = file_handler
+        self._listener = QueueListener(file_queue, file_handler)
+        self._listener.start()
+
+    def put(self, message: str) -> None:
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self._display_queue.put(f"[{timestamp}] {message}")
+        if self._listener is not None:
+            self._logger.info(message)
+
+    def drain(self, max_items: int = DEFAULT_MAX_BATCH) -> List[str]:
+        lines: List[str] = []
+        while len(lines) < max_items:
+            try:
+                lines.append(self._display_queue.get_nowait())
+            except queue.Empty:
+                break
+        return lines
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._file_handler is not None:
+            self._file_handler.close()
+            self._file_handler = None
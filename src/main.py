@@ -1,15 +1,61 @@
-import os
-import threading
+import time
 import tkinter as tk
-from datetime import datetime
+import uuid
 from pathlib import Path
 from tkinter import filedialog, messagebox, ttk
-from typing import Dict, List, Optional, Set
-
-from config_manager import ConfigManager
-from services.device_detector import DeviceInfo, detect_devices
-from services.installer import install_android, install_harmony
-from services.package_scanner import find_latest_packages
+from typing import Dict, List, Optional, Set, Tuple
+
+from config_manager import ConfigManager, default_config_path
+from log_pipeline import DEFAULT_FLUSH_INTERVAL_MS, DEFAULT_MAX_LINES, LogPipeline
+from services.adb_client import configure_default_client
+from services.async_runtime import (
+    LANE_BACKGROUND,
+    LANE_DEVICES,
+    LANE_INSTALL,
+    LANE_SCAN,
+    Operation,
+    check_cancelled,
+    get_default_runtime,
+)
+from services.device_detector import (
+    DEFAULT_BACKEND_TIMEOUT,
+    BackendStatus,
+    DetectionReport,
+    DeviceInfo,
+    format_backend_latency,
+)
+from services.device_probe import (
+    DEFAULT_PROBE_TTL,
+    DeviceProperties,
+    configure_default_probe,
+    format_device_properties,
+    get_default_probe,
+)
+from services.device_tracker import DEFAULT_HDC_POLL_INTERVAL, DeviceDiff, DeviceTracker, diff_devices
+from services.folder_watcher import DEFAULT_DEBOUNCE_SECONDS, DEFAULT_STABLE_SECONDS, FolderWatcher
+from services.install_history import (
+    PHASE_LABELS,
+    PHASES,
+    HistorySummary,
+    InstallHistory,
+    build_record,
+    default_history_path,
+    format_duration_stats,
+    format_phases,
+    summarize_history,
+)
+from services.install_failures import (
+    FAILURE_CANCELLED,
+    FAILURE_LABELS,
+    REMEDY_ALLOW_TEST,
+    REMEDY_LABELS,
+    RetryPolicy,
+)
+from services.installer import DeviceInstallResult, InstallProgress, InstallScheduler, InstallTask
+from services.package_index import configure_default_index, default_index_path, get_default_index
+from services.package_scanner import DEFAULT_MAX_DEPTH, PackageInfo, find_latest_packages, package_display_info
+from services.remote_agent import build_coordinator, run_install_tasks
+from ui_bridge import TkBridge
 
 
 class App(tk.Tk):
@@ -21,14 +67,64 @@ class App(tk.Tk):
         self.geometry("500x600")
 
         self.config_manager = ConfigManager(self._get_config_path())
+        self.log_pipeline = LogPipeline(self._get_config_path().parent / "logs" / "install.log")
+        self.install_history = InstallHistory(default_history_path(self._get_config_path()))
+        self._log_max_lines = self.config_manager.data.get("log_max_lines", DEFAULT_MAX_LINES)
+        configure_default_client(self.config_manager.data.get("adb_socket_client", False))
+        configure_default_index(default_index_path(self._get_config_path()))
+        configure_default_probe(self.config_manager.data.get("device_probe_ttl", DEFAULT_PROBE_TTL))
         self.devices: List[DeviceInfo] = []
         self.latest_apk: Optional[Path] = None
         self.latest_hap: Optional[Path] = None
+        self.latest_apks: List[Path] = []
+        self.latest_haps: List[Path] = []
+        self.latest_splits: Dict[Path, List[Path]] = {}
+        self.latest_abi_variants: Dict[Path, List[Path]] = {}
+        self.folder_watcher: Optional[FolderWatcher] = None
+        self._installing = False
+        self._install_operation: Optional[Operation] = None
+        self._refresh_operation: Optional[Operation] = None
+        self._scan_operation: Optional[Operation] = None
+        self._pending_auto_install = False
+        # 监听到的新写入文件，自动安装只安装包含这些文件的安装集合
+        self._auto_install_paths: Set[Path] = set()
+        self._progress_text: Dict[str, str] = {}
+
+        # 刷新、探测、扫描、安装与统计共用一个后台事件循环，结果经 TkBridge 回到界面线程
+        self.runtime = get_default_runtime()
+        self.runtime.start()
+        self.bridge = TkBridge(self)
+        self.coordinator = build_coordinator(
+            self.config_manager.data.get("remote_agents", []),
+            self.config_manager.data.get("remote_agent_token", ""),
+        )
+        self.device_tracker = DeviceTracker(
+            on_change=self._on_device_change,
+            hdc_poll_interval=self.config_manager.data.get("hdc_poll_interval", DEFAULT_HDC_POLL_INTERVAL),
+            backend_timeout=self.config_manager.data.get("detect_timeout", DEFAULT_BACKEND_TIMEOUT),
+            on_backend_issue=self._on_backend_issue,
+            remote_detect=self.coordinator.detect if self.coordinator else None,
+        )
 
         self._build_ui()
-        self.refresh_devices()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.bridge.start()
+        self._flush_logs()
+        self.log("开始监听设备连接变化")
+        self.device_tracker.start()
         self.load_last_scan_dir()
 
+    def on_close(self) -> None:
+        self.device_tracker.stop()
+        self._stop_folder_watcher()
+        # 取消未完成的操作并终止其子进程
+        self.runtime.stop()
+        self.bridge.stop()
+        self.config_manager.flush()
+        get_default_index().flush()
+        self.log_pipeline.close()
+        self.destroy()
+
     def _build_ui(self) -> None:
         container = ttk.Frame(self)
         container.pack(fill=tk.BOTH, expand=True, padx=12, pady=12)
@@ -36,7 +132,7 @@ class App(tk.Tk):
         device_frame = ttk.LabelFrame(container, text="设备列表")
         device_frame.pack(fill=tk.BOTH, expand=False)
 
-        columns = ("device_id", "name", "status", "platform")
+        columns = ("device_id", "name", "status", "platform", "info", "progress")
         self.device_tree = ttk.Treeview(
             device_frame,
             columns=columns,
@@ -48,10 +144,14 @@ class App(tk.Tk):
         self.device_tree.heading("name", text="名称")
         self.device_tree.heading("status", text="状态")
         self.device_tree.heading("platform", text="平台")
+        self.device_tree.heading("info", text="设备信息")
+        self.device_tree.heading("progress", text="安装进度")
         self.device_tree.column("device_id", width=260)
         self.device_tree.column("name", width=200)
         self.device_tree.column("status", width=120)
         self.device_tree.column("platform", width=120)
+        self.device_tree.column("info", width=320)
+        self.device_tree.column("progress", width=140)
         self.device_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.device_tree.bind("<<TreeviewSelect>>", self.on_device_select)
 
@@ -64,6 +164,7 @@ class App(tk.Tk):
 
         self.refresh_button = ttk.Button(button_frame, text="刷新设备", command=self.refresh_devices)
         self.refresh_button.pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="耗时统计", command=self.show_install_stats).pack(side=tk.LEFT, padx=6)
 
         name_frame = ttk.Frame(container)
         name_frame.pack(fill=tk.X, pady=8)
@@ -79,7 +180,8 @@ class App(tk.Tk):
         self.folder_var = tk.StringVar()
         ttk.Entry(folder_frame, textvariable=self.folder_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=6, pady=6)
         ttk.Button(folder_frame, text="选择目录", command=self.choose_folder).pack(side=tk.LEFT, padx=6)
-        ttk.Button(folder_frame, text="扫描最新包", command=self.scan_latest_packages).pack(side=tk.LEFT)
+        self.scan_button = ttk.Button(folder_frame, text="扫描最新包", command=self.scan_latest_packages)
+        self.scan_button.pack(side=tk.LEFT)
 
         package_frame = ttk.LabelFrame(container, text="最新安装包")
         package_frame.pack(fill=tk.X, pady=8)
@@ -89,6 +191,22 @@ class App(tk.Tk):
         self.hap_label = ttk.Label(package_frame, text="HAP: 未找到")
         self.hap_label.pack(anchor=tk.W, padx=6, pady=2)
 
+        self.scan_recursive_var = tk.BooleanVar(value=self.config_manager.data.get("scan_recursive", False))
+        ttk.Checkbutton(
+            package_frame,
+            text="扫描子目录",
+            variable=self.scan_recursive_var,
+            command=self.on_scan_recursive_toggle,
+        ).pack(anchor=tk.W, padx=6, pady=2)
+
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            package_frame,
+            text="监听目录，新包自动安装",
+            variable=self.watch_var,
+            command=self.on_watch_toggle,
+        ).pack(anchor=tk.W, padx=6, pady=2)
+
         self.apk_test_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(package_frame, text="APK 需要 -t 安装", variable=self.apk_test_var).pack(
             anchor=tk.W, padx=6, pady=2
@@ -103,6 +221,21 @@ class App(tk.Tk):
             install_frame, text="安装到所选设备", command=self.install_to_selected
         )
         self.install_button.pack(side=tk.LEFT)
+        self.cancel_button = ttk.Button(
+            install_frame, text="取消安装", command=self.cancel_install, state=tk.DISABLED
+        )
+        self.cancel_button.pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Label(install_frame, text="并发数:").pack(side=tk.LEFT, padx=(12, 0))
+        self.concurrency_var = tk.IntVar(value=self.config_manager.data.get("max_parallel_installs", 4))
+        ttk.Spinbox(install_frame, from_=1, to=32, width=4, textvariable=self.concurrency_var).pack(
+            side=tk.LEFT, padx=6
+        )
+        self.force_install_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(install_frame, text="强制安装", variable=self.force_install_var).pack(side=tk.LEFT)
+        self.reinstall_var = tk.BooleanVar(
+            value=self.config_manager.data.get("reinstall_on_signature_mismatch", False)
+        )
+        ttk.Checkbutton(install_frame, text="签名不一致时卸载重装", variable=self.reinstall_var).pack(side=tk.LEFT)
 
         log_frame = ttk.LabelFrame(container, text="日志")
         log_frame.pack(fill=tk.BOTH, expand=True, pady=8)
@@ -110,47 +243,63 @@ class App(tk.Tk):
         self.log_text.pack(fill=tk.BOTH, expand=True)
 
     def _get_config_path(self) -> Path:
-        appdata = os.getenv("APPDATA")
-        if appdata:
-            base_dir = Path(appdata)
-        else:
-            base_dir = Path.home() / ".config"
-        return base_dir / "install_new_apk_hap" / "app_config.json"
+        return default_config_path()
 
     def log(self, message: str) -> None:
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
+        self.log_pipeline.put(message)
+
+    def _flush_logs(self) -> None:
+        lines = self.log_pipeline.drain()
+        if lines:
+            # 一批日志只插入与滚动一次，超出上限时裁掉最早的行（完整内容保留在日志文件中）
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            excess = line_count - self._log_max_lines
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.see(tk.END)
+        self.after(DEFAULT_FLUSH_INTERVAL_MS, self._flush_logs)
 
     def refresh_devices(self) -> None:
         self._set_refresh_state(True)
         self._log_threadsafe("开始刷新设备列表")
-        threading.Thread(target=self._refresh_devices_worker, daemon=True).start()
+        # 设备通道独立限流，安装进行中刷新也不会排队等待
+        self._refresh_operation = self.runtime.submit(
+            LANE_DEVICES,
+            self._refresh_devices_worker,
+            name="refresh",
+            replace=True,
+            on_done=lambda operation: self.bridge.call(self._finish_refresh_operation, operation),
+        )
+
+    def _finish_refresh_operation(self, operation: Operation) -> None:
+        # 无论成功、失败还是被新的刷新取代，都经界面线程收尾；只有最新一次刷新恢复按钮
+        error = operation.exception()
+        if error is not None:
+            self.log(f"刷新设备失败: {error}")
+        if operation is self._refresh_operation:
+            self._refresh_operation = None
+            self._set_refresh_state(False)
 
     def _refresh_devices_worker(self) -> None:
-        devices = detect_devices()
-        self.after(0, self._apply_device_refresh, devices)
+        report = self.device_tracker.refresh()
+        # 手动刷新时忽略缓存，重新读取可用空间与电量
+        devices = self.device_tracker.snapshot()
+        properties = get_default_probe().probe(self._local_devices(devices), force=True)
+        properties.update(self._remote_properties(devices))
+        self.bridge.call(self._finish_device_refresh, report)
+        self.bridge.call(self._apply_device_properties, properties)
+
+    def _on_backend_issue(self, status: BackendStatus) -> None:
+        if status.error:
+            self._log_threadsafe(f"{status.platform} 不可用: {status.error}，保留上次设备列表")
+            return
+        name = "adb" if status.platform == "android" else "hdc"
+        self._log_threadsafe(f"{name} 设备探测超时（{status.latency:.2f}s），保留上次设备列表")
 
-    def _apply_device_refresh(self, devices: List[DeviceInfo]) -> None:
-        self.devices = devices
-        self.device_tree.delete(*self.device_tree.get_children())
-        self._update_device_tree_height()
-        name_mapping: Dict[str, str] = self.config_manager.data.get("device_names", {})
-        only_device_id: Optional[str] = None
-        for device in self.devices:
-            name = name_mapping.get(device.device_id, "")
-            self.device_tree.insert(
-                "",
-                tk.END,
-                iid=device.device_id,
-                values=(device.device_id, name, device.status, device.platform),
-            )
-            if len(self.devices) == 1:
-                only_device_id = device.device_id
-        if only_device_id:
-            self.device_tree.selection_set(only_device_id)
-            current_name = self.device_tree.set(only_device_id, "name")
-            self.name_var.set(current_name)
+    def _finish_device_refresh(self, report: DetectionReport) -> None:
+        self._sync_device_table(self.device_tracker.snapshot())
+        self.log(f"设备探测耗时: {format_backend_latency(report)}")
         android_count = sum(1 for device in self.devices if device.platform == "android")
         harmony_count = sum(1 for device in self.devices if device.platform == "harmony")
         total_count = len(self.devices)
@@ -161,7 +310,84 @@ class App(tk.Tk):
                 "设备列表已刷新："
                 f"Android {android_count} 台, Harmony {harmony_count} 台, 总计 {total_count} 台"
             )
-        self._set_refresh_state(False)
+
+    def _on_device_change(self, diff: DeviceDiff) -> None:
+        self.bridge.call(self._apply_device_refresh, diff)
+
+    def _sync_device_table(self, devices: List[DeviceInfo]) -> None:
+        diff = diff_devices(self.devices, devices)
+        if not diff.empty:
+            self._apply_device_refresh(diff)
+
+    def _apply_device_refresh(self, diff: DeviceDiff) -> None:
+        self.devices = diff.devices
+        name_mapping: Dict[str, str] = self.config_manager.data.get("device_names", {})
+        for device in diff.removed:
+            if self.device_tree.exists(device.device_id):
+                self.device_tree.delete(device.device_id)
+            self.log(f"设备已断开: {device.device_id}")
+        for device in diff.added + diff.changed:
+            if self.device_tree.exists(device.device_id):
+                # 逐列更新，保留安装进度列
+                self.device_tree.set(device.device_id, "status", device.status)
+                self.device_tree.set(device.device_id, "platform", device.platform)
+            else:
+                values = (
+                    device.device_id,
+                    name_mapping.get(device.device_id, ""),
+                    device.status,
+                    device.platform,
+                    format_device_properties(self._cached_properties(device.device_id)),
+                    "",
+                )
+                self.device_tree.insert("", tk.END, iid=device.device_id, values=values)
+        for device in diff.added:
+            self.log(f"设备已连接: {device.device_id} ({device.platform}, {device.status})")
+        for device in diff.changed:
+            self.log(f"设备状态变化: {device.device_id} -> {device.status}")
+        self._update_device_tree_height()
+        online = [device for device in diff.added + diff.changed if device.status == "device"]
+        if online:
+            self._probe_devices_async(online)
+        if len(self.devices) == 1 and diff.added:
+            only_device_id = self.devices[0].device_id
+            self.device_tree.selection_set(only_device_id)
+            current_name = self.device_tree.set(only_device_id, "name")
+            self.name_var.set(current_name)
+
+    def _probe_devices_async(self, devices: List[DeviceInfo]) -> None:
+        self.runtime.submit(LANE_DEVICES, self._probe_devices_worker, devices, name="probe")
+
+    def _probe_devices_worker(self, devices: List[DeviceInfo]) -> None:
+        properties = get_default_probe().probe(self._local_devices(devices))
+        properties.update(self._remote_properties(devices))
+        self.bridge.call(self._apply_device_properties, properties)
+
+    def _local_devices(self, devices: List[DeviceInfo]) -> List[DeviceInfo]:
+        if self.coordinator is None:
+            return devices
+        return [device for device in devices if not self.coordinator.owns(device.device_id)]
+
+    def _remote_properties(self, devices: List[DeviceInfo]) -> Dict[str, DeviceProperties]:
+        # 远程设备由 agent 在其主机上探测，随设备列表一起上报
+        if self.coordinator is None:
+            return {}
+        properties: Dict[str, DeviceProperties] = {}
+        for device in devices:
+            device_properties = self.coordinator.properties(device.device_id)
+            if device_properties is not None:
+                properties[device.device_id] = device_properties
+        return properties
+
+    def _apply_device_properties(self, properties: Dict[str, DeviceProperties]) -> None:
+        for device_id, device_properties in properties.items():
+            if self.device_tree.exists(device_id):
+                self.device_tree.set(device_id, "info", format_device_properties(device_properties))
+
+    def _cached_properties(self, device_id: str) -> Optional[DeviceProperties]:
+        if self.coordinator is not None and self.coordinator.owns(device_id):
+            return self.coordinator.properties(device_id)
+        return get_default_probe().cached(device_id)
 
     def _update_device_tree_height(self) -> None:
         display_count = max(1, min(len(self.devices), self._DEVICE_LIST_MAX_ROWS))
@@ -200,6 +426,8 @@ class App(tk.Tk):
         self.log(f"已选择安装包目录: {folder}")
         self.config_manager.set_last_scan_dir(folder)
         self.scan_latest_packages()
+        if self.watch_var.get():
+            self._start_folder_watcher()
 
     def load_last_scan_dir(self) -> None:
         last_dir = self.config_manager.data.get("last_scan_dir", "")
@@ -221,17 +449,107 @@ class App(tk.Tk):
             messagebox.showwarning("提示", "目录不存在")
             self.log(f"扫描失败：目录不存在 {directory}")
             return
-        self.log(f"开始扫描最新安装包: {directory}")
-        package_info = find_latest_packages(directory)
+        recursive = self.scan_recursive_var.get()
+        max_depth = self.config_manager.data.get("scan_max_depth", DEFAULT_MAX_DEPTH)
+        self.log(f"开始扫描最新安装包: {directory}" + (f"（含子目录，深度 {max_depth}）" if recursive else ""))
+        self.scan_button.config(state=tk.DISABLED)
+        # 切换目录或递归选项时取消尚未完成的旧扫描
+        self._scan_operation = self.runtime.submit(
+            LANE_SCAN,
+            self._scan_packages_worker,
+            directory,
+            recursive,
+            max_depth,
+            name="scan",
+            replace=True,
+            on_done=lambda operation: self.bridge.call(self._finish_scan_operation, operation),
+        )
+
+    def _finish_scan_operation(self, operation: Operation) -> None:
+        error = operation.exception()
+        if error is not None:
+            self.log(f"扫描失败: {error}")
+        if operation is self._scan_operation:
+            self._scan_operation = None
+            self.scan_button.config(state=tk.NORMAL)
+
+    def _scan_packages_worker(self, directory: Path, recursive: bool, max_depth: int) -> None:
+        started = time.monotonic()
+        package_info = find_latest_packages(directory, recursive, max_depth)
+        # 已被新的扫描取代时丢弃结果
+        check_cancelled()
+        self.bridge.call(self._apply_scan_result, package_info, time.monotonic() - started)
+
+    def _apply_scan_result(self, package_info: PackageInfo, elapsed: float) -> None:
+        apk_name, hap_name = self._set_latest_packages(package_info)
+        self.log(f"已扫描最新安装包: APK={apk_name}, HAP={hap_name}（耗时 {elapsed:.2f}s）")
+
+    def _set_latest_packages(self, package_info: PackageInfo) -> Tuple[str, str]:
         self.latest_apk = package_info.apk_path
         self.latest_hap = package_info.hap_path
-        apk_name = self.latest_apk.name if self.latest_apk else "未找到"
-        hap_name = self.latest_hap.name if self.latest_hap else "未找到"
+        self.latest_apks = package_info.apk_paths
+        self.latest_haps = package_info.hap_paths
+        self.latest_splits = package_info.split_paths
+        self.latest_abi_variants = package_info.abi_variants
+        apk_name, hap_name = package_display_info(package_info)
         self.apk_label.config(text=f"APK: {apk_name}")
         self.hap_label.config(text=f"HAP: {hap_name}")
-        apk_needs_t = self.config_manager.data.get("apk_needs_t", [])
-        self.apk_test_var.set(self.latest_apk is not None and self.latest_apk.name in apk_needs_t)
-        self.log(f"已扫描最新安装包: APK={apk_name}, HAP={hap_name}")
+        self.apk_test_var.set(self.latest_apk is not None and self.config_manager.apk_needs_t(self.latest_apk.name))
+        return apk_name, hap_name
+
+    def on_scan_recursive_toggle(self) -> None:
+        self.config_manager.set_scan_recursive(self.scan_recursive_var.get())
+        if self.folder_var.get().strip():
+            self.scan_latest_packages()
+        if self.watch_var.get():
+            self._start_folder_watcher()
+
+    def on_watch_toggle(self) -> None:
+        if self.watch_var.get():
+            self._start_folder_watcher()
+        else:
+            self._stop_folder_watcher()
+            self.log("已停止监听目录")
+
+    def _start_folder_watcher(self) -> None:
+        self._stop_folder_watcher()
+        folder = self.folder_var.get().strip()
+        if not folder or not Path(folder).is_dir():
+            messagebox.showwarning("提示", "请先选择有效目录")
+            self.log("监听失败：目录无效")
+            self.watch_var.set(False)
+            return
+        config = self.config_manager.data
+        self.folder_watcher = FolderWatcher(
+            Path(folder),
+            on_ready=lambda package_info, changed: self.bridge.call(
+                self._on_watched_packages_ready, package_info, changed
+            ),
+            recursive=self.scan_recursive_var.get(),
+            max_depth=config.get("scan_max_depth", DEFAULT_MAX_DEPTH),
+            stable_seconds=config.get("watch_stable_seconds", DEFAULT_STABLE_SECONDS),
+            debounce_seconds=config.get("watch_debounce_seconds", DEFAULT_DEBOUNCE_SECONDS),
+            on_error=lambda exc: self._log_threadsafe(f"监听目录出错: {exc}，稍后继续监听"),
+        )
+        self.folder_watcher.start()
+        self.log(f"开始监听目录: {folder}")
+
+    def _stop_folder_watcher(self) -> None:
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def _on_watched_packages_ready(self, package_info: PackageInfo, changed: List[Path]) -> None:
+        if not self.watch_var.get():
+            return
+        self._auto_install_paths.update(changed)
+        apk_name, hap_name = self._set_latest_packages(package_info)
+        self.log(f"监听到新安装包: APK={apk_name}, HAP={hap_name}")
+        if self._installing:
+            self._pending_auto_install = True
+            self.log("当前安装尚未完成，结束后自动安装新包")
+            return
+        self._start_install(auto=True)
 
     def remember_apk_need_t(self) -> None:
         if not self.latest_apk:
@@ -247,27 +565,27 @@ class App(tk.Tk):
             messagebox.showwarning("提示", "未找到可安装的 APK/HAP")
             self.log("安装失败：未找到可安装的 APK/HAP")
             return
+        self._start_install(auto=False)
+
+    def _start_install(self, auto: bool) -> None:
         previous_selection = set(self.device_tree.selection())
         self._set_install_state(True)
-        threading.Thread(
-            target=self._prepare_install_worker,
-            args=(previous_selection,),
-            daemon=True,
-        ).start()
-
-    def _prepare_install_worker(self, previous_selection: Set[str]) -> None:
-        devices = detect_devices()
-        self.after(0, self._finalize_install, devices, previous_selection)
-
-    def _finalize_install(self, devices: List[DeviceInfo], previous_selection: Set[str]) -> None:
-        self._apply_device_refresh(devices)
+        # 设备表由 DeviceTracker 实时维护，安装前直接读取内存快照
+        self._finalize_install(self.device_tracker.snapshot(), previous_selection, auto)
+
+    def _finalize_install(self, devices: List[DeviceInfo], previous_selection: Set[str], auto: bool) -> None:
+        self._sync_device_table(devices)
         current_device_ids = {device.device_id for device in self.devices}
         missing_devices = previous_selection - current_device_ids
         if missing_devices:
             missing_text = "，".join(sorted(missing_devices))
-            messagebox.showwarning("提示", f"已选设备已断开: {missing_text}，请确认设备状态")
+            if not auto:
+                messagebox.showwarning("提示", f"已选设备已断开: {missing_text}，请确认设备状态")
             self.log(f"安装提示：已选设备断开 {missing_text}")
         selection_list = [device_id for device_id in previous_selection if device_id in current_device_ids]
+        if not selection_list and auto and self.devices:
+            selection_list = [device.device_id for device in self.devices]
+            self.log(f"自动安装：未选择设备，安装到全部 {len(selection_list)} 台设备")
         if not selection_list:
             if len(self.devices) == 1:
                 selection_list = [self.devices[0].device_id]
@@ -276,59 +594,279 @@ class App(tk.Tk):
                 self.name_var.set(current_name)
                 self.log(f"检测到单设备，默认安装到: {selection_list[0]}")
             else:
-                messagebox.showwarning("提示", "请先选择设备")
+                if not auto:
+                    messagebox.showwarning("提示", "请先选择设备")
                 self.log("安装失败：未选择设备")
                 self._set_install_state(False)
                 return
-        threading.Thread(
-            target=self._install_worker,
-            args=(selection_list,),
-            daemon=True,
-        ).start()
+        tasks = self._build_install_tasks(selection_list, auto)
+        if auto:
+            self._auto_install_paths.clear()
+        if not tasks:
+            if auto:
+                self.log("自动安装：新写入的文件不属于各包名的最新构建，未安装")
+            else:
+                self.log("安装失败：所选设备没有可安装的安装包")
+            self._set_install_state(False)
+            return
+        config = self.config_manager.data
+        scheduler = InstallScheduler(
+            max_workers=self._read_concurrency(),
+            platform_limits=config.get("platform_install_limits"),
+            retry_policy=RetryPolicy(
+                max_attempts=config.get("install_max_attempts", 3),
+                backoff_seconds=config.get("install_retry_backoff", 1.0),
+                reinstall_on_signature_mismatch=self.reinstall_var.get(),
+            ),
+            check_integrity=config.get("check_package_integrity", True),
+        )
+        self._install_operation = self.runtime.submit(
+            LANE_INSTALL,
+            self._install_worker,
+            scheduler,
+            tasks,
+            name="install",
+            on_done=lambda operation: self.bridge.call(self._finish_install, operation),
+        )
+
+    def cancel_install(self) -> None:
+        if self._install_operation is None or not self._install_operation.cancel():
+            return
+        # 自动安装排队中的新包一并放弃
+        self._pending_auto_install = False
+        self._auto_install_paths.clear()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.log("正在取消安装，终止进行中的 adb/hdc 进程")
+
+    def _finish_install(self, operation: Operation) -> None:
+        self._install_operation = None
+        error = operation.exception()
+        if error is not None:
+            self.log(f"安装异常中止: {error}")
+        elif operation.cancelled:
+            self.log("安装已取消")
+        self._set_install_state(False)
+
+    def _build_install_tasks(self, selection: List[str], auto: bool = False) -> List[InstallTask]:
+        allow_test = self.apk_test_var.get()
+        # 自动安装只安装监听到新写入的构建，其余包不重装；新构建可能是版本号未变的 CI 重新构建，不做版本比对
+        force = auto or self.force_install_var.get()
+        tasks: List[InstallTask] = []
+
+        def selected(path: Path) -> bool:
+            if not auto:
+                return True
+            related = {path, *self.latest_splits.get(path, []), *self.latest_abi_variants.get(path, [])}
+            return not related.isdisjoint(self._auto_install_paths)
+
+        apks = [path for path in self.latest_apks if selected(path)]
+        haps = [path for path in self.latest_haps if selected(path)]
+        for device_id in selection:
+            device = next((d for d in self.devices if d.device_id == device_id), None)
+            if not device:
+                self.log(f"{device_id}: 设备信息未找到，跳过")
+                continue
+            if device.platform == "android":
+                if not apks:
+                    if not auto:
+                        self.log(f"{device_id}: 未找到 APK，跳过")
+                    continue
+                for apk_path in apks:
+                    # 勾选框对应当前主 APK，其余 APK 按记住的 -t 规则
+                    apk_allow_test = allow_test if apk_path == self.latest_apk else self.config_manager.apk_needs_t(apk_path.name)
+                    tasks.append(
+                        InstallTask(
+                            device_id,
+                            device.platform,
+                            apk_path,
+                            apk_allow_test,
+                            force,
+                            split_paths=self.latest_splits.get(apk_path, []),
+                            abi_variants=self.latest_abi_variants.get(apk_path, []),
+                        )
+                    )
+            else:
+                if not haps:
+                    if not auto:
+                        self.log(f"{device_id}: 未找到 HAP，跳过")
+                    continue
+                for hap_path in haps:
+                    tasks.append(
+                        InstallTask(
+                            device_id,
+                            device.platform,
+                            hap_path,
+                            force=force,
+                            split_paths=self.latest_splits.get(hap_path, []),
+                            abi_variants=self.latest_abi_variants.get(hap_path, []),
+                        )
+                    )
+        return tasks
+
+    def _read_concurrency(self) -> int:
+        try:
+            value = max(1, int(self.concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            value = self.config_manager.data.get("max_parallel_installs", 4)
+        self.concurrency_var.set(value)
+        if value != self.config_manager.data.get("max_parallel_installs"):
+            self.config_manager.set_max_parallel_installs(value)
+        return value
 
     def _set_install_state(self, installing: bool) -> None:
+        self._installing = installing
         state = tk.DISABLED if installing else tk.NORMAL
         self.install_button.config(state=state)
+        self.cancel_button.config(state=tk.NORMAL if installing else tk.DISABLED)
+        if not installing and self._pending_auto_install:
+            self._pending_auto_install = False
+            self._start_install(auto=True)
 
     def _set_refresh_state(self, refreshing: bool) -> None:
         state = tk.DISABLED if refreshing else tk.NORMAL
         self.refresh_button.config(state=state)
 
     def _log_threadsafe(self, message: str) -> None:
-        if threading.current_thread() is threading.main_thread():
-            self.log(message)
+        self.log_pipeline.put(message)
+
+    def _install_worker(self, scheduler: InstallScheduler, tasks: List[InstallTask]) -> None:
+        device_ids = [task.device_id for task in tasks]
+        self._log_threadsafe(f"开始安装到所选设备: {', '.join(device_ids)}")
+        self._progress_text.clear()
+        for device_id in device_ids:
+            self._set_progress_threadsafe(device_id, "等待中")
+        run_id = uuid.uuid4().hex[:12]
+        detect_latency = self.device_tracker.backend_latency()
+
+        def handle_result(result: DeviceInstallResult) -> None:
+            self.install_history.append(build_record(result, run_id, detect_latency))
+            if result.success and REMEDY_ALLOW_TEST in result.remedies:
+                self.config_manager.add_apk_need_t(result.task.package_path.name)
+                if result.task.package_path == self.latest_apk:
+                    self.bridge.call(self.apk_test_var.set, True)
+            self._log_install_result(result)
+
+        summary = run_install_tasks(
+            scheduler, tasks, self.coordinator, on_result=handle_result, on_progress=self._on_install_progress
+        )
+        cancelled_count = sum(1 for result in summary.results if result.failure == FAILURE_CANCELLED)
+        failed_ids = [result.task.device_id for result in summary.failed if result.failure != FAILURE_CANCELLED]
+        failed_text = f"，失败设备: {', '.join(failed_ids)}" if failed_ids else ""
+        cancelled_text = f"取消 {cancelled_count} 台, " if cancelled_count else ""
+        self._log_threadsafe(
+            f"安装完成：成功 {len(summary.succeeded)} 台, 跳过 {len(summary.skipped)} 台, "
+            f"失败 {len(failed_ids)} 台, {cancelled_text}"
+            f"总耗时 {summary.elapsed:.1f}s{failed_text}"
+        )
+        # 安装后可用空间已变化，成功设备的探测缓存已失效，在设备通道中重新读取
+        installed_ids = set(device_ids)
+        self._probe_devices_async(
+            [device for device in self.device_tracker.snapshot() if device.device_id in installed_ids]
+        )
+
+    def _on_install_progress(self, progress: InstallProgress) -> None:
+        if progress.percent is not None:
+            text = f"{progress.percent}% {progress.speed}".strip()
         else:
-            self.after(0, self.log, message)
+            text = progress.speed or "安装中"
+        self._set_progress_threadsafe(progress.device_id, text)
 
-    def _install_worker(self, selection: List[str]) -> None:
-        self._log_threadsafe(f"开始安装到所选设备: {', '.join(selection)}")
-        for device_id in selection:
-            device = next((d for d in self.devices if d.device_id == device_id), None)
-            if not device:
-                self._log_threadsafe(f"{device_id}: 设备信息未找到，跳过")
-                continue
-            if device.platform == "android":
-                if not self.latest_apk:
-                    self._log_threadsafe(f"{device_id}: 未找到 APK，跳过")
-                    continue
-                allow_test = self.apk_test_var.get()
-                result = install_android(device_id, self.latest_apk, allow_test)
-                self._log_threadsafe(f"Android {device_id} 执行命令: {' '.join(result.command)}")
-                self._log_threadsafe(
-                    f"Android {device_id} 安装结果: {result.process.returncode}\n"
-                    f"{result.process.stdout}\n{result.process.stderr}"
-                )
+    def _set_progress_threadsafe(self, device_id: str, text: str) -> None:
+        # 进度文本未变化时不再排队刷新界面
+        if self._progress_text.get(device_id) == text:
+            return
+        self._progress_text[device_id] = text
+        self.bridge.call(self._set_device_progress, device_id, text)
+
+    def _set_device_progress(self, device_id: str, text: str) -> None:
+        if self.device_tree.exists(device_id):
+            self.device_tree.set(device_id, "progress", text)
+
+    def _log_install_result(self, result: DeviceInstallResult) -> None:
+        task = result.task
+        if result.failure == FAILURE_CANCELLED:
+            self._set_progress_threadsafe(task.device_id, FAILURE_LABELS[FAILURE_CANCELLED])
+        elif result.skipped:
+            self._set_progress_threadsafe(task.device_id, "已是最新")
+        else:
+            self._set_progress_threadsafe(task.device_id, "成功" if result.success else "失败")
+        platform_name = "Android" if task.platform == "android" else "Harmony"
+        if result.skipped and task.metadata:
+            self._log_threadsafe(
+                f"{platform_name} {task.device_id} 已安装相同版本 "
+                f"{task.metadata.version_name} ({task.metadata.version_code})，跳过"
+            )
+            return
+        if result.failure == FAILURE_CANCELLED:
+            self._log_threadsafe(f"{platform_name} {task.device_id} 已取消安装: {task.package_path.name}")
+            return
+        if result.install_result is None and result.attempts == 0:
+            self._log_threadsafe(
+                f"{platform_name} {task.device_id} 预检未通过（{FAILURE_LABELS[result.failure]}），未安装: {result.error}"
+            )
+            return
+        if result.install_result is None:
+            self._log_threadsafe(f"{platform_name} {task.device_id} 安装异常: {result.error}")
+            return
+        process = result.install_result.process
+        self._log_threadsafe(f"{platform_name} {task.device_id} 执行命令: {' '.join(result.install_result.command)}")
+        self._log_threadsafe(
+            f"{platform_name} {task.device_id} 安装结果: {process.returncode} "
+            f"({'成功' if result.success else '失败'}, {result.duration:.1f}s)\n"
+            f"{process.stdout}\n{process.stderr}"
+        )
+        if result.remedies:
+            remedy_text = "、".join(REMEDY_LABELS[remedy] for remedy in result.remedies)
+            self._log_threadsafe(f"{platform_name} {task.device_id} 共尝试 {result.attempts} 次，已自动处理: {remedy_text}")
+            if REMEDY_ALLOW_TEST in result.remedies and result.success:
+                self._log_threadsafe(f"已记住 APK 需要 -t: {task.package_path.name}")
+        if result.failure:
+            self._log_threadsafe(f"{platform_name} {task.device_id} 失败原因: {FAILURE_LABELS[result.failure]}")
+        if result.phases:
+            self._log_threadsafe(f"{platform_name} {task.device_id} 阶段耗时: {format_phases(result.phases)}")
+        if result.verified is False:
+            self._log_threadsafe(f"{platform_name} {task.device_id} 安装后版本校验不一致，请确认设备上的版本")
+
+    def show_install_stats(self) -> None:
+        self.runtime.submit(LANE_BACKGROUND, self._load_install_stats_worker, name="stats", replace=True)
+
+    def _load_install_stats_worker(self) -> None:
+        summaries = summarize_history(self.install_history.load())
+        self.bridge.call(self._show_install_stats_window, summaries)
+
+    def _show_install_stats_window(self, summaries: List[HistorySummary]) -> None:
+        if not summaries:
+            messagebox.showinfo("耗时统计", f"暂无安装记录\n{self.install_history.path}")
+            return
+        window = tk.Toplevel(self)
+        window.title("安装耗时统计（p50 / p95）")
+        window.geometry("900x360")
+        columns = ("scope", "key", "runs", "failures", "total") + PHASES
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        headings = {"scope": "范围", "key": "设备/平台", "runs": "次数", "failures": "失败", "total": "总耗时"}
+        headings.update(PHASE_LABELS)
+        for column in columns:
+            tree.heading(column, text=headings[column])
+            tree.column(column, width=200 if column == "key" else 80, anchor=tk.W if column == "key" else tk.CENTER)
+        name_mapping: Dict[str, str] = self.config_manager.data.get("device_names", {})
+        for summary in summaries:
+            if summary.scope == "device":
+                name = name_mapping.get(summary.key, "")
+                key = f"{summary.key} ({name})" if name else summary.key
             else:
-                if not self.latest_hap:
-                    self._log_threadsafe(f"{device_id}: 未找到 HAP，跳过")
-                    continue
-                result = install_harmony(device_id, self.latest_hap)
-                self._log_threadsafe(f"Harmony {device_id} 执行命令: {' '.join(result.command)}")
-                self._log_threadsafe(
-                    f"Harmony {device_id} 安装结果: {result.process.returncode}\n"
-                    f"{result.process.stdout}\n{result.process.stderr}"
-                )
-        self.after(0, self._set_install_state, False)
+                key = "Android" if summary.key == "android" else "Harmony"
+            values = (
+                "设备" if summary.scope == "device" else "平台",
+                key,
+                summary.runs,
+                summary.failures,
+                format_duration_stats(summary.total),
+            ) + tuple(format_duration_stats(summary.phases.get(phase)) for phase in PHASES)
+            tree.insert("", tk.END, values=values)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
 
 if __name__ == "__main__":
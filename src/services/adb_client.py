@@ -0,0 +1,395 @@
+import contextvars
+import os
+import re
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from services.async_runtime import check_cancelled
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5037
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_TIMEOUT = 10.0
+# 等待设备端安装结果的上限；期间按固定间隔醒来检查取消
+DEFAULT_RESULT_TIMEOUT = 300.0
+_RESULT_POLL_INTERVAL = 0.5
+# 推送与流式安装使用的大块缓冲，sync 协议单个 DATA 包上限为 64KB
+STREAM_CHUNK_SIZE = 64 * 1024
+_READ_BUFFER_SIZE = 1024 * 1024
+_DEFAULT_FILE_MODE = 0o644
+# 安装会话各分包并行写入的连接数上限
+MAX_PARALLEL_WRITES = 4
+_SESSION_PATTERN = re.compile(r"\[(\d+)\]")
+
+
+class AdbError(Exception):
+    pass
+
+
+class AdbConnectionError(AdbError):
+    pass
+
+
+@dataclass
+class AdbCommandResult:
+    returncode: int
+    output: str
+
+
+def _encode_request(request: str) -> bytes:
+    payload = request.encode("utf-8")
+    return f"{len(payload):04x}".encode("ascii") + payload
+
+
+class AdbConnection:
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+
+    def send_request(self, request: str) -> None:
+        self._sock.sendall(_encode_request(request))
+        status = self.read_exactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_length_prefixed())
+        raise AdbError(f"adb server 返回未知状态: {status!r}")
+
+    def read_exactly(self, size: int) -> bytes:
+        chunks: List[bytes] = []
+        remaining = size
+        while remaining:
+            chunk = self._sock.recv(min(remaining, _READ_BUFFER_SIZE))
+            if not chunk:
+                raise AdbConnectionError("adb server 连接已关闭")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def read_length_prefixed(self) -> str:
+        length = int(self.read_exactly(4), 16)
+        return self.read_exactly(length).decode("utf-8", errors="replace")
+
+    def read_all(self) -> bytes:
+        chunks: List[bytes] = []
+        while True:
+            chunk = self._sock.recv(_READ_BUFFER_SIZE)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def read_result(self, timeout: float, cancellable: bool = True) -> bytes:
+        # 分段等待应答直到对端关闭连接，总时长超过 timeout 视为设备无响应
+        deadline = time.monotonic() + timeout
+        chunks: List[bytes] = []
+        self._sock.settimeout(_RESULT_POLL_INTERVAL)
+        while True:
+            try:
+                chunk = self._sock.recv(_READ_BUFFER_SIZE)
+            except socket.timeout:
+                if cancellable:
+                    check_cancelled()
+                if time.monotonic() >= deadline:
+                    raise AdbConnectionError(f"等待 adb 应答超时（{timeout:.0f} 秒）")
+                continue
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def sendall(self, data: bytes) -> None:
+        self._sock.sendall(data)
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self._sock.settimeout(timeout)
+
+    def close(self) -> None:
+        # 先 shutdown，其他线程阻塞中的 recv 随之返回
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class AdbClient:
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+        result_timeout: float = DEFAULT_RESULT_TIMEOUT,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self._timeout = timeout
+        self._result_timeout = result_timeout
+        # adb server 每个服务请求独占一条连接，用完即被关闭，因此池化的是并发连接名额
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+        self._server_down_until = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> AdbConnection:
+        with self._lock:
+            if time.monotonic() < self._server_down_until:
+                raise AdbConnectionError(f"adb server {self.host}:{self.port} 暂不可用")
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self._timeout)
+        except OSError as exc:
+            # 短时间内不再尝试，调用方直接回退到命令行
+            with self._lock:
+                self._server_down_until = time.monotonic() + 5.0
+            raise AdbConnectionError(f"无法连接 adb server {self.host}:{self.port}: {exc}") from exc
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return AdbConnection(sock)
+
+    def _open_service(self, service: str, serial: Optional[str] = None) -> AdbConnection:
+        connection = self._connect()
+        try:
+            if serial is not None:
+                connection.send_request(f"host:transport:{serial}")
+            connection.send_request(service)
+        except (OSError, AdbError):
+            connection.close()
+            raise
+        return connection
+
+    def _host_query(self, service: str) -> str:
+        with self._slots:
+            connection = self._open_service(service)
+            try:
+                return connection.read_length_prefixed()
+            except OSError as exc:
+                raise AdbConnectionError(str(exc)) from exc
+            finally:
+                connection.close()
+
+    def server_version(self) -> int:
+        return int(self._host_query("host:version"), 16)
+
+    def devices_l(self) -> str:
+        return self._host_query("host:devices-l")
+
+    def track_devices(self, on_open: Optional[Callable[[AdbConnection], None]] = None) -> Iterator[str]:
+        # 长连接不占用连接名额，也不设读超时；on_open 交出连接，供其他线程关闭以结束跟踪
+        try:
+            # -l 与 devices-l 格式相同，附带 product/model/device/transport_id
+            connection = self._open_service("host:track-devices-l")
+        except AdbConnectionError:
+            raise
+        except AdbError:
+            # 旧版 adb server 不支持 -l，退回只含设备码与状态的格式
+            connection = self._open_service("host:track-devices")
+        connection.settimeout(None)
+        if on_open:
+            on_open(connection)
+        try:
+            while True:
+                yield connection.read_length_prefixed()
+        except OSError as exc:
+            raise AdbConnectionError(str(exc)) from exc
+        finally:
+            connection.close()
+
+    def shell(self, serial: str, command: str) -> str:
+        with self._slots:
+            connection = self._open_service(f"shell:{command}", serial)
+            try:
+                return connection.read_all().decode("utf-8", errors="replace")
+            except OSError as exc:
+                raise AdbConnectionError(str(exc)) from exc
+            finally:
+                connection.close()
+
+    def push(self, serial: str, local_path: Path, remote_path: str, mode: int = _DEFAULT_FILE_MODE) -> None:
+        with self._slots:
+            connection = self._open_service("sync:", serial)
+            try:
+                self._sync_send(connection, local_path, remote_path, mode)
+            except OSError as exc:
+                raise AdbConnectionError(str(exc)) from exc
+            finally:
+                connection.close()
+
+    def _sync_send(self, connection: AdbConnection, local_path: Path, remote_path: str, mode: int) -> None:
+        target = f"{remote_path},{mode}".encode("utf-8")
+        connection.sendall(b"SEND" + struct.pack("<I", len(target)) + target)
+        with local_path.open("rb") as file:
+            while True:
+                chunk = file.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                connection.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+        mtime = int(local_path.stat().st_mtime)
+        connection.sendall(b"DONE" + struct.pack("<I", mtime))
+        response = connection.read_exactly(8)
+        status, length = response[:4], struct.unpack("<I", response[4:])[0]
+        if status == b"OKAY":
+            connection.sendall(b"QUIT" + struct.pack("<I", 0))
+            return
+        message = connection.read_exactly(length).decode("utf-8", errors="replace") if status == b"FAIL" else ""
+        raise AdbError(f"推送失败: {message or status!r}")
+
+    def _stream_exec(
+        self,
+        serial: str,
+        command: str,
+        path: Path,
+        on_chunk: Optional[Callable[[int], None]] = None,
+    ) -> str:
+        with self._slots:
+            connection = self._open_service(f"exec:{command}", serial)
+            try:
+                with path.open("rb") as file:
+                    while True:
+                        chunk = file.read(STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        connection.sendall(chunk)
+                        if on_chunk:
+                            on_chunk(len(chunk))
+                output = connection.read_result(self._result_timeout)
+                return output.decode("utf-8", errors="replace").strip()
+            except OSError as exc:
+                raise AdbConnectionError(str(exc)) from exc
+            finally:
+                connection.close()
+
+    def _exec(self, serial: str, command: str, cancellable: bool = True) -> str:
+        with self._slots:
+            connection = self._open_service(f"exec:{command}", serial)
+            try:
+                output = connection.read_result(self._result_timeout, cancellable)
+                return output.decode("utf-8", errors="replace").strip()
+            except OSError as exc:
+                raise AdbConnectionError(str(exc)) from exc
+            finally:
+                connection.close()
+
+    def install(
+        self,
+        serial: str,
+        apk_path: Path,
+        allow_test: bool,
+        on_transfer: Optional[Callable[[int, int], None]] = None,
+    ) -> AdbCommandResult:
+        # 流式安装：通过 exec:cmd package install -S 直接把 APK 写入安装会话，无需先推送到设备
+        size = apk_path.stat().st_size
+        arguments = ["cmd", "package", "install", "-S", str(size)]
+        if allow_test:
+            arguments.append("-t")
+        sent = 0
+
+        def report(length: int) -> None:
+            nonlocal sent
+            sent += length
+            if on_transfer:
+                on_transfer(sent, size)
+
+        output = self._stream_exec(serial, " ".join(arguments), apk_path, report)
+        returncode = 0 if output.startswith("Success") else 1
+        return AdbCommandResult(returncode=returncode, output=output)
+
+    def install_multiple(
+        self,
+        serial: str,
+        apk_paths: List[Path],
+        allow_test: bool,
+        on_transfer: Optional[Callable[[int, int], None]] = None,
+    ) -> AdbCommandResult:
+        # 分包安装：一个安装会话内并行写入 base 与各 split，提交后原子生效
+        sizes = [path.stat().st_size for path in apk_paths]
+        total = sum(sizes)
+        arguments = ["cmd", "package", "install-create", "-S", str(total)]
+        if allow_test:
+            arguments.append("-t")
+        output = self._exec(serial, " ".join(arguments))
+        match = _SESSION_PATTERN.search(output)
+        if not output.startswith("Success") or not match:
+            return AdbCommandResult(returncode=1, output=output)
+        session = match.group(1)
+        sent = 0
+        progress_lock = threading.Lock()
+
+        def report(length: int) -> None:
+            nonlocal sent
+            # 多个分包并行写入，持锁回调保证上报的进度单调递增
+            with progress_lock:
+                sent += length
+                if on_transfer:
+                    on_transfer(sent, total)
+
+        def write(index: int) -> str:
+            path = apk_paths[index]
+            command = f"cmd package install-write -S {sizes[index]} {session} {index}_{path.name} -"
+            return self._stream_exec(serial, command, path, report)
+
+        try:
+            # 写入线程继承调用方上下文，进度回调中的取消检查对各分包同样生效
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_WRITES, len(apk_paths))) as executor:
+                futures = [
+                    executor.submit(contextvars.copy_context().run, write, index) for index in range(len(apk_paths))
+                ]
+                write_outputs = [future.result() for future in futures]
+            # 写入完成后、提交前仍可取消，提交后安装即生效
+            check_cancelled()
+        except BaseException:
+            # 任何中断（含取消）都放弃会话，避免设备上残留未提交的安装会话
+            self._abandon_session(serial, session)
+            raise
+        failed = [text for text in write_outputs if not text.startswith("Success")]
+        if failed:
+            self._abandon_session(serial, session)
+            return AdbCommandResult(returncode=1, output="\n".join(failed))
+        output = self._exec(serial, f"cmd package install-commit {session}")
+        returncode = 0 if output.startswith("Success") else 1
+        return AdbCommandResult(returncode=returncode, output=output)
+
+    def _abandon_session(self, serial: str, session: str) -> None:
+        try:
+            # 取消后仍要完成放弃，不响应取消
+            self._exec(serial, f"cmd package install-abandon {session}", cancellable=False)
+        except AdbError:
+            pass
+
+
+def parse_devices_l(output: str) -> List[Dict[str, str]]:
+    devices: List[Dict[str, str]] = []
+    for line in output.splitlines():
+        parts = line.strip().split()
+        if len(parts) < 2:
+            continue
+        details = {"serial": parts[0], "state": parts[1]}
+        for part in parts[2:]:
+            key, _, value = part.partition(":")
+            if value:
+                details[key] = value
+        devices.append(details)
+    return devices
+
+
+_default_client: Optional[AdbClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> Optional[AdbClient]:
+    with _default_client_lock:
+        return _default_client
+
+
+def configure_default_client(enabled: bool, host: str = DEFAULT_HOST, port: Optional[int] = None) -> None:
+    global _default_client
+    if port is None:
+        # 与 adb 命令行一致读取 ANDROID_ADB_SERVER_PORT，便于指向本地模拟 server
+        port = int(os.getenv("ANDROID_ADB_SERVER_PORT", DEFAULT_PORT))
+    with _default_client_lock:
+        _default_client = AdbClient(host=host, port=port) if enabled else None
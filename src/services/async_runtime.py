@@ -0,0 +1,453 @@
+import asyncio
+import codecs
+import contextvars
+import heapq
+import itertools
+import locale
+import os
+import queue
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import CancelledError as FutureCancelledError
+from concurrent.futures import Future, wait
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Sequence, Set, Tuple
+
+
+LANE_DEVICES = "devices"
+LANE_SCAN = "scan"
+LANE_INSTALL = "install"
+LANE_BACKGROUND = "background"
+# 数值越小越优先：工作线程都在忙时，设备刷新先于扫描、安装与统计执行
+LANE_PRIORITIES: Dict[str, int] = {LANE_DEVICES: 0, LANE_SCAN: 1, LANE_INSTALL: 2, LANE_BACKGROUND: 3}
+# 每条通道独立限流，长时间安装不会挡住设备刷新与扫描
+DEFAULT_LANE_LIMITS: Dict[str, int] = {LANE_DEVICES: 2, LANE_SCAN: 1, LANE_INSTALL: 1, LANE_BACKGROUND: 1}
+DEFAULT_WORKER_THREADS = 4
+STREAM_READ_SIZE = 4096
+
+# 环境变量可把 adb/hdc 替换为任意命令前缀（如 python fake_tool.py adb）；Windows 的 CreateProcess 只补全 .exe，不能使用 .cmd 包装脚本
+TOOL_COMMAND_ENV: Dict[str, str] = {"adb": "INSTALL_TOOL_ADB", "hdc": "INSTALL_TOOL_HDC"}
+
+_LINE_BREAK_PATTERN = re.compile(r"[\r\n]")
+# 与 subprocess 的 text 模式保持一致，按本机默认编码解码 adb/hdc 输出
+_OUTPUT_ENCODING = locale.getpreferredencoding(False)
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class Operation:
+    def __init__(self, name: str, lane: str) -> None:
+        self.name = name
+        self.lane = lane
+        self._future: "Future[Any]" = Future()
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        # 操作内发起、尚未结束的子进程调用，取消时一并取消（子进程随之被终止）
+        self._children: Set["Future[Any]"] = set()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._blocking = False
+        self._observed = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        if self._future.done():
+            return False
+        self._cancel_event.set()
+        with self._lock:
+            children = list(self._children)
+            # 阻塞调用已在工作线程中运行时不取消外层协程，等待其在子进程边界处退出，通道名额随之释放
+            task = None if self._blocking else self._task
+        for child in children:
+            child.cancel()
+        if task is not None:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        return True
+
+    def wait_cancelled(self, timeout: float) -> bool:
+        return self._cancel_event.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        try:
+            return self._future.result(timeout)
+        except FutureCancelledError as exc:
+            raise OperationCancelled(self.name) from exc
+
+    def exception(self) -> Optional[BaseException]:
+        if self._future.cancelled():
+            return None
+        return self._future.exception()
+
+    def add_done_callback(self, callback: Callable[["Operation"], None]) -> None:
+        self._future.add_done_callback(lambda _future: callback(self))
+
+    def _bind(self, task: "asyncio.Task[None]") -> None:
+        with self._lock:
+            self._task = task
+        if self.cancelled:
+            task.cancel()
+
+    def _set_blocking(self, blocking: bool) -> None:
+        with self._lock:
+            self._blocking = blocking
+
+    def _attach(self, child: "Future[Any]") -> None:
+        with self._lock:
+            self._children.add(child)
+        if self.cancelled:
+            child.cancel()
+
+    def _detach(self, child: "Future[Any]") -> None:
+        with self._lock:
+            self._children.discard(child)
+
+
+_current_operation: "contextvars.ContextVar[Optional[Operation]]" = contextvars.ContextVar(
+    "current_operation", default=None
+)
+
+
+def current_operation() -> Optional[Operation]:
+    return _current_operation.get()
+
+
+def check_cancelled() -> None:
+    operation = _current_operation.get()
+    if operation is not None and operation.cancelled:
+        raise OperationCancelled(operation.name)
+
+
+def sleep_unless_cancelled(seconds: float) -> None:
+    operation = _current_operation.get()
+    if operation is None:
+        time.sleep(seconds)
+        return
+    if operation.wait_cancelled(seconds):
+        raise OperationCancelled(operation.name)
+
+
+class _PriorityWorkers:
+    def __init__(self, count: int) -> None:
+        self._heap: List[Tuple[int, int, Callable[[], None]]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        for index in range(max(1, count)):
+            threading.Thread(target=self._run, name=f"runtime-worker-{index}", daemon=True).start()
+
+    def submit(self, priority: int, operation: Operation, func: Callable[..., Any], args: Sequence[Any]) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+
+        def job() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            if operation.cancelled:
+                future.set_exception(OperationCancelled(operation.name))
+                return
+            token = _current_operation.set(operation)
+            try:
+                result = func(*args)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                _current_operation.reset(token)
+
+        with self._condition:
+            heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._condition.notify()
+        return future
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                _priority, _sequence, job = heapq.heappop(self._heap)
+            job()
+
+
+def resolve_tool_command(command: Sequence[str]) -> List[str]:
+    env_name = TOOL_COMMAND_ENV.get(command[0]) if command else None
+    override = os.getenv(env_name, "").strip() if env_name else ""
+    if not override:
+        return list(command)
+    # 非 POSIX 模式保留 Windows 路径中的反斜杠，再去掉两端引号
+    prefix = [part.strip('"') for part in shlex.split(override, posix=False)]
+    return prefix + list(command[1:])
+
+
+def _decode(data: Optional[bytes]) -> str:
+    return data.decode(_OUTPUT_ENCODING, errors="replace") if data else ""
+
+
+class AsyncRuntime:
+    def __init__(
+        self,
+        lane_limits: Optional[Dict[str, int]] = None,
+        worker_threads: int = DEFAULT_WORKER_THREADS,
+    ) -> None:
+        self._lane_limits = dict(DEFAULT_LANE_LIMITS)
+        if lane_limits:
+            self._lane_limits.update(lane_limits)
+        self._worker_threads = worker_threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._workers: Optional[_PriorityWorkers] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._operations: Set[Operation] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop() -> None:
+                asyncio.set_event_loop(loop)
+                # 信号量需在事件循环线程中创建
+                self._semaphores = {lane: asyncio.Semaphore(max(1, limit)) for lane, limit in self._lane_limits.items()}
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._loop = loop
+            self._workers = _PriorityWorkers(self._worker_threads)
+            self._thread = threading.Thread(target=run_loop, name="async-runtime", daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        with self._lock:
+            loop, thread, workers = self._loop, self._thread, self._workers
+            operations = list(self._operations)
+            self._loop = None
+            self._thread = None
+            self._workers = None
+        for operation in operations:
+            operation.cancel()
+        if loop is None:
+            return
+        # 给被取消的子进程留出终止时间，再停止事件循环
+        wait([operation._future for operation in operations], timeout=timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        if workers is not None:
+            workers.stop()
+
+    def _in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(
+        self,
+        lane: str,
+        func: Callable[..., Any],
+        *args: Any,
+        name: str = "",
+        replace: bool = False,
+        on_done: Optional[Callable[[Operation], None]] = None,
+    ) -> Operation:
+        # 协程函数在事件循环中执行，普通函数交给按优先级调度的工作线程；
+        # replace 先取消同通道同名的未完成操作（如重复点击刷新），on_done 在任意线程回调，界面需经 TkBridge 转回主线程
+        self.start()
+        if lane not in self._lane_limits:
+            raise ValueError(f"未知通道: {lane}")
+        operation = Operation(name or getattr(func, "__name__", lane), lane)
+        with self._lock:
+            superseded = [
+                item
+                for item in self._operations
+                if replace and item.lane == lane and item.name == operation.name
+            ]
+            self._operations.add(operation)
+            loop = self._loop
+        for item in superseded:
+            item.cancel()
+        operation.add_done_callback(self._finish)
+        if on_done is not None:
+            operation._observed = True
+            operation.add_done_callback(on_done)
+        loop.call_soon_threadsafe(self._create_task, operation, func, args)
+        return operation
+
+    def _create_task(self, operation: Operation, func: Callable[..., Any], args: Sequence[Any]) -> None:
+        operation._bind(self._loop.create_task(self._execute(operation, func, args)))
+
+    async def _execute(self, operation: Operation, func: Callable[..., Any], args: Sequence[Any]) -> None:
+        _current_operation.set(operation)
+        try:
+            async with self._semaphores[operation.lane]:
+                check_cancelled()
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(*args)
+                else:
+                    operation._set_blocking(True)
+                    future = self._workers.submit(LANE_PRIORITIES.get(operation.lane, 0), operation, func, args)
+                    result = await asyncio.wrap_future(future)
+        except (asyncio.CancelledError, OperationCancelled):
+            operation._future.cancel()
+            return
+        except BaseException as exc:
+            operation._future.set_exception(exc)
+            return
+        operation._future.set_result(result)
+
+    def _finish(self, operation: Operation) -> None:
+        with self._lock:
+            self._operations.discard(operation)
+        exception = operation.exception()
+        if exception is not None and not operation._observed:
+            # 没有调用方关心结果时输出异常，行为与未捕获异常的线程一致
+            sys.stderr.write(f"操作 {operation.name} 异常退出\n")
+            traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+    def operations(self, lane: Optional[str] = None) -> List[Operation]:
+        with self._lock:
+            return [operation for operation in self._operations if lane is None or operation.lane == lane]
+
+    def cancel_lane(self, lane: str) -> int:
+        operations = self.operations(lane)
+        return sum(1 for operation in operations if operation.cancel())
+
+    def run(self, coroutine: Coroutine[Any, Any, Any]) -> Any:
+        # 供安装线程等同步代码调用；所在操作被取消时取消协程（终止其子进程）并抛出 OperationCancelled
+        future, operation = self._schedule(coroutine)
+        return self._wait(future, operation)
+
+    def schedule(self, coroutine: Coroutine[Any, Any, Any]) -> "Future[Any]":
+        # 常驻协程（如设备跟踪流）不占用通道名额，调用方等待返回的 Future，cancel() 取消协程
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _schedule(self, coroutine: Coroutine[Any, Any, Any]) -> "Tuple[Future[Any], Optional[Operation]]":
+        if self._in_loop_thread():
+            coroutine.close()
+            raise RuntimeError("不能在事件循环线程中同步等待协程")
+        operation = _current_operation.get()
+        if operation is not None and operation.cancelled:
+            coroutine.close()
+            raise OperationCancelled(operation.name)
+        future = self.schedule(coroutine)
+        if operation is not None:
+            operation._attach(future)
+        return future, operation
+
+    @staticmethod
+    def _wait(future: "Future[Any]", operation: Optional[Operation]) -> Any:
+        try:
+            return future.result()
+        except FutureCancelledError as exc:
+            raise OperationCancelled(operation.name if operation else "") from exc
+        finally:
+            if operation is not None:
+                operation._detach(future)
+
+    async def spawn(self, command: Sequence[str], stderr: int) -> asyncio.subprocess.Process:
+        kwargs: Dict[str, Any] = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        return await asyncio.create_subprocess_exec(
+            *resolve_tool_command(command),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            **kwargs,
+        )
+
+    @staticmethod
+    async def kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        await process.wait()
+
+    async def run_command(self, command: Sequence[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        # 与 subprocess.run(timeout=...) 一致：超时终止子进程并抛出 TimeoutExpired；命令不存在时抛出 FileNotFoundError
+        process = await self.spawn(command, subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await self.kill(process)
+            raise subprocess.TimeoutExpired(list(command), timeout)
+        except asyncio.CancelledError:
+            await self.kill(process)
+            raise
+        return subprocess.CompletedProcess(list(command), process.returncode, stdout=_decode(stdout), stderr=_decode(stderr))
+
+    async def stream_command(self, command: Sequence[str], on_line: Callable[[str], None]) -> int:
+        # stdout 与 stderr 合并读取，按 \r 与 \n 切分，adb/hdc 的进度刷新逐条回调；on_line 在事件循环线程执行，不得阻塞
+        process = await self.spawn(command, subprocess.STDOUT)
+        decoder = codecs.getincrementaldecoder(_OUTPUT_ENCODING)(errors="replace")
+        pending = ""
+        try:
+            while True:
+                chunk = await process.stdout.read(STREAM_READ_SIZE)
+                pending += decoder.decode(chunk, final=not chunk)
+                *lines, pending = _LINE_BREAK_PATTERN.split(pending)
+                for line in lines:
+                    on_line(line)
+                if not chunk:
+                    break
+            if pending:
+                on_line(pending)
+            return await process.wait()
+        except asyncio.CancelledError:
+            await self.kill(process)
+            raise
+
+    def run_command_sync(self, command: Sequence[str], timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        return self.run(self.run_command(command, timeout))
+
+    def stream_command_sync(self, command: Sequence[str], on_line: Callable[[str], None]) -> int:
+        # 事件循环只读取与切分输出，on_line 在调用方线程执行，慢回调不会拖住其他通道
+        lines: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        future, operation = self._schedule(self.stream_command(command, lines.put))
+        # 协程结束（含开始前即被取消）后才放入结束标记，排在所有输出行之后
+        future.add_done_callback(lambda _future: lines.put(None))
+        try:
+            for line in iter(lines.get, None):
+                on_line(line)
+        except BaseException:
+            # 回调抛出异常（如检查到取消）时终止子进程
+            future.cancel()
+            if operation is not None:
+                operation._detach(future)
+            raise
+        return self._wait(future, operation)
+
+
+_default_runtime = AsyncRuntime()
+_default_runtime_lock = threading.Lock()
+
+
+def get_default_runtime() -> AsyncRuntime:
+    with _default_runtime_lock:
+        return _default_runtime
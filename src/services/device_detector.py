@@ -1,7 +1,11 @@
-import os
+import asyncio
 import subprocess
-from dataclasses import dataclass
-from typing import List
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.adb_client import AdbError, get_default_client, parse_devices_l
+from services.async_runtime import get_default_runtime
 
 
 @dataclass
@@ -9,47 +13,76 @@ class DeviceInfo:
     device_id: str
     platform: str
     status: str
+    # adb devices -l 的附加字段（product/model/device/transport_id），不参与设备变化比较
+    details: Dict[str, str] = field(default_factory=dict, compare=False)
+
+
+DEFAULT_BACKEND_TIMEOUT = 5.0
+# 子进程超时后会被终止，额外留出回收时间再放弃等待
+_BACKEND_GRACE_SECONDS = 1.0
+# 远程 agent 的状态以 "agent <地址>" 作为后端名
+_BACKEND_NAMES = {"android": "adb", "harmony": "hdc"}
+
+
+@dataclass
+class BackendStatus:
+    platform: str
+    latency: float
+    timed_out: bool = False
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.timed_out and not self.error
 
 
-def _run_command(command: List[str]) -> str:
+@dataclass
+class DetectionReport:
+    devices: List[DeviceInfo] = field(default_factory=list)
+    backends: List[BackendStatus] = field(default_factory=list)
+    devices_by_platform: Dict[str, List[DeviceInfo]] = field(default_factory=dict)
+
+
+async def _run_command(command: List[str], timeout: Optional[float] = None) -> str:
     try:
-        run_kwargs = {
-            "check": False,
-            "capture_output": True,
-            "text": True,
-        }
-        if os.name == "nt":
-            run_kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
-        result = subprocess.run(
-            command,
-            **run_kwargs,
-        )
+        result = await get_default_runtime().run_command(command, timeout)
     except FileNotFoundError:
         return ""
     return result.stdout.strip()
 
 
-def detect_adb_devices() -> List[DeviceInfo]:
-    output = _run_command(["adb", "devices", "-l"])
-    devices: List[DeviceInfo] = []
+def _detect_adb_devices_via_server() -> Optional[List[DeviceInfo]]:
+    client = get_default_client()
+    if client is None:
+        return None
+    try:
+        output = client.devices_l()
+    except (AdbError, OSError):
+        return None
+    return [device_from_details(details) for details in parse_devices_l(output)]
+
+
+def device_from_details(details: Dict[str, str]) -> DeviceInfo:
+    extra = {key: value for key, value in details.items() if key not in ("serial", "state")}
+    return DeviceInfo(device_id=details["serial"], platform="android", status=details["state"], details=extra)
+
+
+async def detect_adb_devices_async(timeout: Optional[float] = None) -> List[DeviceInfo]:
+    if get_default_client() is not None:
+        # adb 直连为阻塞 socket 调用，放到线程中执行，不占用事件循环
+        server_devices = await asyncio.to_thread(_detect_adb_devices_via_server)
+        if server_devices is not None:
+            return server_devices
+    output = await _run_command(["adb", "devices", "-l"], timeout)
     if not output:
-        return devices
+        return []
+    # 第一行为 "List of devices attached" 标题
     lines = output.splitlines()
-    for line in lines[1:]:
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-        device_id = parts[0]
-        status = parts[1]
-        devices.append(DeviceInfo(device_id=device_id, platform="android", status=status))
-    return devices
+    return [device_from_details(details) for details in parse_devices_l("\n".join(lines[1:]))]
 
 
-def detect_hdc_devices() -> List[DeviceInfo]:
-    output = _run_command(["hdc", "list", "targets"])
+async def detect_hdc_devices_async(timeout: Optional[float] = None) -> List[DeviceInfo]:
+    output = await _run_command(["hdc", "list", "targets"], timeout)
     devices: List[DeviceInfo] = []
     if not output:
         return devices
@@ -66,5 +99,66 @@ def detect_hdc_devices() -> List[DeviceInfo]:
     return devices
 
 
-def detect_devices() -> List[DeviceInfo]:
-    return detect_adb_devices() + detect_hdc_devices()
+def detect_adb_devices(timeout: Optional[float] = None) -> List[DeviceInfo]:
+    return get_default_runtime().run(detect_adb_devices_async(timeout))
+
+
+def detect_hdc_devices(timeout: Optional[float] = None) -> List[DeviceInfo]:
+    return get_default_runtime().run(detect_hdc_devices_async(timeout))
+
+
+_DETECTORS: Dict[str, Callable[[Optional[float]], Awaitable[List[DeviceInfo]]]] = {
+    "android": detect_adb_devices_async,
+    "harmony": detect_hdc_devices_async,
+}
+
+
+async def _timed_detect(platform: str, timeout: float) -> Tuple[List[DeviceInfo], BackendStatus]:
+    started = time.monotonic()
+    try:
+        # 子进程超时会被终止；adb 直连线程卡住时不再等待，已完成的后端结果照常返回
+        devices = await asyncio.wait_for(_DETECTORS[platform](timeout), timeout + _BACKEND_GRACE_SECONDS)
+    except (subprocess.TimeoutExpired, asyncio.TimeoutError):
+        return [], BackendStatus(platform=platform, latency=time.monotonic() - started, timed_out=True)
+    except OSError as exc:
+        return [], BackendStatus(platform=platform, latency=time.monotonic() - started, error=str(exc))
+    return devices, BackendStatus(platform=platform, latency=time.monotonic() - started)
+
+
+async def detect_devices_report_async(
+    timeout: float = DEFAULT_BACKEND_TIMEOUT,
+    platforms: Sequence[str] = ("android", "harmony"),
+) -> DetectionReport:
+    # 各后端在同一事件循环中并发探测，不再为每次探测创建线程
+    outcomes = await asyncio.gather(*(_timed_detect(platform, timeout) for platform in platforms))
+    report = DetectionReport()
+    for platform, (devices, status) in zip(platforms, outcomes):
+        report.backends.append(status)
+        if status.ok:
+            report.devices_by_platform[platform] = devices
+            report.devices.extend(devices)
+    return report
+
+
+def detect_devices_report(
+    timeout: float = DEFAULT_BACKEND_TIMEOUT,
+    platforms: Sequence[str] = ("android", "harmony"),
+) -> DetectionReport:
+    return get_default_runtime().run(detect_devices_report_async(timeout, platforms))
+
+
+def format_backend_latency(report: DetectionReport) -> str:
+    parts: List[str] = []
+    for status in report.backends:
+        name = _BACKEND_NAMES.get(status.platform, status.platform)
+        if status.timed_out:
+            parts.append(f"{name} 超时({status.latency:.2f}s)")
+        elif status.error:
+            parts.append(f"{name} 失败({status.error})")
+        else:
+            parts.append(f"{name} {status.latency:.2f}s")
+    return ", ".join(parts)
+
+
+def detect_devices(timeout: float = DEFAULT_BACKEND_TIMEOUT) -> List[DeviceInfo]:
+    return detect_devices_report(timeout).devices
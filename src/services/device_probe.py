@@ -0,0 +1,274 @@
+import asyncio
+import os
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.adb_client import AdbError, get_default_client
+from services.async_runtime import get_default_runtime
+from services.device_detector import DeviceInfo
+
+
+DEFAULT_PROBE_TTL = 60.0
+DEFAULT_PROBE_TIMEOUT = 10.0
+MAX_PARALLEL_PROBES = 8
+# 探测失败（设备离线、shell 不可用）的结果只短暂缓存，避免每次安装都等待超时
+FAILED_PROBE_TTL = 5.0
+# 安装时需暂存安装包，并解压 so 与 dex 优化产物，按安装包大小的 2 倍估算所需空间
+INSTALL_SPACE_FACTOR = 2.0
+
+_MARKER = "@@"
+_NUMBER_PATTERN = re.compile(r"(\d+)")
+
+# 所有属性在一次 shell 调用中读取，每行以标记开头，便于忽略设备端的其他输出
+_ANDROID_PROBE_COMMAND = "; ".join(
+    [
+        f'echo "{_MARKER}model=$(getprop ro.product.model)"',
+        f'echo "{_MARKER}os=$(getprop ro.build.version.release)"',
+        f'echo "{_MARKER}sdk=$(getprop ro.build.version.sdk)"',
+        f'echo "{_MARKER}abis=$(getprop ro.product.cpu.abilist)"',
+        f'echo "{_MARKER}abi=$(getprop ro.product.cpu.abi)"',
+        f'echo "{_MARKER}storage=$(df -k /data | tail -n 1)"',
+        f'echo "{_MARKER}battery=$(dumpsys battery | grep level)"',
+    ]
+)
+
+_HARMONY_PROBE_COMMAND = "; ".join(
+    [
+        f'echo "{_MARKER}model=$(param get const.product.model)"',
+        f'echo "{_MARKER}os=$(param get const.product.software.version)"',
+        f'echo "{_MARKER}sdk=$(param get const.ohos.apiversion)"',
+        f'echo "{_MARKER}abis=$(param get const.product.cpu.abilist)"',
+        f'echo "{_MARKER}storage=$(df -k /data | tail -n 1)"',
+        f'echo "{_MARKER}battery=$(hidumper -s BatteryService -a -i | grep capacity)"',
+    ]
+)
+
+# hdc 的 param get 读取不存在的参数时输出错误文本而非空值
+_PARAM_ERROR_PATTERN = re.compile(r"^Get parameter .* fail", re.IGNORECASE)
+
+
+@dataclass
+class DeviceProperties:
+    device_id: str
+    platform: str
+    model: str = ""
+    os_version: str = ""
+    sdk: Optional[int] = None
+    # 按设备偏好排序，第一个为主 ABI
+    abis: List[str] = field(default_factory=list)
+    free_storage: Optional[int] = None
+    battery: Optional[int] = None
+    probed_at: float = 0.0
+    error: str = ""
+
+
+async def _run_probe_command(command: List[str], timeout: float) -> Tuple[str, str]:
+    try:
+        result = await get_default_runtime().run_command(command, timeout)
+    except FileNotFoundError:
+        return "", f"{command[0]} 未安装"
+    except subprocess.TimeoutExpired:
+        return "", f"探测超时（{timeout:.0f}s）"
+    return result.stdout, ""
+
+
+def _parse_free_storage(line: str) -> Optional[int]:
+    # df -k 的数据行：文件系统 总量 已用 可用 使用率 挂载点，单位 KB
+    parts = line.split()
+    if len(parts) < 4 or not parts[3].isdigit():
+        return None
+    return int(parts[3]) * 1024
+
+
+def _parse_number(text: str) -> Optional[int]:
+    match = _NUMBER_PATTERN.search(text)
+    return int(match.group(1)) if match else None
+
+
+def parse_probe_output(device_id: str, platform: str, output: str) -> DeviceProperties:
+    values: Dict[str, str] = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith(_MARKER):
+            continue
+        key, _, value = line[len(_MARKER):].partition("=")
+        value = value.strip()
+        if _PARAM_ERROR_PATTERN.match(value):
+            value = ""
+        values[key] = value
+    properties = DeviceProperties(device_id=device_id, platform=platform, probed_at=time.monotonic())
+    if not values:
+        properties.error = output.strip().splitlines()[0] if output.strip() else "设备无输出"
+        return properties
+    properties.model = values.get("model", "")
+    properties.os_version = values.get("os", "")
+    properties.sdk = int(values["sdk"]) if values.get("sdk", "").isdigit() else None
+    abi_list = values.get("abis") or values.get("abi", "")
+    properties.abis = [abi.strip() for abi in abi_list.split(",") if abi.strip()]
+    properties.free_storage = _parse_free_storage(values.get("storage", ""))
+    properties.battery = _parse_number(values.get("battery", ""))
+    return properties
+
+
+async def _probe_output(device: DeviceInfo, timeout: float) -> Tuple[str, str]:
+    if device.platform == "android":
+        client = get_default_client()
+        if client is not None:
+            try:
+                return await asyncio.to_thread(client.shell, device.device_id, _ANDROID_PROBE_COMMAND), ""
+            except (AdbError, OSError):
+                pass
+        return await _run_probe_command(["adb", "-s", device.device_id, "shell", _ANDROID_PROBE_COMMAND], timeout)
+    return await _run_probe_command(["hdc", "-t", device.device_id, "shell", _HARMONY_PROBE_COMMAND], timeout)
+
+
+async def probe_device_async(device: DeviceInfo, timeout: float = DEFAULT_PROBE_TIMEOUT) -> DeviceProperties:
+    output, error = await _probe_output(device, timeout)
+    if error:
+        return DeviceProperties(
+            device_id=device.device_id, platform=device.platform, probed_at=time.monotonic(), error=error
+        )
+    properties = parse_probe_output(device.device_id, device.platform, output)
+    if not properties.model and device.details.get("model"):
+        # adb devices -l 的 model 字段用下划线代替空格
+        properties.model = device.details["model"].replace("_", " ")
+    return properties
+
+
+def probe_device(device: DeviceInfo, timeout: float = DEFAULT_PROBE_TIMEOUT) -> DeviceProperties:
+    return get_default_runtime().run(probe_device_async(device, timeout))
+
+
+def _format_bytes(size: int) -> str:
+    if size >= 1024 ** 3:
+        return f"{size / 1024 ** 3:.1f}GB"
+    return f"{size / 1024 ** 2:.0f}MB"
+
+
+def format_device_properties(properties: Optional[DeviceProperties]) -> str:
+    if properties is None:
+        return ""
+    if properties.error:
+        return f"探测失败: {properties.error}"
+    parts: List[str] = []
+    if properties.model:
+        parts.append(properties.model)
+    if properties.os_version or properties.sdk is not None:
+        sdk_text = f" (API {properties.sdk})" if properties.sdk is not None else ""
+        parts.append(f"{properties.os_version}{sdk_text}".strip())
+    if properties.abis:
+        parts.append(properties.abis[0])
+    if properties.free_storage is not None:
+        parts.append(f"可用 {_format_bytes(properties.free_storage)}")
+    if properties.battery is not None:
+        parts.append(f"电量 {properties.battery}%")
+    return " · ".join(parts)
+
+
+def abis_compatible(package_abis: Sequence[str], device_abis: Sequence[str]) -> bool:
+    # 不含 native 库的安装包，或未能读取设备 ABI 时都视为兼容
+    if not package_abis or not device_abis:
+        return True
+    return any(abi in device_abis for abi in package_abis)
+
+
+def pick_abi_variant(candidates: Sequence[Tuple[Path, Sequence[str]]], device_abis: Sequence[str]) -> Optional[Path]:
+    # 按设备 ABI 偏好顺序匹配，同一 ABI 下优先只含该 ABI 的包（体积更小）；都不匹配时退回通用包
+    for abi in device_abis:
+        matching = [(path, abis) for path, abis in candidates if abi in abis]
+        if matching:
+            return min(matching, key=lambda candidate: len(candidate[1]))[0]
+    return next((path for path, abis in candidates if not abis), None)
+
+
+def required_space(paths: Iterable[Path]) -> int:
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            continue
+    return int(total * INSTALL_SPACE_FACTOR)
+
+
+def format_space_shortage(free_storage: int, required: int) -> str:
+    return f"设备可用空间 {_format_bytes(free_storage)}，安装约需 {_format_bytes(required)}"
+
+
+class DeviceProbe:
+    def __init__(
+        self,
+        ttl: float = DEFAULT_PROBE_TTL,
+        timeout: float = DEFAULT_PROBE_TIMEOUT,
+        max_workers: int = MAX_PARALLEL_PROBES,
+    ) -> None:
+        self._ttl = ttl
+        self._timeout = timeout
+        self._max_workers = max(1, max_workers)
+        self._cache: Dict[str, DeviceProperties] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, device_id: str) -> Optional[DeviceProperties]:
+        with self._lock:
+            properties = self._cache.get(device_id)
+        if properties is None:
+            return None
+        ttl = min(self._ttl, FAILED_PROBE_TTL) if properties.error else self._ttl
+        if time.monotonic() - properties.probed_at > ttl:
+            return None
+        return properties
+
+    def invalidate(self, device_id: Optional[str] = None) -> None:
+        with self._lock:
+            if device_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(device_id, None)
+
+    def probe(self, devices: Iterable[DeviceInfo], force: bool = False) -> Dict[str, DeviceProperties]:
+        return get_default_runtime().run(self.probe_async(list(devices), force))
+
+    async def probe_async(self, devices: Iterable[DeviceInfo], force: bool = False) -> Dict[str, DeviceProperties]:
+        results: Dict[str, DeviceProperties] = {}
+        stale: List[DeviceInfo] = []
+        for device in devices:
+            if device.status != "device":
+                continue
+            cached = None if force else self.cached(device.device_id)
+            if cached is not None:
+                results[device.device_id] = cached
+            else:
+                stale.append(device)
+        # 每台设备一次 shell 往返，多台设备在事件循环中并发探测
+        limit = asyncio.Semaphore(self._max_workers)
+
+        async def probe_one(device: DeviceInfo) -> DeviceProperties:
+            async with limit:
+                return await probe_device_async(device, self._timeout)
+
+        probed = await asyncio.gather(*(probe_one(device) for device in stale))
+        with self._lock:
+            for properties in probed:
+                self._cache[properties.device_id] = properties
+                results[properties.device_id] = properties
+        return results
+
+
+_default_probe = DeviceProbe()
+_default_probe_lock = threading.Lock()
+
+
+def get_default_probe() -> DeviceProbe:
+    with _default_probe_lock:
+        return _default_probe
+
+
+def configure_default_probe(ttl: float = DEFAULT_PROBE_TTL) -> None:
+    global _default_probe
+    with _default_probe_lock:
+        _default_probe = DeviceProbe(ttl=ttl)
@@ -0,0 +1,266 @@
+import asyncio
+import subprocess
+import threading
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass, field
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from services.adb_client import AdbConnection, AdbError, get_default_client, parse_devices_l
+from services.async_runtime import get_default_runtime
+from services.device_detector import (
+    DEFAULT_BACKEND_TIMEOUT,
+    BackendStatus,
+    DetectionReport,
+    DeviceInfo,
+    detect_adb_devices,
+    device_from_details,
+    detect_devices_report,
+    detect_hdc_devices,
+)
+
+
+DEFAULT_HDC_POLL_INTERVAL = 2.0
+DEFAULT_ADB_RETRY_INTERVAL = 5.0
+DEFAULT_REMOTE_POLL_INTERVAL = 5.0
+# 轮询连续出错时间隔逐次翻倍，最长不超过该值
+MAX_POLL_BACKOFF = 30.0
+_PLATFORMS = ("android", "harmony")
+# 远程 agent 的设备单独成表，设备码带 agent 地址前缀
+_REMOTE_TABLE = "remote"
+
+
+@dataclass
+class DeviceDiff:
+    added: List[DeviceInfo] = field(default_factory=list)
+    removed: List[DeviceInfo] = field(default_factory=list)
+    changed: List[DeviceInfo] = field(default_factory=list)
+    devices: List[DeviceInfo] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+def diff_devices(previous: List[DeviceInfo], current: List[DeviceInfo]) -> DeviceDiff:
+    previous_by_id = {device.device_id: device for device in previous}
+    current_by_id = {device.device_id: device for device in current}
+    diff = DeviceDiff(devices=list(current))
+    for device_id, device in current_by_id.items():
+        old = previous_by_id.get(device_id)
+        if old is None:
+            diff.added.append(device)
+        elif old != device:
+            diff.changed.append(device)
+    diff.removed = [device for device_id, device in previous_by_id.items() if device_id not in current_by_id]
+    return diff
+
+
+def parse_track_devices_message(payload: str) -> List[DeviceInfo]:
+    # track-devices -l 每行格式与 adb devices -l 相同（无标题行），保留 model、transport_id 等信息
+    return [device_from_details(details) for details in parse_devices_l(payload)]
+
+
+class DeviceTracker:
+    def __init__(
+        self,
+        on_change: Callable[[DeviceDiff], None],
+        hdc_poll_interval: float = DEFAULT_HDC_POLL_INTERVAL,
+        adb_retry_interval: float = DEFAULT_ADB_RETRY_INTERVAL,
+        backend_timeout: float = DEFAULT_BACKEND_TIMEOUT,
+        on_backend_issue: Optional[Callable[[BackendStatus], None]] = None,
+        remote_detect: Optional[Callable[[], DetectionReport]] = None,
+        remote_poll_interval: float = DEFAULT_REMOTE_POLL_INTERVAL,
+    ) -> None:
+        self._on_change = on_change
+        self._remote_detect = remote_detect
+        self._remote_poll_interval = remote_poll_interval
+        self._failing_agents: Set[str] = set()
+        self._on_backend_issue = on_backend_issue
+        self._backend_timeout = backend_timeout
+        self._hdc_poll_interval = hdc_poll_interval
+        self._adb_retry_interval = adb_retry_interval
+        self._table_names = _PLATFORMS + ((_REMOTE_TABLE,) if remote_detect is not None else ())
+        self._tables: Dict[str, Dict[str, DeviceInfo]] = {name: {} for name in self._table_names}
+        self._latency: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._hdc_wakeup = threading.Event()
+        self._adb_future: Optional["Future[None]"] = None
+        self._adb_connection: Optional[AdbConnection] = None
+        self._adb_streaming = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop_event.clear()
+        loops = [(self._adb_loop, "adb-tracker"), (self._hdc_loop, "hdc-tracker")]
+        if self._remote_detect is not None:
+            loops.append((self._remote_loop, "agent-tracker"))
+        for target, name in loops:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._hdc_wakeup.set()
+        future = self._adb_future
+        if future is not None:
+            future.cancel()
+        # 关闭 adb server 长连接，让阻塞在读取上的跟踪线程退出
+        connection = self._adb_connection
+        if connection is not None:
+            connection.close()
+        self._threads = []
+
+    def snapshot(self) -> List[DeviceInfo]:
+        with self._lock:
+            return [device for name in self._table_names for device in self._tables[name].values()]
+
+    def backend_latency(self) -> Dict[str, float]:
+        # 各后端最近一次探测耗时；adb 流式跟踪期间没有独立的探测过程
+        with self._lock:
+            return dict(self._latency)
+
+    def refresh(self) -> DetectionReport:
+        # adb 流在线时设备表已是实时数据，只需立即补一次 hdc 轮询
+        platforms = ("harmony",) if self._adb_streaming else ("android", "harmony")
+        report = detect_devices_report(self._backend_timeout, platforms)
+        # 超时的后端保留原有设备表，避免误报设备断开
+        for platform, devices in report.devices_by_platform.items():
+            self._replace_platform(platform, devices)
+        with self._lock:
+            for status in report.backends:
+                if status.ok:
+                    self._latency[status.platform] = status.latency
+        if self._remote_detect is not None:
+            remote_report = self._poll_remote()
+            report.devices.extend(remote_report.devices)
+            report.backends.extend(remote_report.backends)
+        return report
+
+    def _poll_platform(self, platform: str, detector: Callable[[Optional[float]], List[DeviceInfo]]) -> bool:
+        started = time.monotonic()
+        try:
+            devices = detector(self._backend_timeout)
+        except subprocess.TimeoutExpired:
+            self._report_issue(BackendStatus(platform=platform, latency=time.monotonic() - started, timed_out=True))
+            return False
+        except Exception as exc:
+            # 任何异常都不能结束轮询线程，否则该平台的热插拔在本次会话内失效
+            error = str(exc) or type(exc).__name__
+            self._report_issue(BackendStatus(platform=platform, latency=time.monotonic() - started, error=error))
+            return False
+        with self._lock:
+            self._latency[platform] = time.monotonic() - started
+        self._replace_platform(platform, devices)
+        return True
+
+    def _report_issue(self, status: BackendStatus) -> None:
+        if self._on_backend_issue:
+            self._on_backend_issue(status)
+
+    def _replace_platform(self, platform: str, devices: List[DeviceInfo]) -> None:
+        with self._lock:
+            previous = [device for name in self._table_names for device in self._tables[name].values()]
+            self._tables[platform] = {device.device_id: device for device in devices}
+            current = [device for name in self._table_names for device in self._tables[name].values()]
+            diff = diff_devices(previous, current)
+            # 持锁回调保证多个线程产生的差异按顺序送达，回调内不得阻塞
+            if not diff.empty:
+                self._on_change(diff)
+
+    def _hdc_loop(self) -> None:
+        failures = 0
+        while not self._stop_event.is_set():
+            failures = 0 if self._poll_platform("harmony", detect_hdc_devices) else failures + 1
+            interval = min(self._hdc_poll_interval * 2 ** failures, max(MAX_POLL_BACKOFF, self._hdc_poll_interval))
+            self._hdc_wakeup.wait(interval)
+            self._hdc_wakeup.clear()
+
+    def _poll_remote(self) -> DetectionReport:
+        # 不可达的 agent 由协调端保留上次设备表，这里只在 agent 刚变为不可达时上报一次
+        report = self._remote_detect()
+        failing = {status.platform for status in report.backends if not status.ok}
+        if self._on_backend_issue:
+            for status in report.backends:
+                if not status.ok and status.platform not in self._failing_agents:
+                    self._on_backend_issue(status)
+        self._failing_agents = failing
+        self._replace_platform(_REMOTE_TABLE, report.devices)
+        return report
+
+    def _remote_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._poll_remote()
+            except Exception as exc:
+                self._report_issue(BackendStatus(platform="agent", latency=0.0, error=str(exc) or type(exc).__name__))
+            self._stop_event.wait(self._remote_poll_interval)
+
+    def _adb_loop(self) -> None:
+        while not self._stop_event.is_set():
+            self._stream_adb_devices()
+            if self._stop_event.is_set():
+                break
+            # 流中断（adb 未安装或 server 重启）时先退化为一次性探测，稍后重连
+            self._poll_platform("android", detect_adb_devices)
+            self._stop_event.wait(self._adb_retry_interval)
+
+    def _stream_adb_devices_via_server(self) -> bool:
+        client = get_default_client()
+        if client is None:
+            return False
+        try:
+            messages = client.track_devices(on_open=self._set_adb_connection)
+            self._adb_streaming = True
+            for payload in messages:
+                if self._stop_event.is_set():
+                    break
+                self._replace_platform("android", parse_track_devices_message(payload))
+        except (AdbError, OSError):
+            return self._stop_event.is_set()
+        finally:
+            self._adb_streaming = False
+            self._adb_connection = None
+        return True
+
+    def _set_adb_connection(self, connection: AdbConnection) -> None:
+        self._adb_connection = connection
+        # stop() 可能在连接建立前已被调用
+        if self._stop_event.is_set():
+            connection.close()
+
+    def _stream_adb_devices(self) -> None:
+        if self._stream_adb_devices_via_server():
+            return
+        future = get_default_runtime().schedule(self._read_adb_stream())
+        self._adb_future = future
+        # stop() 可能在协程启动前已被调用
+        if self._stop_event.is_set():
+            future.cancel()
+        try:
+            future.result()
+        except (CancelledError, OSError):
+            pass
+        finally:
+            self._adb_future = None
+
+    async def _read_adb_stream(self) -> None:
+        # 在共享事件循环中读取 adb track-devices 输出，取消时终止子进程
+        runtime = get_default_runtime()
+        process = await runtime.spawn(["adb", "track-devices", "-l"], subprocess.DEVNULL)
+        self._adb_streaming = True
+        try:
+            while True:
+                # 每条消息为 4 位十六进制长度前缀 + 完整设备列表
+                length = int(await process.stdout.readexactly(4), 16)
+                payload = await process.stdout.readexactly(length) if length else b""
+                self._replace_platform("android", parse_track_devices_message(payload.decode("utf-8", errors="replace")))
+        except (asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._adb_streaming = False
+            await runtime.kill(process)
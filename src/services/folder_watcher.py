@@ -0,0 +1,154 @@
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.package_scanner import (
+    DEFAULT_MAX_DEPTH,
+    PackageInfo,
+    find_latest_packages,
+    iter_indexed_files,
+)
+
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_STABLE_SECONDS = 2.0
+DEFAULT_DEBOUNCE_SECONDS = 3.0
+
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_EOCD_MIN_SIZE = 22
+_EOCD_MAX_COMMENT = 0xFFFF
+_ZIP64_MARKER = 0xFFFFFFFF
+
+
+@dataclass
+class _Candidate:
+    path: Path
+    size: int
+    mtime_ns: int
+    stable_since: float
+
+
+def is_zip_complete(path: Path) -> bool:
+    try:
+        size = path.stat().st_size
+        if size < _EOCD_MIN_SIZE:
+            return False
+        tail_size = min(size, _EOCD_MIN_SIZE + _EOCD_MAX_COMMENT)
+        with path.open("rb") as file:
+            file.seek(size - tail_size)
+            tail = file.read(tail_size)
+    except OSError:
+        # Windows 下写入方持有独占锁时无法打开，视为尚未写完
+        return False
+    position = tail.rfind(_EOCD_SIGNATURE)
+    if position < 0 or len(tail) - position < _EOCD_MIN_SIZE:
+        return False
+    directory_size, directory_offset = struct.unpack_from("<II", tail, position + 12)
+    if directory_offset == _ZIP64_MARKER or directory_size == _ZIP64_MARKER:
+        return True
+    eocd_offset = size - tail_size + position
+    return directory_offset + directory_size <= eocd_offset
+
+
+class FolderWatcher:
+    def __init__(
+        self,
+        directory: Path,
+        on_ready: Callable[[PackageInfo, List[Path]], None],
+        recursive: bool = False,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        stable_seconds: float = DEFAULT_STABLE_SECONDS,
+        debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        self.directory = directory
+        self._on_ready = on_ready
+        self._recursive = recursive
+        self._max_depth = max_depth
+        self._poll_interval = poll_interval
+        self._stable_seconds = stable_seconds
+        self._debounce_seconds = debounce_seconds
+        self._on_error = on_error
+        self._seen: Dict[Path, Tuple[int, int]] = {}
+        self._pending: Dict[Path, _Candidate] = {}
+        self._last_change = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def _run(self) -> None:
+        baseline_ready = False
+        failing = False
+        delay = 0.0
+        while not self._stop_event.wait(delay):
+            delay = self._poll_interval
+            try:
+                if not baseline_ready:
+                    # 启动时已存在的安装包作为基线，不触发自动安装；网络共享目录可能较慢，在监听线程中读取
+                    self._seen = self._snapshot()
+                    baseline_ready = True
+                    continue
+                ready = self._poll(time.monotonic())
+            except Exception as exc:
+                # 共享目录暂时不可访问等错误不结束监听，每次连续失败只上报一次，下个周期继续轮询
+                if not failing and self._on_error:
+                    self._on_error(exc)
+                failing = True
+                continue
+            failing = False
+            if ready is not None and not self._stop_event.is_set():
+                self._on_ready(*ready)
+
+    def _snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        # 目录索引复用文件列表时会逐个 stat 校验，原地覆盖的文件也能拿到最新大小与 mtime
+        return {
+            file.path: (file.size, file.mtime_ns)
+            for file in iter_indexed_files(self.directory, self._recursive, self._max_depth)
+        }
+
+    def _poll(self, now: float) -> Optional[Tuple[PackageInfo, List[Path]]]:
+        snapshot = self._snapshot()
+        for path, (size, mtime_ns) in snapshot.items():
+            if self._seen.get(path) == (size, mtime_ns):
+                self._pending.pop(path, None)
+                continue
+            pending = self._pending.get(path)
+            if pending and pending.size == size and pending.mtime_ns == mtime_ns:
+                continue
+            self._pending[path] = _Candidate(path=path, size=size, mtime_ns=mtime_ns, stable_since=now)
+            self._last_change = now
+        # 写入过程中被删除的文件不再等待；删除文件本身不算新构建
+        for path in [path for path in self._pending if path not in snapshot]:
+            del self._pending[path]
+        for path in [path for path in self._seen if path not in snapshot]:
+            del self._seen[path]
+        if not self._pending or now - self._last_change < self._debounce_seconds:
+            return None
+        for candidate in self._pending.values():
+            if now - candidate.stable_since < self._stable_seconds:
+                return None
+            if not is_zip_complete(candidate.path):
+                return None
+        changed = list(self._pending)
+        for path, candidate in self._pending.items():
+            self._seen[path] = (candidate.size, candidate.mtime_ns)
+        self._pending.clear()
+        # 扫描结果与手动扫描一致（按包名取版本最高的构建），同时告知本次写入完成的文件，自动安装只装这些构建
+        return find_latest_packages(self.directory, self._recursive, self._max_depth), changed
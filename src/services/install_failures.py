@@ -0,0 +1,143 @@
+import random
+import re
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional, Pattern, Tuple
+
+from services.async_runtime import get_default_runtime
+
+
+FAILURE_TEST_ONLY = "test_only"
+FAILURE_TRANSPORT = "transport"
+FAILURE_SIGNATURE_MISMATCH = "signature_mismatch"
+FAILURE_VERSION_DOWNGRADE = "version_downgrade"
+FAILURE_INSUFFICIENT_STORAGE = "insufficient_storage"
+FAILURE_INCOMPATIBLE = "incompatible"
+FAILURE_INVALID_PACKAGE = "invalid_package"
+FAILURE_CANCELLED = "cancelled"
+FAILURE_UNKNOWN = "unknown"
+
+FAILURE_LABELS = {
+    FAILURE_TEST_ONLY: "测试包需要 -t",
+    FAILURE_TRANSPORT: "连接异常",
+    FAILURE_SIGNATURE_MISMATCH: "签名不一致",
+    FAILURE_VERSION_DOWNGRADE: "版本降级",
+    FAILURE_INSUFFICIENT_STORAGE: "存储空间不足",
+    FAILURE_INCOMPATIBLE: "ABI/系统版本不兼容",
+    FAILURE_INVALID_PACKAGE: "安装包无效",
+    FAILURE_CANCELLED: "已取消",
+    FAILURE_UNKNOWN: "未知错误",
+}
+
+REMEDY_ALLOW_TEST = "allow_test"
+REMEDY_RECONNECT = "reconnect"
+REMEDY_REINSTALL = "reinstall"
+
+REMEDY_LABELS = {
+    REMEDY_ALLOW_TEST: "添加 -t",
+    REMEDY_RECONNECT: "重新连接",
+    REMEDY_REINSTALL: "卸载后重装",
+}
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+DEFAULT_BACKOFF_MAX_SECONDS = 8.0
+RECONNECT_TIMEOUT = 10.0
+
+# 按顺序匹配，具体的安装错误优先于笼统的连接错误
+_ANDROID_PATTERNS: List[Tuple[str, Pattern]] = [
+    (FAILURE_TEST_ONLY, re.compile(r"INSTALL_FAILED_TEST_ONLY")),
+    (
+        FAILURE_SIGNATURE_MISMATCH,
+        re.compile(
+            r"INSTALL_FAILED_UPDATE_INCOMPATIBLE|INSTALL_PARSE_FAILED_INCONSISTENT_CERTIFICATES"
+            r"|INSTALL_FAILED_SHARED_USER_INCOMPATIBLE"
+        ),
+    ),
+    (FAILURE_VERSION_DOWNGRADE, re.compile(r"INSTALL_FAILED_VERSION_DOWNGRADE")),
+    (FAILURE_INSUFFICIENT_STORAGE, re.compile(r"INSTALL_FAILED_INSUFFICIENT_STORAGE|No space left")),
+    (FAILURE_INCOMPATIBLE, re.compile(r"INSTALL_FAILED_NO_MATCHING_ABIS|INSTALL_FAILED_OLDER_SDK")),
+    (FAILURE_INVALID_PACKAGE, re.compile(r"INSTALL_PARSE_FAILED_\w+|INSTALL_FAILED_INVALID_APK")),
+    (
+        FAILURE_TRANSPORT,
+        re.compile(
+            r"device offline|device '.*' not found|no devices/emulators found|protocol fault"
+            r"|Connection reset|connection refused|failed to connect|\berror: closed\b|Broken pipe"
+            r"|Can't find service: package",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+_HARMONY_PATTERNS: List[Tuple[str, Pattern]] = [
+    (FAILURE_SIGNATURE_MISMATCH, re.compile(r"sign info inconsistent|signature verification failed", re.IGNORECASE)),
+    (FAILURE_VERSION_DOWNGRADE, re.compile(r"version downgrade", re.IGNORECASE)),
+    (FAILURE_INSUFFICIENT_STORAGE, re.compile(r"insufficient disk|no space", re.IGNORECASE)),
+    (FAILURE_INCOMPATIBLE, re.compile(r"older sdk|incompatible|cpu abi", re.IGNORECASE)),
+    (
+        FAILURE_INVALID_PACKAGE,
+        re.compile(r"install parse \w+|failed to parse|invalid hap|install failed due to \w+ check error", re.IGNORECASE),
+    ),
+    (
+        FAILURE_TRANSPORT,
+        re.compile(
+            r"not match target|connect-key|connect server failed|device not found|offline|channel close",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS
+    backoff_max_seconds: float = DEFAULT_BACKOFF_MAX_SECONDS
+    reinstall_on_signature_mismatch: bool = False
+
+    def backoff(self, attempt: int) -> float:
+        # 指数退避加少量抖动，避免多台设备同时重连 adb/hdc server
+        delay = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** (attempt - 1)))
+        return delay + random.uniform(0, delay / 4)
+
+
+def classify_failure(platform: str, output: str) -> str:
+    patterns = _ANDROID_PATTERNS if platform == "android" else _HARMONY_PATTERNS
+    for category, pattern in patterns:
+        if pattern.search(output):
+            return category
+    return FAILURE_UNKNOWN
+
+
+def _run_quiet(command: List[str], timeout: float) -> Optional[subprocess.CompletedProcess]:
+    try:
+        return get_default_runtime().run_command_sync(command, timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def reconnect_device(device_id: str, platform: str, timeout: float = RECONNECT_TIMEOUT) -> bool:
+    # 网络设备（ip:port）重新 connect；USB 设备让 adb 断开重连后等待设备恢复
+    if platform == "android":
+        if ":" in device_id:
+            _run_quiet(["adb", "connect", device_id], timeout)
+        else:
+            _run_quiet(["adb", "-s", device_id, "reconnect"], timeout)
+        result = _run_quiet(["adb", "-s", device_id, "wait-for-device"], timeout)
+        return result is not None and result.returncode == 0
+    if ":" in device_id:
+        result = _run_quiet(["hdc", "tconn", device_id], timeout)
+        return result is not None and result.returncode == 0
+    return True
+
+
+def uninstall_package(device_id: str, platform: str, package_name: str, timeout: float = RECONNECT_TIMEOUT) -> bool:
+    if platform == "android":
+        command = ["adb", "-s", device_id, "uninstall", package_name]
+    else:
+        command = ["hdc", "-t", device_id, "uninstall", package_name]
+    result = _run_quiet(command, timeout)
+    if result is None or result.returncode != 0:
+        return False
+    output = f"{result.stdout}\n{result.stderr}"
+    return "Failure" not in output and "[Fail]" not in output
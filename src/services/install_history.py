@@ -0,0 +1,162 @@
+import json
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+# 安装服务连带 asyncio 等模块，只为类型标注导入，查看历史无需加载
+if TYPE_CHECKING:
+    from services.installer import DeviceInstallResult
+
+
+HISTORY_FILE_NAME = "install_history.jsonl"
+DEFAULT_LOAD_LIMIT = 5000
+PHASES = ("detect", "precheck", "transfer", "install", "verify")
+PHASE_LABELS = {"detect": "探测", "precheck": "预检", "transfer": "传输", "install": "安装", "verify": "校验"}
+
+
+@dataclass
+class DurationStats:
+    count: int
+    p50: float
+    p95: float
+
+
+@dataclass
+class HistorySummary:
+    scope: str
+    key: str
+    runs: int
+    failures: int
+    total: Optional[DurationStats]
+    phases: Dict[str, DurationStats] = field(default_factory=dict)
+
+
+def default_history_path(config_path: Path) -> Path:
+    return config_path.parent / HISTORY_FILE_NAME
+
+
+def format_phases(phases: Dict[str, float]) -> str:
+    return ", ".join(f"{PHASE_LABELS[name]} {phases[name]:.1f}s" for name in PHASES if name in phases)
+
+
+def format_duration_stats(stats: Optional[DurationStats]) -> str:
+    if stats is None:
+        return "-"
+    return f"{stats.p50:.1f} / {stats.p95:.1f}s"
+
+
+def build_record(
+    result: "DeviceInstallResult",
+    run_id: str,
+    detect_latency: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    task = result.task
+    phases = {name: round(value, 3) for name, value in result.phases.items()}
+    if detect_latency and task.platform in detect_latency:
+        phases["detect"] = round(detect_latency[task.platform], 3)
+    record: Dict[str, Any] = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "run_id": run_id,
+        "device_id": task.device_id,
+        "platform": task.platform,
+        "package": task.package_path.name,
+        "version_code": task.metadata.version_code if task.metadata else None,
+        "success": result.success,
+        "skipped": result.skipped,
+        "verified": result.verified,
+        "duration": round(result.duration, 3),
+        "phases": phases,
+        "attempts": result.attempts,
+        "failure": result.failure,
+        "remedies": result.remedies,
+        "error": result.error,
+    }
+    if result.install_result is not None:
+        record["returncode"] = result.install_result.process.returncode
+    return record
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    # 最近秩法，样本较少时直接取实际观测值
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _stats(values: List[float]) -> Optional[DurationStats]:
+    if not values:
+        return None
+    values = sorted(values)
+    return DurationStats(count=len(values), p50=_percentile(values, 0.5), p95=_percentile(values, 0.95))
+
+
+def summarize_history(records: Iterable[Dict[str, Any]]) -> List[HistorySummary]:
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for record in records:
+        # 跳过的记录只包含版本比对，不计入耗时分布
+        if record.get("skipped"):
+            continue
+        groups.setdefault(("platform", record.get("platform", "")), []).append(record)
+        groups.setdefault(("device", record.get("device_id", "")), []).append(record)
+    summaries: List[HistorySummary] = []
+    # 平台汇总在前，设备明细在后
+    for (scope, key), group in sorted(groups.items(), key=lambda item: (item[0][0] != "platform", item[0][1])):
+        phase_stats: Dict[str, DurationStats] = {}
+        for phase in PHASES:
+            stats = _stats([record["phases"][phase] for record in group if phase in record.get("phases", {})])
+            if stats is not None:
+                phase_stats[phase] = stats
+        summaries.append(
+            HistorySummary(
+                scope=scope,
+                key=key,
+                runs=len(group),
+                failures=sum(1 for record in group if not record.get("success")),
+                total=_stats([record["duration"] for record in group if "duration" in record]),
+                phases=phase_stats,
+            )
+        )
+    return summaries
+
+
+class InstallHistory:
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        # 只追加不改写，安装线程并发写入时按行串行化
+        with self._lock:
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with self._path.open("a", encoding="utf-8") as file:
+                    file.write(line)
+            except OSError:
+                return False
+        return True
+
+    def load(self, limit: int = DEFAULT_LOAD_LIMIT) -> List[Dict[str, Any]]:
+        lines: Deque[str] = deque(maxlen=limit)
+        try:
+            with self._path.open("r", encoding="utf-8", errors="replace") as file:
+                lines.extend(file)
+        except OSError:
+            return []
+        records: List[Dict[str, Any]] = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程中途退出可能留下半行，忽略即可
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+        return records
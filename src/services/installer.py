@@ -1,8 +1,56 @@
-import os
+import contextvars
+import re
 import subprocess
-from dataclasses import dataclass
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from services.adb_client import AdbError, get_default_client
+from services.async_runtime import OperationCancelled, check_cancelled, get_default_runtime, sleep_unless_cancelled
+from services.device_detector import DeviceInfo
+from services.device_probe import (
+    abis_compatible,
+    format_space_shortage,
+    get_default_probe,
+    pick_abi_variant,
+    required_space,
+)
+from services.install_failures import (
+    FAILURE_CANCELLED,
+    FAILURE_INCOMPATIBLE,
+    FAILURE_INSUFFICIENT_STORAGE,
+    FAILURE_INVALID_PACKAGE,
+    FAILURE_LABELS,
+    FAILURE_SIGNATURE_MISMATCH,
+    FAILURE_TEST_ONLY,
+    FAILURE_TRANSPORT,
+    REMEDY_ALLOW_TEST,
+    REMEDY_LABELS,
+    REMEDY_RECONNECT,
+    REMEDY_REINSTALL,
+    RetryPolicy,
+    classify_failure,
+    reconnect_device,
+    uninstall_package,
+)
+from services.package_index import get_default_index
+from services.package_integrity import IntegrityResult, format_integrity_error
+from services.package_metadata import PackageMetadata
+from services.version_check import is_same_build, query_installed_version
+
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_PLATFORM_LIMITS: Dict[str, int] = {"android": 4, "harmony": 2}
+OUTPUT_BUFFER_LINES = 200
+# hdc install 成功时输出 "[Info]App install path:..., msg:install bundle successfully."
+HARMONY_INSTALL_SUCCESS = "install bundle successfully"
+
+_PERCENT_PATTERN = re.compile(r"(\d{1,3})\s*%")
+_SPEED_PATTERN = re.compile(r"(\d+(?:\.\d+)?\s*[kKMG]?i?B/s)")
 
 
 @dataclass
@@ -11,22 +59,558 @@ class InstallResult:
     process: subprocess.CompletedProcess
 
 
-def install_android(device_id: str, apk_path: Path, allow_test: bool) -> InstallResult:
-    command: List[str] = ["adb", "-s", device_id, "install"]
+@dataclass
+class InstallProgress:
+    device_id: str
+    line: str
+    percent: Optional[int] = None
+    speed: str = ""
+
+
+@dataclass
+class InstallTask:
+    device_id: str
+    platform: str
+    package_path: Path
+    allow_test: bool = False
+    force: bool = False
+    metadata: Optional[PackageMetadata] = None
+    # 与 package_path 同一版本的 split APK / feature HAP，在一次安装会话中一并安装
+    split_paths: List[Path] = field(default_factory=list)
+    # 同一版本按 ABI 拆分的其他构建，安装前按设备 ABI 与 package_path 一起参与选择
+    abi_variants: List[Path] = field(default_factory=list)
+
+
+@dataclass
+class DeviceInstallResult:
+    task: InstallTask
+    success: bool
+    duration: float
+    install_result: Optional[InstallResult] = None
+    error: str = ""
+    skipped: bool = False
+    verified: Optional[bool] = None
+    phases: Dict[str, float] = field(default_factory=dict)
+    attempts: int = 1
+    failure: str = ""
+    remedies: List[str] = field(default_factory=list)
+
+
+@dataclass
+class InstallSummary:
+    results: List[DeviceInstallResult]
+    elapsed: float
+
+    @property
+    def succeeded(self) -> List[DeviceInstallResult]:
+        return [result for result in self.results if result.success and not result.skipped]
+
+    @property
+    def skipped(self) -> List[DeviceInstallResult]:
+        return [result for result in self.results if result.skipped]
+
+    @property
+    def failed(self) -> List[DeviceInstallResult]:
+        return [result for result in self.results if not result.success]
+
+
+def parse_progress(device_id: str, line: str) -> InstallProgress:
+    percent_match = _PERCENT_PATTERN.search(line)
+    speed_match = _SPEED_PATTERN.search(line)
+    return InstallProgress(
+        device_id=device_id,
+        line=line,
+        percent=min(100, int(percent_match.group(1))) if percent_match else None,
+        speed=speed_match.group(1).replace(" ", "") if speed_match else "",
+    )
+
+
+def _format_speed(bytes_per_second: float) -> str:
+    if bytes_per_second >= 1024 * 1024:
+        return f"{bytes_per_second / (1024 * 1024):.1f}MB/s"
+    return f"{bytes_per_second / 1024:.1f}kB/s"
+
+
+def _stream_command(
+    command: List[str],
+    device_id: str,
+    on_progress: Optional[Callable[[InstallProgress], None]],
+) -> subprocess.CompletedProcess:
+    # 只保留最近的输出行，长时间安装时内存占用不随输出增长
+    output: Deque[str] = deque(maxlen=OUTPUT_BUFFER_LINES)
+
+    def handle_line(raw_line: str) -> None:
+        line = raw_line.strip()
+        if not line:
+            return
+        output.append(line)
+        if on_progress:
+            on_progress(parse_progress(device_id, line))
+
+    # 子进程由后台事件循环管理，取消安装时立即终止 adb/hdc 进程
+    returncode = get_default_runtime().stream_command_sync(command, handle_line)
+    return subprocess.CompletedProcess(command, returncode, stdout="\n".join(output), stderr="")
+
+
+def _install_android_via_server(
+    device_id: str,
+    apk_paths: List[Path],
+    allow_test: bool,
+    on_progress: Optional[Callable[[InstallProgress], None]],
+) -> Optional[InstallResult]:
+    client = get_default_client()
+    if client is None:
+        return None
+    started = time.monotonic()
+    last_percent = -1
+    label = apk_paths[0].name if len(apk_paths) == 1 else f"{apk_paths[0].name} (+{len(apk_paths) - 1})"
+
+    def report_transfer(sent: int, total: int) -> None:
+        nonlocal last_percent
+        # 经 adb server 推送时在数据块之间响应取消
+        check_cancelled()
+        percent = sent * 100 // total if total else 100
+        if on_progress is None or percent == last_percent:
+            return
+        last_percent = percent
+        elapsed = max(time.monotonic() - started, 1e-6)
+        on_progress(
+            InstallProgress(
+                device_id=device_id,
+                line=f"[{percent:3d}%] {label}",
+                percent=percent,
+                speed=_format_speed(sent / elapsed),
+            )
+        )
+
+    try:
+        if len(apk_paths) == 1:
+            result = client.install(device_id, apk_paths[0], allow_test, on_transfer=report_transfer)
+        else:
+            result = client.install_multiple(device_id, apk_paths, allow_test, on_transfer=report_transfer)
+    except (AdbError, OSError):
+        return None
+    command = [f"adb-server://{client.host}:{client.port}", "-s", device_id]
+    command.append("install" if len(apk_paths) == 1 else "install-multiple")
     if allow_test:
         command.append("-t")
-    command.append(str(apk_path))
-    run_kwargs = {"capture_output": True, "text": True, "check": False}
-    if os.name == "nt":
-        run_kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
-    process = subprocess.run(command, **run_kwargs)
+    command.extend(str(path) for path in apk_paths)
+    if on_progress and result.output:
+        on_progress(parse_progress(device_id, result.output))
+    process = subprocess.CompletedProcess(command, result.returncode, stdout=result.output, stderr="")
     return InstallResult(command=command, process=process)
 
 
-def install_harmony(device_id: str, hap_path: Path) -> InstallResult:
+def install_android(
+    device_id: str,
+    apk_path: Path,
+    allow_test: bool,
+    on_progress: Optional[Callable[[InstallProgress], None]] = None,
+    split_paths: Optional[List[Path]] = None,
+) -> InstallResult:
+    apk_paths = [apk_path] + list(split_paths or [])
+    server_result = _install_android_via_server(device_id, apk_paths, allow_test, on_progress)
+    if server_result is not None:
+        return server_result
+    # 分包使用 install-multiple 在同一会话中提交，避免中途只装上部分分包
+    command: List[str] = ["adb", "-s", device_id, "install" if len(apk_paths) == 1 else "install-multiple"]
+    if allow_test:
+        command.append("-t")
+    command.extend(str(path) for path in apk_paths)
+    process = _stream_command(command, device_id, on_progress)
+    return InstallResult(command=command, process=process)
+
+
+def install_harmony(
+    device_id: str,
+    hap_path: Path,
+    on_progress: Optional[Callable[[InstallProgress], None]] = None,
+    split_paths: Optional[List[Path]] = None,
+) -> InstallResult:
+    # entry 与 feature HAP 一次传给 hdc install，由设备端作为一个应用安装
     command = ["hdc", "-t", device_id, "install", str(hap_path)]
-    run_kwargs = {"capture_output": True, "text": True, "check": False}
-    if os.name == "nt":
-        run_kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
-    process = subprocess.run(command, **run_kwargs)
+    command.extend(str(path) for path in split_paths or [])
+    process = _stream_command(command, device_id, on_progress)
     return InstallResult(command=command, process=process)
+
+
+def _install_succeeded(platform: str, process: subprocess.CompletedProcess) -> bool:
+    if process.returncode != 0:
+        return False
+    output = f"{process.stdout or ''}\n{process.stderr or ''}"
+    if platform == "android":
+        return "Failure" not in output
+    # hdc install 失败时返回码仍为 0，只有输出明确的成功标记且没有 [Fail] 时才算成功
+    return HARMONY_INSTALL_SUCCESS in output and "[Fail]" not in output
+
+
+def select_abi_artifacts(task: InstallTask, device_abis: List[str]) -> None:
+    if not device_abis:
+        return
+    index = get_default_index()
+    if task.abi_variants:
+        candidates = [task.package_path] + task.abi_variants
+        metadata_by_path = {path: index.metadata_for(path) for path in candidates}
+        selected = pick_abi_variant(
+            [(path, metadata.abis if metadata else []) for path, metadata in metadata_by_path.items()],
+            device_abis,
+        )
+        if selected is not None and selected != task.package_path:
+            task.package_path = selected
+            task.metadata = metadata_by_path[selected]
+    # 只保留设备支持的 ABI 分包（如 config.arm64_v8a），不含 native 库的分包始终保留
+    split_metadata = {path: index.metadata_for(path) for path in task.split_paths}
+    task.split_paths = [
+        path
+        for path, metadata in split_metadata.items()
+        if metadata is None or abis_compatible(metadata.abis, device_abis)
+    ]
+
+
+def verify_task_artifacts(
+    tasks: List[InstallTask], max_workers: int = DEFAULT_MAX_WORKERS
+) -> Dict[Path, IntegrityResult]:
+    # 所有设备共用的安装包只校验一次，多个安装包并行读取
+    paths = list(
+        dict.fromkeys(path for task in tasks for path in [task.package_path] + task.split_paths + task.abi_variants)
+    )
+    index = get_default_index()
+    if len(paths) <= 1:
+        return {path: index.integrity_for(path) for path in paths}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths)), thread_name_prefix="verify") as executor:
+        return dict(zip(paths, executor.map(index.integrity_for, paths)))
+
+
+def integrity_rejection(task: InstallTask, integrity: Dict[Path, IntegrityResult]) -> Optional[str]:
+    # 损坏的 ABI 候选构建不再参与选择；安装集合本身损坏时整个任务不安装
+    task.abi_variants = [path for path in task.abi_variants if integrity[path].ok]
+    for path in [task.package_path] + task.split_paths:
+        if not integrity[path].ok:
+            return format_integrity_error(path, integrity[path])
+    return None
+
+
+class InstallScheduler:
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        platform_limits: Optional[Dict[str, int]] = None,
+        verify: bool = True,
+        retry_policy: Optional[RetryPolicy] = None,
+        probe_devices: bool = True,
+        check_integrity: bool = True,
+    ) -> None:
+        self._max_workers = max(1, max_workers)
+        self._verify = verify
+        self._probe_devices = probe_devices
+        self._check_integrity = check_integrity
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._platform_limits = dict(DEFAULT_PLATFORM_LIMITS)
+        if platform_limits:
+            self._platform_limits.update(platform_limits)
+        self._slots = threading.BoundedSemaphore(self._max_workers)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def probe_devices(self) -> bool:
+        return self._probe_devices
+
+    @property
+    def check_integrity(self) -> bool:
+        return self._check_integrity
+
+    def run(
+        self,
+        tasks: List[InstallTask],
+        on_result: Optional[Callable[[DeviceInstallResult], None]] = None,
+        on_progress: Optional[Callable[[InstallProgress], None]] = None,
+    ) -> InstallSummary:
+        started = time.monotonic()
+        results: List[DeviceInstallResult] = []
+        self._attach_metadata(tasks)
+        if self._check_integrity:
+            # 任何设备开始传输前先校验全部安装包，截断或未复制完成的构建不会推送到设备
+            integrity = verify_task_artifacts(tasks, self._max_workers)
+            verify_seconds = time.monotonic() - started
+            runnable: List[InstallTask] = []
+            for task in tasks:
+                error = integrity_rejection(task, integrity)
+                if error is None:
+                    runnable.append(task)
+                    continue
+                result = DeviceInstallResult(
+                    task=task,
+                    success=False,
+                    duration=verify_seconds,
+                    error=error,
+                    phases={"precheck": verify_seconds},
+                    attempts=0,
+                    failure=FAILURE_INVALID_PACKAGE,
+                )
+                results.append(result)
+                if on_result:
+                    on_result(result)
+            tasks = runnable
+        # 同一设备的多个安装包依次安装：每台设备同时只有一个任务在线程池中，完成后再提交它的下一个，
+        # 线程不会阻塞等待忙碌的设备
+        queues: Dict[str, List[InstallTask]] = {}
+        for task in tasks:
+            queues.setdefault(task.device_id, []).append(task)
+        devices_by_platform: Dict[str, int] = {}
+        for device_tasks in queues.values():
+            platform = device_tasks[0].platform
+            devices_by_platform[platform] = devices_by_platform.get(platform, 0) + 1
+        # adb server 与 hdc server 各自使用独立线程池，互不占用并发名额
+        executors = {
+            platform: ThreadPoolExecutor(
+                max_workers=min(self._platform_limit(platform), device_count),
+                thread_name_prefix=f"install-{platform}",
+            )
+            for platform, device_count in devices_by_platform.items()
+        }
+
+        def submit_next(device_id: str) -> Optional["Future[DeviceInstallResult]"]:
+            device_tasks = queues[device_id]
+            if not device_tasks:
+                return None
+            task = device_tasks.pop(0)
+            # 安装线程继承调用方的操作上下文，取消操作时各设备的安装一并终止
+            return executors[task.platform].submit(contextvars.copy_context().run, self._run_task, task, on_progress)
+
+        try:
+            pending = {submit_next(device_id): device_id for device_id in queues}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    device_id = pending.pop(future)
+                    result = future.result()
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+                    following = submit_next(device_id)
+                    if following is not None:
+                        pending[following] = device_id
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+        return InstallSummary(results=results, elapsed=time.monotonic() - started)
+
+    def _platform_limit(self, platform: str) -> int:
+        return max(1, min(self._platform_limits.get(platform, self._max_workers), self._max_workers))
+
+    def _attach_metadata(self, tasks: List[InstallTask]) -> None:
+        # 同一安装包只解析一次，供所有设备的版本比对与安装后校验复用
+        metadata_by_path: Dict[Path, Optional[PackageMetadata]] = {}
+        index = get_default_index()
+        for task in tasks:
+            if task.metadata is not None:
+                continue
+            if task.package_path not in metadata_by_path:
+                metadata_by_path[task.package_path] = index.metadata_for(task.package_path)
+            task.metadata = metadata_by_path[task.package_path]
+
+    def _run_task(
+        self,
+        task: InstallTask,
+        on_progress: Optional[Callable[[InstallProgress], None]],
+    ) -> DeviceInstallResult:
+        started = time.monotonic()
+        phases: Dict[str, float] = {}
+        try:
+            return self._run_task_steps(task, on_progress, started, phases)
+        except OperationCancelled:
+            return DeviceInstallResult(
+                task=task,
+                success=False,
+                duration=time.monotonic() - started,
+                error=FAILURE_LABELS[FAILURE_CANCELLED],
+                phases=phases,
+                attempts=0,
+                failure=FAILURE_CANCELLED,
+            )
+
+    def _run_task_steps(
+        self,
+        task: InstallTask,
+        on_progress: Optional[Callable[[InstallProgress], None]],
+        started: float,
+        phases: Dict[str, float],
+    ) -> DeviceInstallResult:
+        check_cancelled()
+        check_version = not task.force and task.metadata is not None
+        if self._probe_devices or check_version:
+            with self._slots:
+                rejection = self._check_device(task)
+                installed = None
+                if rejection is None and check_version:
+                    installed = query_installed_version(task.device_id, task.platform, task.metadata.package_name)
+            phases["precheck"] = time.monotonic() - started
+            if rejection is not None:
+                failure, error = rejection
+                # 预检即可确定无法安装，不再传输安装包
+                return DeviceInstallResult(
+                    task=task,
+                    success=False,
+                    duration=time.monotonic() - started,
+                    error=error,
+                    phases=phases,
+                    attempts=0,
+                    failure=failure,
+                )
+            if check_version and is_same_build(task.metadata, installed):
+                return DeviceInstallResult(
+                    task=task,
+                    success=True,
+                    duration=time.monotonic() - started,
+                    skipped=True,
+                    phases=phases,
+                )
+        max_attempts = max(1, self._retry_policy.max_attempts)
+        remedies: List[str] = []
+        attempt = 0
+        while True:
+            check_cancelled()
+            attempt += 1
+            with self._slots:
+                result = self._install_once(task, on_progress, phases)
+            if result.success or attempt >= max_attempts:
+                break
+            remedy = self._remedy_for(task, result.failure)
+            if remedy is None:
+                break
+            # 退避等待不占用并发名额，其他设备可继续安装
+            delay = self._retry_policy.backoff(attempt) if remedy == REMEDY_RECONNECT else 0.0
+            if on_progress:
+                on_progress(
+                    InstallProgress(
+                        device_id=task.device_id,
+                        line=f"{FAILURE_LABELS[result.failure]}，{REMEDY_LABELS[remedy]}后重试"
+                        f"（{attempt + 1}/{max_attempts}）",
+                    )
+                )
+            if delay:
+                sleep_unless_cancelled(delay)
+            if not self._apply_remedy(task, remedy):
+                break
+            remedies.append(remedy)
+        result.duration = time.monotonic() - started
+        result.attempts = attempt
+        result.remedies = remedies
+        if result.success and self._probe_devices:
+            # 安装占用了存储空间，下次使用前重新探测
+            get_default_probe().invalidate(task.device_id)
+        return result
+
+    def _check_device(self, task: InstallTask) -> Optional[Tuple[str, str]]:
+        if not self._probe_devices:
+            return None
+        device = DeviceInfo(device_id=task.device_id, platform=task.platform, status="device")
+        properties = get_default_probe().probe([device]).get(task.device_id)
+        if properties is None or properties.error:
+            # 探测失败不阻止安装，由安装输出判断结果
+            return None
+        select_abi_artifacts(task, properties.abis)
+        package_abis = task.metadata.abis if task.metadata is not None else []
+        if not abis_compatible(package_abis, properties.abis):
+            return (
+                FAILURE_INCOMPATIBLE,
+                f"安装包 ABI {', '.join(package_abis)} 与设备 ABI {', '.join(properties.abis)} 不兼容",
+            )
+        if properties.free_storage is not None:
+            required = required_space([task.package_path] + task.split_paths)
+            if required > properties.free_storage:
+                return FAILURE_INSUFFICIENT_STORAGE, format_space_shortage(properties.free_storage, required)
+        return None
+
+    def _remedy_for(self, task: InstallTask, failure: str) -> Optional[str]:
+        if failure == FAILURE_TEST_ONLY and task.platform == "android" and not task.allow_test:
+            return REMEDY_ALLOW_TEST
+        if failure == FAILURE_TRANSPORT:
+            return REMEDY_RECONNECT
+        if (
+            failure == FAILURE_SIGNATURE_MISMATCH
+            and self._retry_policy.reinstall_on_signature_mismatch
+            and task.metadata is not None
+        ):
+            return REMEDY_REINSTALL
+        return None
+
+    def _apply_remedy(self, task: InstallTask, remedy: str) -> bool:
+        if remedy == REMEDY_ALLOW_TEST:
+            task.allow_test = True
+            return True
+        if remedy == REMEDY_RECONNECT:
+            # 重连失败也继续重试，设备可能已自行恢复
+            reconnect_device(task.device_id, task.platform)
+            return True
+        # 卸载会清除应用数据，只在显式开启时执行
+        return uninstall_package(task.device_id, task.platform, task.metadata.package_name)
+
+    def _install_once(
+        self,
+        task: InstallTask,
+        on_progress: Optional[Callable[[InstallProgress], None]],
+        phases: Dict[str, float],
+    ) -> DeviceInstallResult:
+        install_started = time.monotonic()
+        transfer_done: Optional[float] = None
+
+        def track_progress(progress: InstallProgress) -> None:
+            nonlocal transfer_done
+            # 进度到 100% 视为传输结束，之后的时间计入设备端安装
+            if progress.percent == 100 and transfer_done is None:
+                transfer_done = time.monotonic()
+            if on_progress:
+                on_progress(progress)
+
+        # 重试时只保留最后一次尝试的传输、安装与校验耗时
+        for phase in ("transfer", "verify"):
+            phases.pop(phase, None)
+        try:
+            if task.platform == "android":
+                install_result = install_android(
+                    task.device_id, task.package_path, task.allow_test, track_progress, task.split_paths
+                )
+            else:
+                install_result = install_harmony(task.device_id, task.package_path, track_progress, task.split_paths)
+        except OSError as exc:
+            phases["install"] = time.monotonic() - install_started
+            return DeviceInstallResult(
+                task=task,
+                success=False,
+                duration=0.0,
+                error=str(exc),
+                failure=classify_failure(task.platform, str(exc)),
+                phases=phases,
+            )
+        install_finished = time.monotonic()
+        if transfer_done is not None:
+            phases["transfer"] = transfer_done - install_started
+            phases["install"] = install_finished - transfer_done
+        else:
+            # 输出中没有进度信息时无法区分传输与安装，整体计入安装
+            phases["install"] = install_finished - install_started
+        process = install_result.process
+        success = _install_succeeded(task.platform, process)
+        verified: Optional[bool] = None
+        if success and self._verify and task.metadata is not None:
+            installed = query_installed_version(task.device_id, task.platform, task.metadata.package_name)
+            # 查询超时或失败时版本未知，不判定为不一致
+            verified = None if installed is None else is_same_build(task.metadata, installed)
+            phases["verify"] = time.monotonic() - install_finished
+        return DeviceInstallResult(
+            task=task,
+            success=success,
+            duration=0.0,
+            install_result=install_result,
+            verified=verified,
+            failure="" if success else classify_failure(task.platform, f"{process.stdout}\n{process.stderr}"),
+            phases=phases,
+        )
@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from services.package_integrity import IntegrityResult, verify_package
+from services.package_metadata import PackageMetadata, read_package_metadata
+
+
+INDEX_FILE_NAME = "package_index.json"
+INDEX_FORMAT_VERSION = 2
+MAX_ENTRIES = 5000
+
+
+def default_index_path(config_path: Path) -> Path:
+    return config_path.parent / INDEX_FILE_NAME
+
+
+class PackageIndex:
+    def __init__(self, cache_path: Optional[Path] = None, max_entries: int = MAX_ENTRIES) -> None:
+        self._cache_path = cache_path
+        self._max_entries = max_entries
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # 已解码的元数据对象，重复扫描时直接按 (size, mtime_ns) 命中
+        self._decoded: Dict[str, Tuple[int, int, Optional[PackageMetadata]]] = {}
+        self._integrity: Dict[str, Tuple[int, int, IntegrityResult]] = {}
+        # 同一安装包同时只由一个线程校验，其他线程等待后直接读取结果
+        self._verify_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        if cache_path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with self._cache_path.open("r", encoding="utf-8") as file:
+                loaded = json.load(file)
+        except (OSError, ValueError):
+            return
+        if not isinstance(loaded, dict) or loaded.get("version") != INDEX_FORMAT_VERSION:
+            return
+        entries = loaded.get("entries")
+        if isinstance(entries, dict):
+            self._entries = entries
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        key = str(path)
+        if not os.path.isabs(key):
+            key = os.path.abspath(key)
+        return key
+
+    def _entry_locked(self, key: str, size: int, mtime_ns: int) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if not entry or entry.get("size") != size or entry.get("mtime_ns") != mtime_ns:
+            entry = {"size": size, "mtime_ns": mtime_ns}
+            self._entries[key] = entry
+        entry["indexed_at"] = time.time()
+        self._dirty = True
+        return entry
+
+    def lookup(self, path: Path, size: int, mtime_ns: int) -> Optional[PackageMetadata]:
+        key = self._key(path)
+        with self._lock:
+            decoded = self._decoded.get(key)
+            if decoded is not None and decoded[0] == size and decoded[1] == mtime_ns:
+                return decoded[2]
+            entry = self._entries.get(key)
+            if entry and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns and "metadata" in entry:
+                stored = entry.get("metadata")
+                metadata = PackageMetadata(**stored) if stored else None
+                self._decoded[key] = (size, mtime_ns, metadata)
+                return metadata
+        # 大小或 mtime 变化才重新打开压缩包，只读取清单文件与中央目录
+        metadata = read_package_metadata(path)
+        with self._lock:
+            self._entry_locked(key, size, mtime_ns)["metadata"] = asdict(metadata) if metadata else None
+            self._decoded[key] = (size, mtime_ns, metadata)
+            self._evict_locked()
+        return metadata
+
+    def _cached_integrity_locked(self, key: str, size: int, mtime_ns: int) -> Optional[IntegrityResult]:
+        cached = self._integrity.get(key)
+        if cached is not None and cached[0] == size and cached[1] == mtime_ns:
+            return cached[2]
+        entry = self._entries.get(key)
+        if entry and entry.get("size") == size and entry.get("mtime_ns") == mtime_ns and entry.get("integrity"):
+            result = IntegrityResult(**entry["integrity"])
+            self._integrity[key] = (size, mtime_ns, result)
+            return result
+        return None
+
+    def integrity_for(self, path: Path) -> IntegrityResult:
+        try:
+            stat_result = os.stat(path)
+        except OSError as exc:
+            return IntegrityResult(ok=False, error=f"无法读取: {exc}")
+        size, mtime_ns = stat_result.st_size, stat_result.st_mtime_ns
+        key = self._key(path)
+        with self._lock:
+            cached = self._cached_integrity_locked(key, size, mtime_ns)
+            if cached is not None:
+                return cached
+            verify_lock = self._verify_locks.setdefault(key, threading.Lock())
+        with verify_lock:
+            with self._lock:
+                cached = self._cached_integrity_locked(key, size, mtime_ns)
+            if cached is not None:
+                return cached
+            # 完整读取并解压校验整个安装包，按 (路径, 大小, mtime) 缓存，文件不变时不再重复读取
+            result = verify_package(path)
+            try:
+                current = os.stat(path)
+                changed = (current.st_size, current.st_mtime_ns) != (size, mtime_ns)
+            except OSError:
+                changed = True
+            with self._lock:
+                self._verify_locks.pop(key, None)
+                if changed:
+                    # 校验期间文件仍在写入，结果不可信也不缓存
+                    return IntegrityResult(ok=False, sha256=result.sha256, error="校验期间文件发生变化，可能仍在复制")
+                self._entry_locked(key, size, mtime_ns)["integrity"] = asdict(result)
+                self._integrity[key] = (size, mtime_ns, result)
+                self._evict_locked()
+        return result
+
+    def metadata_for(self, path: Path) -> Optional[PackageMetadata]:
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        return self.lookup(path, stat_result.st_size, stat_result.st_mtime_ns)
+
+    def _evict_locked(self) -> None:
+        excess = len(self._entries) - self._max_entries
+        if excess <= 0:
+            return
+        oldest = sorted(self._entries, key=lambda key: self._entries[key].get("indexed_at", 0))[:excess]
+        for key in oldest:
+            del self._entries[key]
+            self._decoded.pop(key, None)
+            self._integrity.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._decoded.clear()
+            self._integrity.clear()
+            self._dirty = True
+
+    def flush(self) -> None:
+        if self._cache_path is None:
+            return
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                content = json.dumps({"version": INDEX_FORMAT_VERSION, "entries": self._entries}, ensure_ascii=False)
+                self._dirty = False
+            try:
+                self._write_atomic(content)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+
+    def _write_atomic(self, content: str) -> None:
+        self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=self._cache_path.parent, prefix=f"{self._cache_path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(temp_path, self._cache_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+_default_index = PackageIndex()
+_default_index_lock = threading.Lock()
+
+
+def get_default_index() -> PackageIndex:
+    with _default_index_lock:
+        return _default_index
+
+
+def configure_default_index(cache_path: Optional[Path]) -> None:
+    global _default_index
+    with _default_index_lock:
+        _default_index = PackageIndex(cache_path)
@@ -0,0 +1,68 @@
+import hashlib
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class IntegrityResult:
+    ok: bool
+    sha256: str = ""
+    error: str = ""
+    members: int = 0
+
+
+def _describe_zip_error(exc: Exception) -> str:
+    message = str(exc)
+    if message.startswith("Bad CRC-32"):
+        return message.replace("Bad CRC-32 for file", "CRC 校验失败:")
+    if "not a zip file" in message:
+        return "缺少 zip 结尾目录，文件可能未完整复制"
+    if "Truncated" in message or "Bad magic number" in message:
+        return f"zip 结构不完整: {message}"
+    return message
+
+
+def verify_package(path: Path) -> IntegrityResult:
+    # 两次顺序分块读取：先计算整个文件的 sha256，再逐个成员解压校验 CRC，内存占用与文件大小无关
+    digest = hashlib.sha256()
+    try:
+        with path.open("rb") as file:
+            for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError as exc:
+        return IntegrityResult(ok=False, error=f"无法读取: {exc}")
+    sha256 = digest.hexdigest()
+    members = 0
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                try:
+                    # zipfile 在读到成员末尾时比对 CRC-32，不一致时抛出 BadZipFile
+                    with archive.open(info) as member:
+                        while member.read(READ_CHUNK_SIZE):
+                            pass
+                except EOFError:
+                    return IntegrityResult(ok=False, sha256=sha256, error=f"成员数据不完整: {info.filename}")
+                except zlib.error:
+                    return IntegrityResult(ok=False, sha256=sha256, error=f"成员解压失败: {info.filename}")
+                except (NotImplementedError, RuntimeError) as exc:
+                    return IntegrityResult(ok=False, sha256=sha256, error=f"成员无法读取: {info.filename} ({exc})")
+                members += 1
+    except zipfile.BadZipFile as exc:
+        return IntegrityResult(ok=False, sha256=sha256, error=_describe_zip_error(exc))
+    except OSError as exc:
+        return IntegrityResult(ok=False, sha256=sha256, error=f"无法读取: {exc}")
+    if members == 0:
+        return IntegrityResult(ok=False, sha256=sha256, error="安装包中没有文件")
+    return IntegrityResult(ok=True, sha256=sha256, members=members)
+
+
+def format_integrity_error(path: Path, result: IntegrityResult) -> str:
+    return f"安装包校验失败 {path.name}: {result.error}"
@@ -0,0 +1,227 @@
+import json
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+_CHUNK_STRING_POOL = 0x0001
+_CHUNK_XML = 0x0003
+_CHUNK_RESOURCE_MAP = 0x0180
+_CHUNK_START_ELEMENT = 0x0102
+
+_UTF8_FLAG = 1 << 8
+_NO_INDEX = 0xFFFFFFFF
+
+_TYPE_STRING = 0x03
+_TYPE_INT_DEC = 0x10
+_TYPE_INT_HEX = 0x11
+
+_ATTR_VERSION_CODE = 0x0101021B
+_ATTR_VERSION_NAME = 0x0101021C
+
+
+@dataclass
+class PackageMetadata:
+    package_name: str
+    version_code: Optional[int]
+    version_name: str
+    abis: List[str] = field(default_factory=list)
+    # APK 的 split 名称或 HAP 的 feature 模块名；base APK 与 entry HAP 为空
+    split: str = ""
+
+
+def _read_string_pool(data: bytes, offset: int) -> List[str]:
+    string_count, _style_count, flags, strings_start = struct.unpack_from("<IIII", data, offset + 8)
+    is_utf8 = bool(flags & _UTF8_FLAG)
+    offsets = struct.unpack_from(f"<{string_count}I", data, offset + 28)
+    base = offset + strings_start
+    strings: List[str] = []
+    for string_offset in offsets:
+        position = base + string_offset
+        if is_utf8:
+            # UTF-8 字符串前有 UTF-16 长度与 UTF-8 字节长度两个变长字段
+            position += 2 if data[position] & 0x80 else 1
+            length = data[position]
+            if length & 0x80:
+                length = ((length & 0x7F) << 8) | data[position + 1]
+                position += 2
+            else:
+                position += 1
+            strings.append(data[position:position + length].decode("utf-8", errors="replace"))
+        else:
+            length = struct.unpack_from("<H", data, position)[0]
+            if length & 0x8000:
+                length = ((length & 0x7FFF) << 16) | struct.unpack_from("<H", data, position + 2)[0]
+                position += 4
+            else:
+                position += 2
+            strings.append(data[position:position + length * 2].decode("utf-16-le", errors="replace"))
+    return strings
+
+
+def _read_manifest_attributes(data: bytes) -> Dict[str, str]:
+    if len(data) < 8 or struct.unpack_from("<H", data, 0)[0] != _CHUNK_XML:
+        return {}
+    strings: List[str] = []
+    resource_ids: List[int] = []
+    offset = struct.unpack_from("<H", data, 2)[0]
+    while offset + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, offset)
+        if chunk_size <= 0:
+            break
+        if chunk_type == _CHUNK_STRING_POOL:
+            strings = _read_string_pool(data, offset)
+        elif chunk_type == _CHUNK_RESOURCE_MAP:
+            count = (chunk_size - header_size) // 4
+            resource_ids = list(struct.unpack_from(f"<{count}I", data, offset + header_size))
+        elif chunk_type == _CHUNK_START_ELEMENT:
+            name_index = struct.unpack_from("<I", data, offset + 20)[0]
+            if name_index < len(strings) and strings[name_index] == "manifest":
+                return _read_element_attributes(data, offset, header_size, strings, resource_ids)
+        offset += chunk_size
+    return {}
+
+
+def _read_element_attributes(
+    data: bytes,
+    offset: int,
+    header_size: int,
+    strings: List[str],
+    resource_ids: List[int],
+) -> Dict[str, str]:
+    attribute_start, attribute_size, attribute_count = struct.unpack_from("<HHH", data, offset + header_size + 8)
+    attributes: Dict[str, str] = {}
+    position = offset + header_size + attribute_start
+    for _ in range(attribute_count):
+        _ns, name_index, raw_index = struct.unpack_from("<III", data, position)
+        data_type = data[position + 15]
+        value = struct.unpack_from("<I", data, position + 16)[0]
+        position += attribute_size
+        # 混淆过的清单可能抹掉属性名，此时依赖资源 ID 识别 versionCode/versionName
+        resource_id = resource_ids[name_index] if name_index < len(resource_ids) else 0
+        if resource_id == _ATTR_VERSION_CODE:
+            name = "versionCode"
+        elif resource_id == _ATTR_VERSION_NAME:
+            name = "versionName"
+        else:
+            name = strings[name_index] if name_index < len(strings) else ""
+        if not name:
+            continue
+        if raw_index != _NO_INDEX and raw_index < len(strings):
+            attributes[name] = strings[raw_index]
+        elif data_type == _TYPE_STRING and value < len(strings):
+            attributes[name] = strings[value]
+        elif data_type in (_TYPE_INT_DEC, _TYPE_INT_HEX):
+            attributes[name] = str(value)
+    return attributes
+
+
+# 截断、压缩数据损坏或使用不支持的压缩方式时 zipfile 抛出的异常，均视为无法读取元数据
+_ARCHIVE_ERRORS = (
+    OSError,
+    KeyError,
+    EOFError,
+    RuntimeError,
+    NotImplementedError,
+    ValueError,
+    zlib.error,
+    zipfile.BadZipFile,
+)
+
+
+def _parse_version_code(value: object) -> Optional[int]:
+    try:
+        return int(str(value))
+    except ValueError:
+        return None
+
+
+def _native_abis(names: Iterable[str], prefix: str) -> List[str]:
+    # 只看中央目录中的条目名，例如 lib/arm64-v8a/libfoo.so，不解压原生库
+    abis = set()
+    for name in names:
+        if name.startswith(prefix) and name.endswith(".so"):
+            parts = name.split("/")
+            if len(parts) >= 3 and parts[1]:
+                abis.add(parts[1])
+    return sorted(abis)
+
+
+def read_apk_metadata(apk_path: Path) -> Optional[PackageMetadata]:
+    try:
+        with zipfile.ZipFile(apk_path) as archive:
+            manifest = archive.read("AndroidManifest.xml")
+            abis = _native_abis(archive.namelist(), "lib/")
+    except _ARCHIVE_ERRORS:
+        return None
+    try:
+        attributes = _read_manifest_attributes(manifest)
+    except (struct.error, IndexError, ValueError):
+        return None
+    package_name = attributes.get("package", "")
+    if not package_name:
+        return None
+    return PackageMetadata(
+        package_name=package_name,
+        version_code=_parse_version_code(attributes.get("versionCode", "")),
+        version_name=attributes.get("versionName", ""),
+        abis=abis,
+        split=attributes.get("split", ""),
+    )
+
+
+def _hap_feature_name(module: Dict[str, object]) -> str:
+    # Stage 模型为 module.type/name，FA 模型为 module.distro.moduleType/moduleName
+    distro = module.get("distro") if isinstance(module.get("distro"), dict) else {}
+    module_type = module.get("type") or distro.get("moduleType") or "entry"
+    if module_type == "entry":
+        return ""
+    return str(module.get("name") or distro.get("moduleName") or "")
+
+
+def read_hap_metadata(hap_path: Path) -> Optional[PackageMetadata]:
+    try:
+        with zipfile.ZipFile(hap_path) as archive:
+            names = archive.namelist()
+            # Stage 模型使用 module.json，FA 模型使用 config.json
+            member = "module.json" if "module.json" in names else "config.json"
+            config = json.loads(archive.read(member).decode("utf-8"))
+            abis = _native_abis(names, "libs/")
+    except _ARCHIVE_ERRORS:
+        return None
+    try:
+        return _hap_metadata_from_config(config, abis)
+    except (AttributeError, TypeError):
+        # app/module 等字段不是预期的对象类型
+        return None
+
+
+def _hap_metadata_from_config(config: Dict[str, object], abis: List[str]) -> Optional[PackageMetadata]:
+    app = config.get("app", {})
+    module = config.get("module", {})
+    package_name = app.get("bundleName", "")
+    if not package_name:
+        return None
+    if "versionCode" in app:
+        version_code = app.get("versionCode")
+        version_name = app.get("versionName", "")
+    else:
+        version = app.get("version", {})
+        version_code = version.get("code")
+        version_name = version.get("name", "")
+    return PackageMetadata(
+        package_name=package_name,
+        version_code=_parse_version_code(version_code),
+        version_name=str(version_name),
+        abis=abis,
+        split=_hap_feature_name(module),
+    )
+
+
+def read_package_metadata(package_path: Path) -> Optional[PackageMetadata]:
+    if package_path.suffix.lower() == ".apk":
+        return read_apk_metadata(package_path)
+    return read_hap_metadata(package_path)
@@ -1,28 +1,240 @@
-from dataclasses import dataclass
+import os
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from services.package_index import PackageIndex, get_default_index
+from services.package_metadata import PackageMetadata
+
+
+PACKAGE_SUFFIXES = (".apk", ".hap")
+DEFAULT_MAX_DEPTH = 3
+# 目录 mtime 精度有限（SMB/FAT 可达 2 秒），索引时间过近时不信任缓存
+_MTIME_RACY_WINDOW = 2.0
 
 
 @dataclass
 class PackageInfo:
     apk_path: Optional[Path]
     hap_path: Optional[Path]
+    # 每个包名各自的最新构建，第一个为最近修改的一个（即 apk_path/hap_path）
+    apk_paths: List[Path] = field(default_factory=list)
+    hap_paths: List[Path] = field(default_factory=list)
+    # 分包安装集合：base APK / entry HAP -> 同一版本的 split APK / feature HAP
+    split_paths: Dict[Path, List[Path]] = field(default_factory=dict)
+    # 同一版本按 ABI 拆分的其他 base APK / entry HAP，安装时按设备 ABI 选择
+    abi_variants: Dict[Path, List[Path]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        if not self.apk_paths and self.apk_path is not None:
+            self.apk_paths = [self.apk_path]
+        if not self.hap_paths and self.hap_path is not None:
+            self.hap_paths = [self.hap_path]
+
+
+@dataclass
+class IndexedFile:
+    path: Path
+    suffix: str
+    mtime: float
+    size: int = 0
+    mtime_ns: int = 0
+    # 元数据随索引缓存，文件大小或 mtime 变化时随新条目重新读取
+    metadata: Optional[PackageMetadata] = None
+    metadata_loaded: bool = False
+
+
+@dataclass
+class _DirectoryIndex:
+    mtime_ns: int
+    indexed_at: float
+    files: List[IndexedFile]
+    subdirs: List[Path]
+
+
+_index_cache: Dict[Path, _DirectoryIndex] = {}
+_index_lock = threading.Lock()
+
+
+def _is_cache_valid(cached: _DirectoryIndex, mtime_ns: int) -> bool:
+    if cached.mtime_ns != mtime_ns:
+        return False
+    return cached.indexed_at - mtime_ns / 1_000_000_000 > _MTIME_RACY_WINDOW
 
 
-def _latest_file(directory: Path, suffix: str) -> Optional[Path]:
-    candidates = [p for p in directory.glob(f"*{suffix}") if p.is_file()]
-    if not candidates:
+def _revalidate_files(cached: _DirectoryIndex) -> _DirectoryIndex:
+    # 原地覆盖不改变目录 mtime，目录缓存只复用文件列表，每个安装包重新 stat 校验大小与 mtime
+    files: List[IndexedFile] = []
+    changed = False
+    for file in cached.files:
+        try:
+            stat_result = os.stat(file.path)
+        except OSError:
+            changed = True
+            continue
+        if stat_result.st_size == file.size and stat_result.st_mtime_ns == file.mtime_ns:
+            files.append(file)
+            continue
+        changed = True
+        files.append(
+            IndexedFile(file.path, file.suffix, stat_result.st_mtime, stat_result.st_size, stat_result.st_mtime_ns)
+        )
+    if not changed:
+        return cached
+    return _DirectoryIndex(mtime_ns=cached.mtime_ns, indexed_at=cached.indexed_at, files=files, subdirs=cached.subdirs)
+
+
+def _index_directory(directory: Path) -> Optional[_DirectoryIndex]:
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
         return None
-    return max(candidates, key=lambda p: p.stat().st_mtime)
+    with _index_lock:
+        cached = _index_cache.get(directory)
+    if cached and _is_cache_valid(cached, mtime_ns):
+        index = _revalidate_files(cached)
+        if index is not cached:
+            with _index_lock:
+                _index_cache[directory] = index
+        return index
+    indexed_at = time.time()
+    files: List[IndexedFile] = []
+    subdirs: List[Path] = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(Path(entry.path))
+                        continue
+                    suffix = os.path.splitext(entry.name)[1].lower()
+                    if suffix not in PACKAGE_SUFFIXES or not entry.is_file():
+                        continue
+                    # Windows 下 DirEntry.stat() 直接复用目录枚举结果，无需额外系统调用
+                    stat_result = entry.stat()
+                    files.append(
+                        IndexedFile(
+                            Path(entry.path),
+                            suffix,
+                            stat_result.st_mtime,
+                            stat_result.st_size,
+                            stat_result.st_mtime_ns,
+                        )
+                    )
+                except OSError:
+                    continue
+    except OSError:
+        return None
+    index = _DirectoryIndex(mtime_ns=mtime_ns, indexed_at=indexed_at, files=files, subdirs=subdirs)
+    with _index_lock:
+        _index_cache[directory] = index
+    return index
+
+
+def iter_indexed_files(directory: Path, recursive: bool = False, max_depth: int = DEFAULT_MAX_DEPTH) -> List[IndexedFile]:
+    files: List[IndexedFile] = []
+    pending: List[Tuple[Path, int]] = [(directory, 0)]
+    while pending:
+        current, depth = pending.pop()
+        index = _index_directory(current)
+        if index is None:
+            continue
+        files.extend(index.files)
+        if recursive and depth < max_depth:
+            pending.extend((subdir, depth + 1) for subdir in index.subdirs)
+    return files
+
+
+def clear_index_cache() -> None:
+    with _index_lock:
+        _index_cache.clear()
+
+
+def _file_metadata(file: IndexedFile, index: PackageIndex) -> Optional[PackageMetadata]:
+    if not file.metadata_loaded:
+        file.metadata = index.lookup(file.path, file.size, file.mtime_ns)
+        file.metadata_loaded = True
+    return file.metadata
+
+
+def _latest_install_sets(
+    files: List[IndexedFile], index: PackageIndex
+) -> Tuple[List[List[IndexedFile]], Dict[Path, List[Path]]]:
+    unparsed: Dict[str, IndexedFile] = {}
+    versions: Dict[Tuple[str, str], Dict[int, Dict[Tuple[str, Tuple[str, ...]], IndexedFile]]] = {}
+    for file in files:
+        metadata = _file_metadata(file, index)
+        if metadata is None:
+            # 无法解析的安装包按后缀归为一组，退化为按修改时间选择
+            current = unparsed.get(file.suffix)
+            if current is None or file.mtime > current.mtime:
+                unparsed[file.suffix] = file
+            continue
+        version_code = metadata.version_code if metadata.version_code is not None else -1
+        pieces = versions.setdefault((file.suffix, metadata.package_name), {}).setdefault(version_code, {})
+        # 同一版本的同一分包存在多份拷贝时取最新的一份；base 按 ABI 区分，保留各 ABI 的构建
+        key = (metadata.split, () if metadata.split else tuple(sorted(metadata.abis)))
+        current = pieces.get(key)
+        if current is None or file.mtime > current.mtime:
+            pieces[key] = file
+    install_sets: List[List[IndexedFile]] = [[file] for file in unparsed.values()]
+    abi_variants: Dict[Path, List[Path]] = {}
+    for by_version in versions.values():
+        # 同一包名取 versionCode 最高的版本，复制或 touch 旧包不影响选择
+        pieces = by_version[max(by_version)]
+        bases = [file for (split, _abis), file in pieces.items() if not split]
+        if bases:
+            # 按 ABI 拆分的多个 base 中，不含 native 库或 ABI 最全的包作为默认安装包，其余留给安装时按设备 ABI 选择
+            bases.sort(key=lambda file: (bool(file.metadata.abis), -len(file.metadata.abis), -file.mtime))
+            base = bases[0]
+        else:
+            base = max(pieces.values(), key=lambda file: file.mtime)
+        if len(bases) > 1:
+            abi_variants[base.path] = [file.path for file in bases[1:]]
+        splits = [file for (split, _abis), file in sorted(pieces.items()) if split and file is not base]
+        install_sets.append([base] + splits)
+    return install_sets, abi_variants
+
+
+def find_latest_packages(directory: Path, recursive: bool = False, max_depth: int = DEFAULT_MAX_DEPTH) -> PackageInfo:
+    files = iter_indexed_files(directory, recursive, max_depth)
+    index = get_default_index()
+    install_sets, abi_variants = _latest_install_sets(files, index)
+    index.flush()
+    # 多个包名之间按主包修改时间排序，第一个为最近构建的应用
+    install_sets.sort(key=lambda pieces: pieces[0].mtime, reverse=True)
+    paths: Dict[str, List[Path]] = {suffix: [] for suffix in PACKAGE_SUFFIXES}
+    split_paths: Dict[Path, List[Path]] = {}
+    for pieces in install_sets:
+        paths[pieces[0].suffix].append(pieces[0].path)
+        if len(pieces) > 1:
+            split_paths[pieces[0].path] = [file.path for file in pieces[1:]]
+    apk_paths = paths[".apk"]
+    hap_paths = paths[".hap"]
+    return PackageInfo(
+        apk_path=apk_paths[0] if apk_paths else None,
+        hap_path=hap_paths[0] if hap_paths else None,
+        apk_paths=apk_paths,
+        hap_paths=hap_paths,
+        split_paths=split_paths,
+        abi_variants=abi_variants,
+    )
 
 
-def find_latest_packages(directory: Path) -> PackageInfo:
-    apk = _latest_file(directory, ".apk")
-    hap = _latest_file(directory, ".hap")
-    return PackageInfo(apk_path=apk, hap_path=hap)
+def _display_name(package_info: PackageInfo, path: Path) -> str:
+    notes: List[str] = []
+    split_count = len(package_info.split_paths.get(path, []))
+    if split_count:
+        notes.append(f"+{split_count} 分包")
+    variant_count = len(package_info.abi_variants.get(path, []))
+    if variant_count:
+        notes.append(f"+{variant_count} ABI")
+    return f"{path.name} ({', '.join(notes)})" if notes else path.name
 
 
 def package_display_info(package_info: PackageInfo) -> Tuple[str, str]:
-    apk_name = package_info.apk_path.name if package_info.apk_path else "未找到"
-    hap_name = package_info.hap_path.name if package_info.hap_path else "未找到"
+    apk_name = ", ".join(_display_name(package_info, path) for path in package_info.apk_paths) or "未找到"
+    hap_name = ", ".join(_display_name(package_info, path) for path in package_info.hap_paths) or "未找到"
     return apk_name, hap_name
@@ -0,0 +1,959 @@
+import contextvars
+import hashlib
+import hmac
+import http.client
+import json
+import math
+import os
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from services.async_runtime import (
+    LANE_INSTALL,
+    Operation,
+    OperationCancelled,
+    check_cancelled,
+    current_operation,
+    get_default_runtime,
+)
+from services.device_detector import (
+    DEFAULT_BACKEND_TIMEOUT,
+    BackendStatus,
+    DetectionReport,
+    DeviceInfo,
+    detect_devices_report,
+)
+from services.device_probe import DEFAULT_PROBE_TIMEOUT, DeviceProperties, get_default_probe
+from services.install_failures import (
+    FAILURE_CANCELLED,
+    FAILURE_INVALID_PACKAGE,
+    FAILURE_LABELS,
+    FAILURE_TRANSPORT,
+    RetryPolicy,
+)
+from services.installer import (
+    DeviceInstallResult,
+    InstallProgress,
+    InstallResult,
+    InstallScheduler,
+    InstallSummary,
+    InstallTask,
+    integrity_rejection,
+    select_abi_artifacts,
+    verify_task_artifacts,
+)
+from services.package_index import get_default_index
+
+
+DEFAULT_AGENT_PORT = 8765
+DEFAULT_REQUEST_TIMEOUT = 10.0
+# agent 列设备时先探测设备再读取属性，两步各有超时，请求需等两者都结束
+DEVICES_REQUEST_TIMEOUT = DEFAULT_BACKEND_TIMEOUT + DEFAULT_PROBE_TIMEOUT + DEFAULT_REQUEST_TIMEOUT
+# 协调端等待取消的轮询间隔
+CANCEL_POLL_INTERVAL = 0.2
+# 安装流中 agent 定期发送心跳，超过该时长没有任何输出视为连接中断
+STREAM_IDLE_TIMEOUT = 60.0
+HEARTBEAT_INTERVAL = 15.0
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DEFAULT_ARTIFACT_CACHE_LIMIT = 20
+AGENT_CACHE_DIR_NAME = "agent_artifacts"
+# 协调端设备码为 "<agent 地址>/<设备码>"，不同主机上的同名设备互不冲突
+REMOTE_DEVICE_SEPARATOR = "/"
+
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_ARTIFACT_SUFFIXES = (".apk", ".hap")
+
+
+class AgentError(Exception):
+    pass
+
+
+class AgentRequestError(AgentError):
+    # 请求内容格式错误，agent 返回 400
+    pass
+
+
+@dataclass
+class _InstallOptions:
+    batch: str
+    max_workers: int
+    retry_policy: Optional[RetryPolicy]
+    probe_devices: bool
+
+
+def _retry_policy_from_payload(payload: Any) -> Optional[RetryPolicy]:
+    if not payload:
+        return None
+    if not isinstance(payload, dict):
+        raise AgentRequestError("retry 必须是 JSON 对象")
+    # 只接受 RetryPolicy 已有的字段，数值与布尔类型逐项校验，避免构造时抛出 TypeError
+    defaults = {item.name: item.default for item in fields(RetryPolicy)}
+    for key, value in payload.items():
+        if key not in defaults:
+            raise AgentRequestError(f"未知的重试参数: {key}")
+        expected = type(defaults[key])
+        if expected is bool:
+            valid = isinstance(value, bool)
+        else:
+            valid = (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and (expected is float or isinstance(value, int))
+                and math.isfinite(value)
+                and value >= 0
+            )
+        if not valid:
+            raise AgentRequestError(f"重试参数 {key} 无效: {value!r}")
+    return RetryPolicy(**payload)
+
+
+def default_agent_cache_dir(config_path: Path) -> Path:
+    return config_path.parent / AGENT_CACHE_DIR_NAME
+
+
+def parse_agent_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.strip().rpartition(":")
+    if not host:
+        return address.strip(), DEFAULT_AGENT_PORT
+    try:
+        return host, int(port)
+    except ValueError as exc:
+        raise AgentError(f"agent 地址无效: {address}") from exc
+
+
+def split_remote_device_id(device_id: str) -> Tuple[str, str]:
+    agent, _, serial = device_id.partition(REMOTE_DEVICE_SEPARATOR)
+    return agent, serial
+
+
+def _properties_payload(properties: Optional[DeviceProperties]) -> Optional[Dict[str, Any]]:
+    if properties is None:
+        return None
+    payload = asdict(properties)
+    payload.pop("probed_at", None)
+    return payload
+
+
+def _result_payload(result: DeviceInstallResult) -> Dict[str, Any]:
+    task = result.task
+    # agent 端安装包路径为 <缓存目录>/<sha256>/<文件名>，按 sha256 回传给协调端
+    payload: Dict[str, Any] = {
+        "device_id": task.device_id,
+        "artifact": task.package_path.parent.name,
+        "splits": [path.parent.name for path in task.split_paths],
+        "allow_test": task.allow_test,
+        "success": result.success,
+        "skipped": result.skipped,
+        "duration": result.duration,
+        "verified": result.verified,
+        "phases": result.phases,
+        "attempts": result.attempts,
+        "failure": result.failure,
+        "remedies": result.remedies,
+        "error": result.error,
+    }
+    if result.install_result is not None:
+        payload["command"] = result.install_result.command
+        payload["returncode"] = result.install_result.process.returncode
+        payload["output"] = result.install_result.process.stdout
+    return payload
+
+
+class _AgentHandler(BaseHTTPRequestHandler):
+    server_version = "InstallAgent/1"
+    # 安装结果按行流式返回，以关闭连接表示结束
+    protocol_version = "HTTP/1.0"
+
+    @property
+    def agent(self) -> "InstallAgent":
+        return self.server.agent
+
+    def log_message(self, format: str, *args: Any) -> None:
+        self.agent.log(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if self.agent.check_token(self.headers.get("Authorization", "")):
+            return True
+        self._send_json(401, {"error": "token 无效"})
+        return False
+
+    def _read_json(self) -> Optional[Dict[str, Any]]:
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            payload = None
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "请求体不是 JSON 对象"})
+            return None
+        return payload
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        path = urlsplit(self.path).path
+        if path == "/devices":
+            self._send_json(200, self.agent.devices_payload())
+            return
+        if path.startswith("/artifacts/"):
+            artifact = self.agent.artifact_path(path[len("/artifacts/"):])
+            if artifact is None:
+                self._send_json(404, {"present": False})
+            else:
+                self._send_json(200, {"present": True, "name": artifact.name, "size": artifact.stat().st_size})
+            return
+        self._send_json(404, {"error": f"未知路径 {path}"})
+
+    def do_PUT(self) -> None:
+        if not self._authorized():
+            return
+        url = urlsplit(self.path)
+        if not url.path.startswith("/artifacts/"):
+            self._send_json(404, {"error": f"未知路径 {url.path}"})
+            return
+        sha256 = url.path[len("/artifacts/"):]
+        name = parse_qs(url.query).get("name", [""])[0]
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+            stored = self.agent.store_artifact(sha256, name, self.rfile, length)
+        except (ValueError, AgentError) as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        except OSError as exc:
+            self._send_json(500, {"error": str(exc)})
+            return
+        self._send_json(201, {"present": True, "name": stored.name})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        path = urlsplit(self.path).path
+        if path.startswith("/cancel/"):
+            self._send_json(200, {"cancelled": self.agent.cancel_batch(path[len("/cancel/"):])})
+            return
+        if path != "/install":
+            self._send_json(404, {"error": f"未知路径 {path}"})
+            return
+        request = self._read_json()
+        if request is None:
+            return
+        # 响应头发出前完成全部校验，事件流开始后不会再因请求内容出错
+        try:
+            options = self.agent.install_options(request)
+            tasks = self.agent.build_tasks(request.get("tasks") or [])
+        except AgentRequestError as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        except AgentError as exc:
+            self._send_json(409, {"error": str(exc)})
+            return
+        except OSError as exc:
+            self._send_json(500, {"error": f"安装包缓存不可用: {exc}"})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        try:
+            self.agent.run_install(tasks, options, self._write_event)
+        except OSError:
+            # 协调端断开时 agent 端安装继续完成，只是不再回传结果
+            pass
+
+    def _write_event(self, event: Dict[str, Any]) -> None:
+        self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _AgentServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], agent: "InstallAgent") -> None:
+        super().__init__(address, _AgentHandler)
+        self.agent = agent
+
+
+class InstallAgent:
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        cache_dir: Path,
+        token: str = "",
+        detect_timeout: float = DEFAULT_BACKEND_TIMEOUT,
+        platform_limits: Optional[Dict[str, int]] = None,
+        cache_limit: int = DEFAULT_ARTIFACT_CACHE_LIMIT,
+        on_log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._cache_dir = cache_dir
+        self._token = token
+        self._detect_timeout = detect_timeout
+        self._platform_limits = platform_limits
+        self._cache_limit = max(1, cache_limit)
+        self._on_log = on_log
+        self._cache_lock = threading.Lock()
+        # 协调端给每批安装分配的批次号 -> 正在执行或排队的安装操作，用于远程取消
+        self._batches: Dict[str, Operation] = {}
+        self._batches_lock = threading.Lock()
+        self._server = _AgentServer(address, self)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def log(self, message: str) -> None:
+        if self._on_log:
+            self._on_log(message)
+
+    def check_token(self, authorization: str) -> bool:
+        if not self._token:
+            return True
+        scheme, _, value = authorization.partition(" ")
+        # 定长比较，避免按响应耗时逐字节猜出 token
+        presented = value.strip().encode("utf-8")
+        return scheme.lower() == "bearer" and hmac.compare_digest(presented, self._token.encode("utf-8"))
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name="install-agent", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def devices_payload(self) -> Dict[str, Any]:
+        report = detect_devices_report(self._detect_timeout)
+        properties = get_default_probe().probe(report.devices)
+        return {
+            "devices": [
+                {
+                    "device_id": device.device_id,
+                    "platform": device.platform,
+                    "status": device.status,
+                    "details": device.details,
+                    "properties": _properties_payload(properties.get(device.device_id)),
+                }
+                for device in report.devices
+            ],
+            "backends": [asdict(status) for status in report.backends],
+        }
+
+    def artifact_path(self, sha256: str) -> Optional[Path]:
+        if not _SHA256_PATTERN.match(sha256):
+            return None
+        directory = self._cache_dir / sha256
+        try:
+            files = [entry for entry in directory.iterdir() if entry.is_file()]
+        except OSError:
+            return None
+        return files[0] if files else None
+
+    def store_artifact(self, sha256: str, name: str, stream: Any, length: int) -> Path:
+        name = Path(name).name
+        if not _SHA256_PATTERN.match(sha256):
+            raise AgentError("sha256 无效")
+        if not name.lower().endswith(_ARTIFACT_SUFFIXES):
+            raise AgentError(f"只接受 apk/hap 文件: {name}")
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self._cache_dir, prefix=".upload.", suffix=".tmp")
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as file:
+                remaining = length
+                while remaining > 0:
+                    chunk = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise AgentError("上传中断")
+                    digest.update(chunk)
+                    file.write(chunk)
+                    remaining -= len(chunk)
+            if digest.hexdigest() != sha256:
+                raise AgentError("上传内容与 sha256 不一致")
+            target = self._cache_dir / sha256 / name
+            target.parent.mkdir(exist_ok=True)
+            os.replace(temp_path, target)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._prune_cache()
+        return target
+
+    def cancel_batch(self, batch: str) -> bool:
+        with self._batches_lock:
+            operation = self._batches.get(batch)
+        if operation is None:
+            return False
+        self.log(f"协调端取消安装批次 {batch}")
+        return operation.cancel()
+
+    def _prune_cache(self) -> None:
+        # 按最近使用时间保留最近的若干个安装包
+        with self._cache_lock:
+            try:
+                directories = [entry for entry in self._cache_dir.iterdir() if _SHA256_PATTERN.match(entry.name)]
+            except OSError:
+                return
+            directories.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+            for directory in directories[self._cache_limit:]:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _resolve(self, sha256: str, missing: List[str]) -> Path:
+        path = self.artifact_path(sha256)
+        if path is None:
+            missing.append(sha256)
+            return Path(sha256)
+        # 刷新目录 mtime，作为缓存淘汰的最近使用时间
+        os.utime(path.parent)
+        return path
+
+    def build_tasks(self, items: List[Dict[str, Any]]) -> List[InstallTask]:
+        missing: List[str] = []
+        tasks: List[InstallTask] = []
+        try:
+            for item in items:
+                tasks.append(self._build_task(item, missing))
+        except (KeyError, TypeError, AttributeError) as exc:
+            raise AgentRequestError(f"安装任务格式错误: {exc}") from exc
+        if missing:
+            raise AgentError(f"缺少安装包: {', '.join(sorted(set(missing)))}")
+        return tasks
+
+    def _build_task(self, item: Dict[str, Any], missing: List[str]) -> InstallTask:
+        splits = item.get("splits", [])
+        abi_variants = item.get("abi_variants", [])
+        if not isinstance(splits, list) or not isinstance(abi_variants, list):
+            raise TypeError("splits 与 abi_variants 必须是数组")
+        return InstallTask(
+            device_id=str(item["device_id"]),
+            platform=str(item["platform"]),
+            package_path=self._resolve(item["artifact"], missing),
+            allow_test=bool(item.get("allow_test")),
+            force=bool(item.get("force")),
+            split_paths=[self._resolve(sha256, missing) for sha256 in splits],
+            abi_variants=[self._resolve(sha256, missing) for sha256 in abi_variants],
+        )
+
+    def install_options(self, request: Dict[str, Any]) -> _InstallOptions:
+        max_workers = request.get("max_workers") or 4
+        if not isinstance(max_workers, int) or isinstance(max_workers, bool) or max_workers < 1:
+            raise AgentRequestError(f"max_workers 无效: {max_workers!r}")
+        probe_devices = request.get("probe_devices", True)
+        if not isinstance(probe_devices, bool):
+            raise AgentRequestError(f"probe_devices 无效: {probe_devices!r}")
+        batch = request.get("batch") or ""
+        if not isinstance(batch, str):
+            raise AgentRequestError(f"batch 无效: {batch!r}")
+        return _InstallOptions(
+            batch=batch,
+            max_workers=max_workers,
+            retry_policy=_retry_policy_from_payload(request.get("retry")),
+            probe_devices=probe_devices,
+        )
+
+    def run_install(
+        self,
+        tasks: List[InstallTask],
+        options: _InstallOptions,
+        emit: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        scheduler = InstallScheduler(
+            max_workers=options.max_workers,
+            platform_limits=self._platform_limits,
+            retry_policy=options.retry_policy,
+            probe_devices=options.probe_devices,
+            # 协调端上传前已校验安装包，接收时又比对了 sha256，这里不再重复读取
+            check_integrity=False,
+        )
+        events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+        def on_progress(progress: InstallProgress) -> None:
+            events.put({"type": "progress", **asdict(progress)})
+
+        def on_result(result: DeviceInstallResult) -> None:
+            events.put({"type": "result", **_result_payload(result)})
+
+        def worker() -> None:
+            summary = scheduler.run(tasks, on_result=on_result, on_progress=on_progress)
+            events.put({"type": "summary", "elapsed": summary.elapsed})
+
+        batch = options.batch
+
+        def finish(operation: Operation) -> None:
+            with self._batches_lock:
+                if self._batches.get(batch) is operation:
+                    del self._batches[batch]
+            error = operation.exception()
+            if error is not None and not isinstance(error, OperationCancelled):
+                self.log(f"安装异常退出: {error}")
+            events.put(None)
+
+        # 安装通道同时只运行一批任务，多个协调端的请求依次执行，避免同一设备并发安装
+        operation = get_default_runtime().submit(LANE_INSTALL, worker, name="agent-install", on_done=finish)
+        if batch:
+            with self._batches_lock:
+                if not operation.done:
+                    self._batches[batch] = operation
+        while True:
+            try:
+                event = events.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                emit({"type": "heartbeat"})
+                continue
+            if event is None:
+                return
+            emit(event)
+
+
+class AgentClient:
+    def __init__(self, address: str, token: str = "", timeout: float = DEFAULT_REQUEST_TIMEOUT) -> None:
+        self.name = address.strip()
+        self._host, self._port = parse_agent_address(address)
+        self._token = token
+        self._timeout = timeout
+
+    def _headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = dict(extra or {})
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+        return headers
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        connection = http.client.HTTPConnection(self._host, self._port, timeout=timeout or self._timeout)
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            connection.request(method, path, body=body, headers=self._headers({"Content-Type": "application/json"}))
+            response = connection.getresponse()
+            data = response.read()
+        except OSError as exc:
+            raise AgentError(f"{self.name}: {exc}") from exc
+        finally:
+            connection.close()
+        try:
+            return response.status, json.loads(data.decode("utf-8")) if data else {}
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise AgentError(f"{self.name}: 响应不是 JSON") from exc
+
+    def devices(self) -> Dict[str, Any]:
+        status, payload = self._request("GET", "/devices", timeout=max(self._timeout, DEVICES_REQUEST_TIMEOUT))
+        if status != 200:
+            raise AgentError(f"{self.name}: {payload.get('error', status)}")
+        return payload
+
+    def has_artifact(self, sha256: str) -> bool:
+        status, _payload = self._request("GET", f"/artifacts/{sha256}")
+        return status == 200
+
+    def upload(self, path: Path, sha256: str) -> None:
+        size = path.stat().st_size
+        connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+        try:
+            connection.putrequest("PUT", f"/artifacts/{sha256}?name={quote(path.name)}")
+            for key, value in self._headers(
+                {"Content-Type": "application/octet-stream", "Content-Length": str(size)}
+            ).items():
+                connection.putheader(key, value)
+            connection.endheaders()
+            with path.open("rb") as file:
+                for chunk in iter(lambda: file.read(UPLOAD_CHUNK_SIZE), b""):
+                    connection.send(chunk)
+            response = connection.getresponse()
+            data = response.read()
+        except OSError as exc:
+            raise AgentError(f"{self.name}: 上传 {path.name} 失败: {exc}") from exc
+        finally:
+            connection.close()
+        if response.status != 201:
+            raise AgentError(f"{self.name}: 上传 {path.name} 失败: {data.decode('utf-8', errors='replace')}")
+
+    def cancel(self, batch: str) -> bool:
+        status, payload = self._request("POST", f"/cancel/{quote(batch)}")
+        return status == 200 and bool(payload.get("cancelled"))
+
+    def install(self, request: Dict[str, Any], on_event: Callable[[Dict[str, Any]], None]) -> None:
+        # 安装耗时不定，agent 以心跳保持连接，只对空闲时长设超时
+        connection = http.client.HTTPConnection(self._host, self._port, timeout=STREAM_IDLE_TIMEOUT)
+        try:
+            connection.request(
+                "POST",
+                "/install",
+                body=json.dumps(request).encode("utf-8"),
+                headers=self._headers({"Content-Type": "application/json"}),
+            )
+            response = connection.getresponse()
+            if response.status != 200:
+                raise AgentError(f"{self.name}: {response.read().decode('utf-8', errors='replace')}")
+            for line in response:
+                line = line.strip()
+                if line:
+                    on_event(json.loads(line.decode("utf-8")))
+        except (OSError, ValueError) as exc:
+            raise AgentError(f"{self.name}: 安装连接中断: {exc}") from exc
+        finally:
+            connection.close()
+
+
+class RemoteCoordinator:
+    def __init__(self, agents: Sequence[AgentClient]) -> None:
+        self._agents = {agent.name: agent for agent in agents}
+        self._lock = threading.Lock()
+        self._devices: Dict[str, List[DeviceInfo]] = {}
+        self._properties: Dict[str, DeviceProperties] = {}
+
+    @property
+    def agents(self) -> List[str]:
+        return list(self._agents)
+
+    def owns(self, device_id: str) -> bool:
+        return split_remote_device_id(device_id)[0] in self._agents
+
+    def properties(self, device_id: str) -> Optional[DeviceProperties]:
+        with self._lock:
+            return self._properties.get(device_id)
+
+    def _fetch(self, agent: AgentClient) -> Tuple[List[DeviceInfo], BackendStatus]:
+        started = time.monotonic()
+        try:
+            payload = agent.devices()
+        except AgentError as exc:
+            return [], BackendStatus(platform=f"agent {agent.name}", latency=time.monotonic() - started, error=str(exc))
+        devices: List[DeviceInfo] = []
+        properties: Dict[str, DeviceProperties] = {}
+        for item in payload.get("devices", []):
+            device_id = f"{agent.name}{REMOTE_DEVICE_SEPARATOR}{item['device_id']}"
+            details = dict(item.get("details") or {})
+            details.update({"agent": agent.name, "serial": item["device_id"]})
+            devices.append(DeviceInfo(device_id=device_id, platform=item["platform"], status=item["status"], details=details))
+            if item.get("properties"):
+                properties[device_id] = DeviceProperties(**{**item["properties"], "device_id": device_id})
+        with self._lock:
+            self._properties.update(properties)
+        return devices, BackendStatus(platform=f"agent {agent.name}", latency=time.monotonic() - started)
+
+    def detect(self) -> DetectionReport:
+        report = DetectionReport()
+        if not self._agents:
+            return report
+        with ThreadPoolExecutor(max_workers=len(self._agents), thread_name_prefix="agent-detect") as executor:
+            fetched = list(executor.map(self._fetch, self._agents.values()))
+        for agent, (devices, status) in zip(self._agents, fetched):
+            report.backends.append(status)
+            with self._lock:
+                if status.ok:
+                    self._devices[agent] = devices
+                # 暂时不可达的 agent 保留上次的设备表，避免误报设备断开
+                devices = self._devices.get(agent, [])
+            report.devices_by_platform[status.platform] = devices
+            report.devices.extend(devices)
+        return report
+
+    def run(
+        self,
+        tasks: List[InstallTask],
+        on_result: Optional[Callable[[DeviceInstallResult], None]] = None,
+        on_progress: Optional[Callable[[InstallProgress], None]] = None,
+        max_workers: int = 4,
+        retry_policy: Optional[RetryPolicy] = None,
+        probe_devices: bool = True,
+        check_integrity: bool = True,
+    ) -> InstallSummary:
+        started = time.monotonic()
+        tasks_by_agent: Dict[str, List[InstallTask]] = {}
+        for task in tasks:
+            tasks_by_agent.setdefault(split_remote_device_id(task.device_id)[0], []).append(task)
+            properties = self.properties(task.device_id)
+            if probe_devices and properties is not None and properties.abis:
+                # agent 已上报设备 ABI 时在本地选好构建，只上传该设备需要的安装包
+                select_abi_artifacts(task, properties.abis)
+                task.abi_variants = []
+        results: List[DeviceInstallResult] = []
+        results_lock = threading.Lock()
+
+        def deliver(result: DeviceInstallResult) -> None:
+            with results_lock:
+                results.append(result)
+            if on_result:
+                on_result(result)
+
+        # 上传前在本地校验安装包，校验结果中的 sha256 同时作为 agent 缓存的内容地址
+        integrity = verify_task_artifacts(tasks, max_workers)
+        verify_seconds = time.monotonic() - started
+        hashes = {path: result.sha256 for path, result in integrity.items()}
+        for task in list(tasks):
+            error = integrity_rejection(task, integrity) if check_integrity else None
+            if error is None:
+                continue
+            tasks_by_agent[split_remote_device_id(task.device_id)[0]].remove(task)
+            deliver(
+                DeviceInstallResult(
+                    task=task,
+                    success=False,
+                    duration=verify_seconds,
+                    error=error,
+                    phases={"precheck": verify_seconds},
+                    attempts=0,
+                    failure=FAILURE_INVALID_PACKAGE,
+                )
+            )
+        tasks_by_agent = {agent_name: agent_tasks for agent_name, agent_tasks in tasks_by_agent.items() if agent_tasks}
+
+        def run_agent(agent_name: str) -> None:
+            agent_tasks = tasks_by_agent[agent_name]
+            self._run_agent(
+                agent_name, agent_tasks, hashes, deliver, on_progress, max_workers, retry_policy, probe_devices
+            )
+
+        # 各 agent 线程继承调用方的操作上下文，取消安装时停止上传与等待结果
+        with ThreadPoolExecutor(max_workers=max(1, len(tasks_by_agent)), thread_name_prefix="agent-install") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run_agent, name) for name in tasks_by_agent]
+            for future in futures:
+                future.result()
+        return InstallSummary(results=results, elapsed=time.monotonic() - started)
+
+    def _run_agent(
+        self,
+        agent_name: str,
+        tasks: List[InstallTask],
+        hashes: Dict[Path, str],
+        deliver: Callable[[DeviceInstallResult], None],
+        on_progress: Optional[Callable[[InstallProgress], None]],
+        max_workers: int,
+        retry_policy: Optional[RetryPolicy],
+        probe_devices: bool,
+    ) -> None:
+        started = time.monotonic()
+        agent = self._agents.get(agent_name)
+        pending = {split_remote_device_id(task.device_id)[1]: [] for task in tasks}
+        for task in tasks:
+            pending[split_remote_device_id(task.device_id)[1]].append(task)
+        paths_by_hash = {sha256: path for path, sha256 in hashes.items()}
+
+        def fail_pending(error: str, failure: str = FAILURE_TRANSPORT) -> None:
+            for serial_tasks in pending.values():
+                for task in serial_tasks:
+                    deliver(
+                        DeviceInstallResult(
+                            task=task,
+                            success=False,
+                            duration=time.monotonic() - started,
+                            error=error,
+                            attempts=0 if failure == FAILURE_CANCELLED else 1,
+                            failure=failure,
+                        )
+                    )
+            pending.clear()
+
+        if agent is None:
+            fail_pending(f"未配置 agent {agent_name}")
+            return
+        batch = uuid.uuid4().hex
+        operation = current_operation()
+        installing_done = threading.Event()
+
+        def watch_cancel() -> None:
+            # 本地取消时通知 agent 停止该批安装；agent 回传剩余结果后结束安装流
+            while operation is not None and not installing_done.is_set():
+                if operation.wait_cancelled(CANCEL_POLL_INTERVAL):
+                    try:
+                        agent.cancel(batch)
+                    except AgentError:
+                        pass
+                    return
+
+        watcher = threading.Thread(target=watch_cancel, name=f"agent-cancel-{agent_name}", daemon=True)
+        try:
+            upload_started = time.monotonic()
+            needed = {hashes[path] for task in tasks for path in [task.package_path] + task.split_paths + task.abi_variants}
+            for sha256 in sorted(needed):
+                check_cancelled()
+                if agent.has_artifact(sha256):
+                    continue
+                path = paths_by_hash[sha256]
+                if on_progress:
+                    for device_id in {task.device_id for task in tasks}:
+                        on_progress(InstallProgress(device_id=device_id, line=f"上传 {path.name} 到 {agent_name}"))
+                agent.upload(path, sha256)
+            upload_seconds = time.monotonic() - upload_started
+            request = {
+                "tasks": [
+                    {
+                        "device_id": split_remote_device_id(task.device_id)[1],
+                        "platform": task.platform,
+                        "artifact": hashes[task.package_path],
+                        "splits": [hashes[path] for path in task.split_paths],
+                        "abi_variants": [hashes[path] for path in task.abi_variants],
+                        "allow_test": task.allow_test,
+                        "force": task.force,
+                    }
+                    for task in tasks
+                ],
+                "max_workers": max_workers,
+                "retry": asdict(retry_policy) if retry_policy else None,
+                "probe_devices": probe_devices,
+                "batch": batch,
+            }
+
+            def on_event(event: Dict[str, Any]) -> None:
+                # 取消后不再等待结果；已交给 agent 的安装由 agent 独立完成
+                check_cancelled()
+                device_id = f"{agent_name}{REMOTE_DEVICE_SEPARATOR}{event.get('device_id', '')}"
+                if event["type"] == "progress" and on_progress:
+                    on_progress(
+                        InstallProgress(
+                            device_id=device_id,
+                            line=event.get("line", ""),
+                            percent=event.get("percent"),
+                            speed=event.get("speed", ""),
+                        )
+                    )
+                elif event["type"] == "result":
+                    serial_tasks = pending.get(event["device_id"])
+                    if not serial_tasks:
+                        return
+                    task = next(
+                        (item for item in serial_tasks if hashes[item.package_path] == event["artifact"]),
+                        None,
+                    )
+                    # agent 按设备 ABI 换用了其他构建时，按 sha256 对应回本地文件
+                    if task is None:
+                        task = next(
+                            (item for item in serial_tasks if event["artifact"] in {hashes[path] for path in item.abi_variants}),
+                            serial_tasks[0],
+                        )
+                    serial_tasks.remove(task)
+                    if not serial_tasks:
+                        del pending[event["device_id"]]
+                    deliver(self._to_result(task, event, paths_by_hash, upload_seconds))
+
+            check_cancelled()
+            watcher.start()
+            agent.install(request, on_event)
+        except OperationCancelled:
+            fail_pending(FAILURE_LABELS[FAILURE_CANCELLED], FAILURE_CANCELLED)
+            return
+        except AgentError as exc:
+            fail_pending(str(exc))
+            return
+        finally:
+            installing_done.set()
+        if pending:
+            fail_pending(f"{agent_name}: 未返回安装结果")
+
+    def _to_result(
+        self,
+        task: InstallTask,
+        event: Dict[str, Any],
+        paths_by_hash: Dict[str, Path],
+        upload_seconds: float,
+    ) -> DeviceInstallResult:
+        selected = paths_by_hash.get(event["artifact"], task.package_path)
+        if selected != task.package_path:
+            task.package_path = selected
+            task.metadata = get_default_index().metadata_for(selected)
+        elif task.metadata is None:
+            task.metadata = get_default_index().metadata_for(selected)
+        task.split_paths = [paths_by_hash[sha256] for sha256 in event.get("splits", []) if sha256 in paths_by_hash]
+        task.allow_test = bool(event.get("allow_test", task.allow_test))
+        phases = dict(event.get("phases") or {})
+        if upload_seconds:
+            # 上传到 agent 的耗时计入传输阶段
+            phases["transfer"] = phases.get("transfer", 0.0) + upload_seconds
+        install_result = None
+        if "command" in event:
+            command = event["command"]
+            install_result = InstallResult(
+                command=command,
+                process=subprocess.CompletedProcess(command, event.get("returncode"), stdout=event.get("output", ""), stderr=""),
+            )
+        return DeviceInstallResult(
+            task=task,
+            success=bool(event["success"]),
+            duration=float(event.get("duration", 0.0)) + upload_seconds,
+            install_result=install_result,
+            error=event.get("error", ""),
+            skipped=bool(event.get("skipped")),
+            verified=event.get("verified"),
+            phases=phases,
+            attempts=int(event.get("attempts", 1)),
+            failure=event.get("failure", ""),
+            remedies=list(event.get("remedies") or []),
+        )
+
+
+def run_install_tasks(
+    scheduler: InstallScheduler,
+    tasks: List[InstallTask],
+    coordinator: Optional[RemoteCoordinator] = None,
+    on_result: Optional[Callable[[DeviceInstallResult], None]] = None,
+    on_progress: Optional[Callable[[InstallProgress], None]] = None,
+) -> InstallSummary:
+    if coordinator is None:
+        return scheduler.run(tasks, on_result=on_result, on_progress=on_progress)
+    remote_tasks = [task for task in tasks if coordinator.owns(task.device_id)]
+    local_tasks = [task for task in tasks if not coordinator.owns(task.device_id)]
+    if not remote_tasks:
+        return scheduler.run(local_tasks, on_result=on_result, on_progress=on_progress)
+    started = time.monotonic()
+    local_summary: Optional[InstallSummary] = None
+
+    def run_local() -> None:
+        nonlocal local_summary
+        local_summary = scheduler.run(local_tasks, on_result=on_result, on_progress=on_progress)
+
+    # 本机设备与各 agent 同时安装，互不等待；本机安装线程继承调用方的操作上下文以便一并取消
+    local_thread = threading.Thread(
+        target=contextvars.copy_context().run, args=(run_local,), name="install-local", daemon=True
+    )
+    if local_tasks:
+        local_thread.start()
+    remote_summary = coordinator.run(
+        remote_tasks,
+        on_result=on_result,
+        on_progress=on_progress,
+        max_workers=scheduler.max_workers,
+        retry_policy=scheduler.retry_policy,
+        probe_devices=scheduler.probe_devices,
+        check_integrity=scheduler.check_integrity,
+    )
+    if local_tasks:
+        local_thread.join()
+    results = list(remote_summary.results) + (local_summary.results if local_summary else [])
+    return InstallSummary(results=results, elapsed=time.monotonic() - started)
+
+
+def build_coordinator(addresses: Sequence[str], token: str = "") -> Optional[RemoteCoordinator]:
+    addresses = [address.strip() for address in addresses if address and address.strip()]
+    if not addresses:
+        return None
+    return RemoteCoordinator([AgentClient(address, token) for address in addresses])
@@ -0,0 +1,76 @@
+import re
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional
+
+from services.adb_client import AdbError, get_default_client
+from services.async_runtime import get_default_runtime
+from services.package_metadata import PackageMetadata
+
+
+_ANDROID_VERSION_CODE = re.compile(r"versionCode=(\d+)")
+_ANDROID_VERSION_NAME = re.compile(r"versionName=(\S*)")
+_HARMONY_VERSION_CODE = re.compile(r'"versionCode"\s*:\s*(\d+)')
+_HARMONY_VERSION_NAME = re.compile(r'"versionName"\s*:\s*"([^"]*)"')
+# 查询期间调度器持有设备锁与并发名额，设备无响应时按版本未知处理，继续安装
+DEFAULT_QUERY_TIMEOUT = 10.0
+
+
+@dataclass
+class InstalledVersion:
+    version_code: Optional[int]
+    version_name: str
+
+
+def _run_shell(command: List[str], timeout: float = DEFAULT_QUERY_TIMEOUT) -> str:
+    try:
+        result = get_default_runtime().run_command_sync(command, timeout)
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        return ""
+    return result.stdout
+
+
+def _parse_installed_version(output: str, code_pattern: re.Pattern, name_pattern: re.Pattern) -> Optional[InstalledVersion]:
+    code_match = code_pattern.search(output)
+    if not code_match:
+        return None
+    name_match = name_pattern.search(output)
+    return InstalledVersion(
+        version_code=int(code_match.group(1)),
+        version_name=name_match.group(1) if name_match else "",
+    )
+
+
+def query_android_version(device_id: str, package_name: str) -> Optional[InstalledVersion]:
+    # 单次 shell 往返，在设备端过滤掉 dumpsys 的其余输出
+    shell_command = f"dumpsys package {package_name} | grep -E 'versionCode=|versionName='"
+    output: Optional[str] = None
+    client = get_default_client()
+    if client is not None:
+        try:
+            output = client.shell(device_id, shell_command)
+        except (AdbError, OSError):
+            output = None
+    if output is None:
+        output = _run_shell(["adb", "-s", device_id, "shell", shell_command])
+    return _parse_installed_version(output, _ANDROID_VERSION_CODE, _ANDROID_VERSION_NAME)
+
+
+def query_harmony_version(device_id: str, package_name: str) -> Optional[InstalledVersion]:
+    output = _run_shell(["hdc", "-t", device_id, "shell", f"bm dump -n {package_name}"])
+    return _parse_installed_version(output, _HARMONY_VERSION_CODE, _HARMONY_VERSION_NAME)
+
+
+def query_installed_version(device_id: str, platform: str, package_name: str) -> Optional[InstalledVersion]:
+    if platform == "android":
+        return query_android_version(device_id, package_name)
+    return query_harmony_version(device_id, package_name)
+
+
+def is_same_build(metadata: PackageMetadata, installed: Optional[InstalledVersion]) -> bool:
+    if installed is None or metadata.version_code is None:
+        return False
+    return (
+        installed.version_code == metadata.version_code
+        and installed.version_name == metadata.version_name
+    )
@@ -0,0 +1,48 @@
+import queue
+from typing import Any, Callable, Optional, Tuple
+
+
+DEFAULT_BRIDGE_INTERVAL_MS = 30
+DEFAULT_MAX_CALLS = 200
+
+
+# 把后台线程与事件循环中的回调转回 Tk 主线程执行：任意线程调用 call() 只入队，不触碰 Tk；
+# 主线程按固定间隔批量取出执行，单次最多 max_calls 个，大量进度回调不会让界面卡顿
+class TkBridge:
+    def __init__(
+        self,
+        widget: Any,
+        interval_ms: int = DEFAULT_BRIDGE_INTERVAL_MS,
+        max_calls: int = DEFAULT_MAX_CALLS,
+    ) -> None:
+        self._widget = widget
+        self._interval_ms = interval_ms
+        self._max_calls = max_calls
+        self._calls: "queue.SimpleQueue[Tuple[Callable[..., Any], Tuple[Any, ...]]]" = queue.SimpleQueue()
+        self._after_id: Optional[str] = None
+        self._stopped = False
+
+    def call(self, func: Callable[..., Any], *args: Any) -> None:
+        if not self._stopped:
+            self._calls.put((func, args))
+
+    def start(self) -> None:
+        self._stopped = False
+        if self._after_id is None:
+            self._drain()
+
+    def stop(self) -> None:
+        self._stopped = True
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self) -> None:
+        # 先安排下一轮，某个回调抛出异常时桥接仍继续运行
+        self._after_id = self._widget.after(self._interval_ms, self._drain)
+        for _ in range(self._max_calls):
+            try:
+                func, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)